@@ -0,0 +1,205 @@
+"""Incrementally maintained aggregates behind the dashboard analytics endpoints.
+
+AlertAggregates keeps counters per risk level, flag, vendor and weekday plus
+the summary totals. They are updated by deltas from the same mutation records
+storage persists (see storage.apply_ops), so the analytics endpoints answer
+from the counters instead of scanning every alert.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def alert_weekday(alert: dict) -> str:
+    """Day-of-week label for an alert's date, or "Unknown"."""
+    date_str = alert.get("date", "")
+    if not date_str:
+        return "Unknown"
+    try:
+        dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+        return dt.strftime("%a")
+    except (ValueError, TypeError, AttributeError):
+        return "Unknown"
+
+
+def _flagged_amount(alert: dict):
+    if alert.get("riskLevel") != "HIGH":
+        return 0
+    return alert.get("amount", 0) or 0
+
+
+def adjust_summary(summary: dict, alert: dict, sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) one alert's share of the summary."""
+    summary["totalInvoices"] += sign
+    summary["highRiskAlerts"] += sign * (alert.get("riskLevel") == "HIGH")
+    summary["flaggedAmount"] = round(
+        summary["flaggedAmount"] + sign * _flagged_amount(alert), 2
+    )
+    summary["casesResolved"] += sign * (alert.get("status") == "Resolved")
+
+
+def _make_view(alert: dict) -> dict:
+    """The subset of an alert the views depend on."""
+    return {
+        "riskLevel": alert.get("riskLevel", "LOW"),
+        "vendor": alert.get("vendor", "Unknown"),
+        "flags": list(alert.get("flags", [])),
+        "weekday": alert_weekday(alert),
+        "amount": alert.get("amount"),
+        "status": alert.get("status"),
+        "source": alert.get("source"),
+    }
+
+
+class AlertAggregates:
+    """Materialized counters over the alert list, kept current by deltas."""
+
+    def __init__(self, alerts: list[dict] = ()):
+        self._lock = threading.RLock()
+        self.rebuild(alerts)
+
+    def copy(self) -> "AlertAggregates":
+        """Independent copy, so a published set of views is never mutated."""
+        with self._lock:
+            clone = AlertAggregates.__new__(AlertAggregates)
+            clone._lock = threading.RLock()
+            # Per-alert views are replaced, never mutated, so sharing them is safe
+            clone._alerts = dict(self._alerts)
+            clone._by_source = {k: set(v) for k, v in self._by_source.items()}
+            clone._summary = dict(self._summary)
+            clone._risk_levels = Counter(self._risk_levels)
+            clone._flags = Counter(self._flags)
+            clone._vendors = Counter(self._vendors)
+            clone._weekdays = Counter(self._weekdays)
+            return clone
+
+    # -- maintenance --------------------------------------------------------
+
+    def rebuild(self, alerts: list[dict]) -> None:
+        """Recompute every view from scratch."""
+        with self._lock:
+            self._alerts: dict[str, dict] = {}
+            self._by_source: dict[str, set] = {}
+            self._summary = {
+                "totalInvoices": 0,
+                "highRiskAlerts": 0,
+                "flaggedAmount": 0,
+                "casesResolved": 0,
+            }
+            self._risk_levels: Counter = Counter()
+            self._flags: Counter = Counter()
+            self._vendors: Counter = Counter()
+            self._weekdays: Counter = Counter()
+            for alert in alerts:
+                self.add(alert)
+
+    def add(self, alert: dict) -> None:
+        """Count an alert, replacing any earlier version with the same id."""
+        self._put(alert["id"], _make_view(alert))
+
+    def _put(self, alert_id: str, view: dict) -> None:
+        with self._lock:
+            self.remove(alert_id)
+            self._alerts[alert_id] = view
+            self._by_source.setdefault(view["source"], set()).add(alert_id)
+            self._count(view, 1)
+
+    def remove(self, alert_id: str) -> None:
+        with self._lock:
+            view = self._alerts.pop(alert_id, None)
+            if view is None:
+                return
+            self._by_source[view["source"]].discard(alert_id)
+            self._count(view, -1)
+
+    def _count(self, view: dict, sign: int) -> None:
+        adjust_summary(self._summary, view, sign)
+        self._bump(self._risk_levels, view["riskLevel"], sign)
+        self._bump(self._vendors, view["vendor"], sign)
+        self._bump(self._weekdays, view["weekday"], sign)
+        for flag in view["flags"]:
+            self._bump(self._flags, flag, sign)
+
+    @staticmethod
+    def _bump(counter: Counter, key, sign: int) -> None:
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]
+
+    def apply(self, ops: list[dict]) -> None:
+        """Apply the delta of a batch of storage mutation records."""
+        with self._lock:
+            for op in ops:
+                kind = op["op"]
+                if kind == "put":
+                    self.add(op["alert"])
+                elif kind == "patch":
+                    view = self._alerts.get(op["id"])
+                    if view is not None:
+                        fields = op["fields"]
+                        patched = {**view, **{k: v for k, v in fields.items() if k in view}}
+                        if "flags" in fields:
+                            patched["flags"] = list(fields["flags"])
+                        if "date" in fields:
+                            patched["weekday"] = alert_weekday(fields)
+                        self._put(op["id"], patched)
+                elif kind == "delete":
+                    self.remove(op["id"])
+                elif kind == "delete_source":
+                    for aid in list(self._by_source.get(op["source"], ())):
+                        self.remove(aid)
+
+    # -- queries ------------------------------------------------------------
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self._summary)
+
+    def risk_distribution(self) -> dict:
+        with self._lock:
+            return {
+                "low": self._risk_levels.get("LOW", 0),
+                "medium": self._risk_levels.get("MEDIUM", 0),
+                "high": self._risk_levels.get("HIGH", 0),
+            }
+
+    def alerts_over_time(self) -> list[dict]:
+        with self._lock:
+            return [{"date": d, "count": self._weekdays.get(d, 0)} for d in WEEKDAYS]
+
+    def top_flags(self, k: int = 10) -> list[tuple]:
+        with self._lock:
+            return self._flags.most_common(k)
+
+    def top_vendors(self, k: int = 10) -> list[tuple]:
+        with self._lock:
+            return self._vendors.most_common(k)
+
+    def risk_level_count(self, level: str) -> int:
+        with self._lock:
+            return self._risk_levels.get(level, 0)
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    # -- consistency --------------------------------------------------------
+
+    def _state(self) -> dict:
+        with self._lock:
+            return {
+                "summary": dict(self._summary),
+                "riskLevels": dict(self._risk_levels),
+                "flags": dict(self._flags),
+                "vendors": dict(self._vendors),
+                "weekdays": dict(self._weekdays),
+            }
+
+    def verify(self, alerts: list[dict]) -> list[str]:
+        """Compare against a from-scratch rebuild; return the views that differ."""
+        expected = AlertAggregates(alerts)._state()
+        actual = self._state()
+        return [name for name in expected if expected[name] != actual[name]]
+
@@ -0,0 +1,323 @@
+"""Secondary indexes over a storage snapshot for paginated alert queries.
+
+An AlertIndex is built on first use (see storage.Snapshot.alert_index) and
+from then on carried from one snapshot generation to the next: storage.commit
+copies it and applies the batch's mutation records, inserting and removing
+single entries with bisect instead of re-sorting. It keeps posting sets per
+filter value and sorted orders per sort field, so a page costs a bisect plus
+the rows it returns rather than a pass over every alert.
+
+Pagination is keyset-based: the cursor encodes the sort key of the last row
+returned, so it stays valid when alerts are added between requests.
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+SORT_FIELDS = ("riskScore", "date")
+FILTER_FIELDS = ("riskLevel", "type", "status", "vendor", "source")
+
+
+def normalize_date(value) -> str:
+    """Sortable UTC ISO-8601 key for the date formats alerts carry.
+
+    Handles ISO timestamps, RFC 2822 email dates and "1 January 2018" style
+    statement dates. Anything else (e.g. "03 Jun" without a year) gives "",
+    which sorts as oldest and never matches a date-range filter.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return ""
+    value = value.strip()
+    dt = None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            dt = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            for fmt in ("%d %b %Y", "%d %B %Y"):
+                try:
+                    dt = datetime.strptime(value, fmt)
+                    break
+                except ValueError:
+                    continue
+    if dt is None:
+        return ""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def _sort_value(field: str, alert: dict):
+    if field == "riskScore":
+        score = alert.get("riskScore")
+        return float(score) if isinstance(score, (int, float)) else -1.0
+    return normalize_date(alert.get("date"))
+
+
+def encode_cursor(sort_value, alert_id: str) -> str:
+    raw = json.dumps([sort_value, alert_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str | None = None) -> tuple:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor.
+
+    With sort (one of SORT_FIELDS), the cursor must also hold a sort value
+    of that field's type and an alert id, so it can be compared with the
+    order's entries.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, alert_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if sort is not None:
+        if sort == "riskScore":
+            valid = isinstance(sort_value, (int, float)) and not isinstance(sort_value, bool)
+        else:
+            valid = isinstance(sort_value, str)
+        if not valid or not isinstance(alert_id, str):
+            raise ValueError(f"Invalid cursor for sort={sort}: {cursor!r}")
+    return sort_value, alert_id
+
+
+def project(alert: dict, fields: list[str] | None) -> dict:
+    """Keep only the requested fields of an alert (id is always kept)."""
+    if not fields:
+        return alert
+    return {k: alert[k] for k in ("id", *fields) if k in alert}
+
+
+class AlertIndex:
+    """Hash, posting and sort indexes over the alerts of one snapshot.
+
+    A published index is never changed; copy() gives the next generation an
+    index that shares every table until it first changes one.
+    """
+
+    def __init__(self, alerts: list[dict] = ()):
+        self.by_id: dict[str, dict] = {}
+        # Insertion sequence per id, so ties can be broken in document order
+        self._seq: dict[str, int] = {}
+        self._next_seq = 0
+        self._dates: dict[str, str] = {}
+        self._postings: dict[str, dict] = {field: {} for field in FILTER_FIELDS}
+        self._orders: dict[str, list] = {field: [] for field in SORT_FIELDS}
+        # Tables (and posting sets) this copy created and may change in place
+        self._owned: set = set(self._postings) | {("order", f) for f in SORT_FIELDS}
+        # A repeated id keeps its first place and its last content, as in apply_ops
+        for alert in {a["id"]: a for a in alerts}.values():
+            self._add(alert, ordered=False)
+        for order in self._orders.values():
+            order.sort()
+
+    def copy(self) -> "AlertIndex":
+        """Independent copy; tables are only duplicated when first changed."""
+        clone = AlertIndex.__new__(AlertIndex)
+        clone.by_id = dict(self.by_id)
+        clone._seq = dict(self._seq)
+        clone._next_seq = self._next_seq
+        clone._dates = dict(self._dates)
+        clone._postings = dict(self._postings)
+        clone._orders = dict(self._orders)
+        clone._owned = set()
+        # Every table is shared now, so neither side may change one in place
+        self._owned = set()
+        return clone
+
+    # -- maintenance --------------------------------------------------------
+
+    def apply(self, ops: list[dict]) -> None:
+        """Apply a batch of storage mutation records (see storage.apply_ops)."""
+        for op in ops:
+            kind = op["op"]
+            if kind == "put":
+                self._put(op["alert"])
+            elif kind == "patch":
+                if op["id"] in self.by_id:
+                    self._put({**self.by_id[op["id"]], **op["fields"]})
+            elif kind == "delete":
+                self._remove(op["id"])
+            elif kind == "delete_source":
+                self._remove_many(self._postings["source"].get(op["source"], ()))
+
+    def _own_postings(self, field: str, value) -> set:
+        """The posting set of value, as one this copy may change."""
+        postings = self._postings[field]
+        if field not in self._owned:
+            postings = self._postings[field] = dict(postings)
+            self._owned.add(field)
+        if (field, value) not in self._owned or value not in postings:
+            postings[value] = set(postings.get(value, ()))
+            self._owned.add((field, value))
+        return postings[value]
+
+    def _own_order(self, field: str) -> list:
+        if ("order", field) not in self._owned:
+            self._orders[field] = list(self._orders[field])
+            self._owned.add(("order", field))
+        return self._orders[field]
+
+    def _put(self, alert: dict) -> None:
+        """Insert or replace one alert, touching only the entries that change."""
+        alert_id = alert["id"]
+        old = self.by_id.get(alert_id)
+        if old is None:
+            self._add(alert)
+            return
+        self.by_id[alert_id] = alert
+        self._dates[alert_id] = normalize_date(alert.get("date"))
+        for field in FILTER_FIELDS:
+            if old.get(field) != alert.get(field):
+                self._unpost(field, old.get(field), alert_id)
+                self._own_postings(field, alert.get(field)).add(alert_id)
+        seq = self._seq[alert_id]
+        for field in SORT_FIELDS:
+            before, after = _sort_value(field, old), _sort_value(field, alert)
+            if before != after:
+                order = self._own_order(field)
+                del order[bisect_left(order, (before, alert_id))]
+                insort(order, (after, alert_id, seq))
+
+    def _add(self, alert: dict, ordered: bool = True) -> None:
+        alert_id = alert["id"]
+        seq = self._next_seq
+        self._next_seq += 1
+        self.by_id[alert_id] = alert
+        self._seq[alert_id] = seq
+        self._dates[alert_id] = normalize_date(alert.get("date"))
+        for field in FILTER_FIELDS:
+            self._own_postings(field, alert.get(field)).add(alert_id)
+        for field in SORT_FIELDS:
+            entry = (_sort_value(field, alert), alert_id, seq)
+            if ordered:
+                insort(self._own_order(field), entry)
+            else:
+                self._orders[field].append(entry)
+
+    def _unpost(self, field: str, value, alert_id: str) -> None:
+        members = self._own_postings(field, value)
+        members.discard(alert_id)
+        if not members:
+            del self._postings[field][value]
+
+    def _remove(self, alert_id: str) -> None:
+        old = self.by_id.pop(alert_id, None)
+        if old is None:
+            return
+        del self._seq[alert_id]
+        del self._dates[alert_id]
+        for field in FILTER_FIELDS:
+            self._unpost(field, old.get(field), alert_id)
+        for field in SORT_FIELDS:
+            order = self._own_order(field)
+            del order[bisect_left(order, (_sort_value(field, old), alert_id))]
+
+    def _remove_many(self, alert_ids) -> None:
+        """Remove several alerts with one pass over each order."""
+        alert_ids = set(alert_ids)
+        if len(alert_ids) < 8:
+            for alert_id in alert_ids:
+                self._remove(alert_id)
+            return
+        for alert_id in alert_ids:
+            old = self.by_id.pop(alert_id)
+            del self._seq[alert_id]
+            del self._dates[alert_id]
+            for field in FILTER_FIELDS:
+                self._unpost(field, old.get(field), alert_id)
+        for field in SORT_FIELDS:
+            self._orders[field] = [e for e in self._orders[field] if e[1] not in alert_ids]
+            self._owned.add(("order", field))
+
+    # -- lookups ------------------------------------------------------------
+
+    def postings(self, field: str) -> dict:
+        """Map each value of a FILTER_FIELDS field to the set of alert ids holding it."""
+        return self._postings[field]
+
+    def order(self, field: str) -> list:
+        """(sort value, id, insertion sequence) for every alert, ascending."""
+        return self._orders[field]
+
+    # -- queries ------------------------------------------------------------
+
+    def query(
+        self,
+        filters: dict[str, list] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        sort: str = "date",
+        descending: bool = True,
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[dict], str | None]:
+        """Return one page of matching alerts and the cursor for the next."""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {sort!r}")
+
+        candidates = None
+        for field, values in sorted((filters or {}).items(), key=lambda kv: len(kv[1])):
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter by {field!r}")
+            postings = self.postings(field)
+            matched = set().union(*(postings.get(v, ()) for v in values))
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return [], None
+
+        entries = self.order(sort)
+        if candidates is not None and len(candidates) * 8 < len(entries):
+            # Few matches: sorting them is cheaper than walking the full order
+            entries = sorted(
+                (_sort_value(sort, self.by_id[i]), i, self._seq[i]) for i in candidates
+            )
+            candidates = None
+
+        lo, hi = 0, len(entries)
+        dates = None
+        if date_from or date_to:
+            if sort == "date":
+                # The order is by date, so the range is a contiguous slice
+                lo = bisect_left(entries, (date_from or "\x00",))
+                if date_to:
+                    hi = bisect_right(entries, (date_to + "\uffff",))
+            else:
+                dates = self._dates
+
+        if cursor:
+            after_value, after_id = decode_cursor(cursor, sort)
+            if descending:
+                hi = min(hi, bisect_left(entries, (after_value, after_id)))
+            else:
+                lo = max(lo, bisect_right(entries, (after_value, after_id, float("inf"))))
+
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        page = []
+        last_entry = None
+        for idx in positions:
+            alert_id = entries[idx][1]
+            if candidates is not None and alert_id not in candidates:
+                continue
+            if dates is not None and not _in_range(dates[alert_id], date_from, date_to):
+                continue
+            if limit is not None and len(page) == limit:
+                # There is at least one more row, so hand out a cursor
+                return page, encode_cursor(last_entry[0], last_entry[1])
+            page.append(self.by_id[alert_id])
+            last_entry = entries[idx]
+        return page, None
+
+
+def _in_range(date_key: str, date_from: str | None, date_to: str | None) -> bool:
+    if not date_key:
+        return False
+    if date_from and date_key < date_from:
+        return False
+    if date_to and date_key[: len(date_to)] > date_to:
+        return False
+    return True
@@ -0,0 +1,181 @@
+"""Compact statistical baseline of parsed bank statements for the LLM prompt.
+
+Rather than pasting every statement's text into STATEMENT_ANALYSIS_PROMPT,
+the months before the one under review are summarised per payee: how often
+it is paid, amount mean/std/range, the usual days of the month, and whether
+it recurs. Only the current month is sent transaction by transaction.
+
+The digest lists at most FIRMWATCH_BASELINE_MAX_PAYEES payees (the rest are
+rolled up into one line), so the prompt stays about the same size however
+many baseline months are kept.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+
+MAX_PAYEES = int(os.getenv("FIRMWATCH_BASELINE_MAX_PAYEES", "60"))
+# Share of baseline months a payee must appear in to count as recurring
+RECURRING_SHARE = 0.6
+
+_SEPARATOR = re.compile(r"\s+-\s+")
+
+
+def payee_key(description: str) -> str:
+    """The payee part of a statement description.
+
+    Descriptions start with an upper-case block such as
+    "DIRECT DEBIT - PROPERTY MANAGEMENT CO" followed by free-text detail;
+    the payee is the last " - " part of that block.
+    """
+    head = []
+    for token in (description or "").split():
+        if any(c.islower() for c in token) or (head and token.isdigit()):
+            break
+        head.append(token)
+    block = " ".join(head).strip(" -") or " ".join((description or "").split()[:4])
+    parts = [p for p in _SEPARATOR.split(block) if p.strip(" -")]
+    payee = parts[-1] if parts else block
+    return re.sub(r"[\s\d#/*.-]+$", "", payee).strip().upper() or "UNKNOWN"
+
+
+def day_of_month(date: str) -> int | None:
+    match = re.match(r"\s*(\d{1,2})\b", date or "")
+    return int(match.group(1)) if match else None
+
+
+def _amount(txn: dict) -> tuple[str, float] | None:
+    if txn.get("debit") is not None:
+        return "debit", float(txn["debit"])
+    if txn.get("credit") is not None:
+        return "credit", float(txn["credit"])
+    return None
+
+
+def _describe(values: list[float]) -> str:
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+    return f"mean {mean:.2f}, std {std:.2f}, range {min(values):.2f}-{max(values):.2f}"
+
+
+def _days(days: list[int]) -> str:
+    if not days:
+        return "n/a"
+    common = [str(d) for d, _ in Counter(days).most_common(3)]
+    return f"usually day {'/'.join(common)} (range {min(days)}-{max(days)})"
+
+
+def build_baseline(months: list[dict]) -> dict:
+    """Per-payee and per-month statistics over parsed statement months."""
+    payees: dict[str, dict] = {}
+    monthly = []
+    for month in months:
+        debits = credits = 0.0
+        for txn in month.get("transactions", []):
+            amount = _amount(txn)
+            if amount is None:
+                continue
+            kind, value = amount
+            if kind == "debit":
+                debits += value
+            else:
+                credits += value
+            entry = payees.setdefault(
+                payee_key(txn.get("description", "")),
+                {"count": 0, "months": set(), "debit": [], "credit": [], "days": []},
+            )
+            entry["count"] += 1
+            entry["months"].add(month.get("month"))
+            entry[kind].append(value)
+            day = day_of_month(txn.get("date", ""))
+            if day is not None:
+                entry["days"].append(day)
+        monthly.append({
+            "month": month.get("month"),
+            "label": month.get("label", ""),
+            "transactions": len(month.get("transactions", [])),
+            "debits": round(debits, 2),
+            "credits": round(credits, 2),
+            "closingBalance": month.get("closingBalance"),
+        })
+
+    needed = max(1, math.ceil(len(months) * RECURRING_SHARE))
+    for entry in payees.values():
+        entry["recurring"] = len(entry["months"]) >= needed
+    return {"months": monthly, "payees": payees, "monthCount": len(months)}
+
+
+def render_digest(baseline: dict, max_payees: int = None) -> str:
+    """Plain-text digest of build_baseline() output for the prompt."""
+    max_payees = max_payees or MAX_PAYEES
+    count = baseline["monthCount"]
+    lines = [f"Baseline: {count} month(s)."]
+    if baseline["months"]:
+        debits = [m["debits"] for m in baseline["months"]]
+        credits = [m["credits"] for m in baseline["months"]]
+        balances = [m["closingBalance"] for m in baseline["months"] if m["closingBalance"] is not None]
+        txns = [m["transactions"] for m in baseline["months"]]
+        lines.append(f"Monthly debits: {_describe(debits)}")
+        lines.append(f"Monthly credits: {_describe(credits)}")
+        lines.append(f"Transactions per month: {_describe([float(t) for t in txns])}")
+        if balances:
+            lines.append(f"Closing balances: {_describe(balances)}")
+
+    ranked = sorted(
+        baseline["payees"].items(),
+        key=lambda kv: (-len(kv[1]["months"]), -sum(kv[1]["debit"]) - sum(kv[1]["credit"]), kv[0]),
+    )
+    lines.append("")
+    lines.append("Payees (name | months seen | payments per month | amounts | timing):")
+    for name, entry in ranked[:max_payees]:
+        amounts = []
+        for kind in ("debit", "credit"):
+            if entry[kind]:
+                amounts.append(f"{kind} {_describe(entry[kind])}")
+        tag = " [recurring]" if entry["recurring"] else ""
+        lines.append(
+            f"- {name}{tag} | {len(entry['months'])}/{count} | "
+            f"{entry['count'] / max(len(entry['months']), 1):.1f} | "
+            f"{'; '.join(amounts)} | {_days(entry['days'])}"
+        )
+    rest = ranked[max_payees:]
+    if rest:
+        total = sum(sum(e["debit"]) + sum(e["credit"]) for _, e in rest)
+        lines.append(
+            f"- ({len(rest)} other payees, {sum(e['count'] for _, e in rest)} payments, "
+            f"total {total:.2f})"
+        )
+    return "\n".join(lines)
+
+
+def missing_recurring(baseline: dict, current: dict) -> list[str]:
+    """Recurring baseline payees with no transaction in the current month."""
+    seen = {payee_key(t.get("description", "")) for t in current.get("transactions", [])}
+    return sorted(
+        name for name, entry in baseline["payees"].items() if entry["recurring"] and name not in seen
+    )
+
+
+def transaction_header(month: dict) -> str:
+    return (
+        f"Period: {month.get('period', '')}; opening balance {month.get('openingBalance')}; "
+        f"closing balance {month.get('closingBalance')}\n"
+        "date | description | debit | credit | balance"
+    )
+
+
+def transaction_line(txn: dict) -> str:
+    return (
+        f"{txn.get('date', '')} | {txn.get('description', '')} | "
+        f"{txn.get('debit') if txn.get('debit') is not None else ''} | "
+        f"{txn.get('credit') if txn.get('credit') is not None else ''} | "
+        f"{txn.get('balance')}"
+    )
+
+
+def render_transactions(month: dict) -> str:
+    """One line per transaction of a statement month."""
+    lines = [transaction_header(month)]
+    lines.extend(transaction_line(txn) for txn in month.get("transactions", []))
+    return "\n".join(lines)
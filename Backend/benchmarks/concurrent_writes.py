@@ -0,0 +1,188 @@
+"""Lost-update benchmark for concurrent sync and upload pipelines.
+
+Runs simulated email syncs and statement uploads in parallel against a
+scratch copy of the chosen storage backend. Each pipeline "analyzes" for a
+random delay, then saves its alerts. The run is repeated twice:
+
+  legacy  - every pipeline does load_data() ... save_data(), as the handlers
+            used to, so pipelines that overlap overwrite each other
+  queued  - every pipeline goes through the storage_async writer queue
+
+and the number of alerts that went missing is reported for each.
+
+    python benchmarks/concurrent_writes.py [--backend json|sqlite|journal]
+                                           [--syncs N] [--uploads N] [--alerts N]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage  # noqa: E402
+from storage_async import AsyncStorage  # noqa: E402
+
+
+def make_backend(kind: str, directory: Path):
+    if kind == "sqlite":
+        from storage_sqlite import SqliteBackend
+        return SqliteBackend(directory / "firmwatch.db")
+    if kind == "journal":
+        from storage_journal import JournalBackend
+        return JournalBackend(directory / "data.json")
+    return storage.JsonBackend(directory / "data.json")
+
+
+def fake_alert(pipeline: str, n: int, source: str | None = None) -> dict:
+    alert = {
+        "id": f"alert-{uuid.uuid4().hex[:8]}",
+        "riskScore": random.randint(0, 100),
+        "riskLevel": random.choice(["LOW", "MEDIUM", "HIGH"]),
+        "type": "Invoice" if source is None else "Transaction",
+        "vendor": f"Vendor {random.randint(1, 20)}",
+        "amount": round(random.uniform(10, 5000), 2),
+        "reason": f"{pipeline} #{n}",
+        "flags": random.sample(["round_amount", "new_vendor", "urgent"], 2),
+        "summary": "",
+        "factors": [],
+        "status": "New Alert",
+        "date": "2026-01-05T10:00:00",
+    }
+    if source is not None:
+        alert["source"] = source
+    return alert
+
+
+async def analyze_delay() -> None:
+    await asyncio.sleep(random.uniform(0.001, 0.02))
+
+
+# -- pipelines ---------------------------------------------------------------
+
+async def legacy_pipeline(name: str, alerts: list[dict]) -> None:
+    data = await asyncio.to_thread(storage.load_data)
+    await analyze_delay()
+    data["alerts"].extend(alerts)
+    await asyncio.to_thread(storage.save_data, data)
+
+
+async def queued_sync(store: AsyncStorage, name: str, alerts: list[dict], statement: list[dict]) -> None:
+    await analyze_delay()
+    await store.append_alerts(alerts, [f"{name}-email"])
+    await analyze_delay()
+    await store.replace_source_alerts("statement_analysis", statement)
+
+
+async def queued_upload(store: AsyncStorage, name: str, alerts: list[dict]) -> None:
+    await analyze_delay()
+    await store.append_alerts(alerts)
+
+
+# -- runs --------------------------------------------------------------------
+
+def plan(args) -> list[tuple]:
+    jobs = []
+    for i in range(args.syncs):
+        name = f"sync-{i}"
+        jobs.append(("sync", name, [fake_alert(name, n) for n in range(args.alerts)]))
+    for i in range(args.uploads):
+        name = f"upload-{i}"
+        jobs.append(("upload", name, [fake_alert(name, n, f"{name}.pdf") for n in range(args.alerts)]))
+    random.shuffle(jobs)
+    return jobs
+
+
+async def run_legacy(jobs: list[tuple]) -> tuple[float, set]:
+    start = time.perf_counter()
+    await asyncio.gather(*(legacy_pipeline(name, alerts) for _, name, alerts in jobs))
+    return time.perf_counter() - start, set()
+
+
+async def run_queued(jobs: list[tuple], store: AsyncStorage) -> tuple[float, set]:
+    store.start()
+    statement_sets = []
+    coros = []
+    for kind, name, alerts in jobs:
+        if kind == "sync":
+            statement = [fake_alert(name, n, "statement_analysis") for n in range(3)]
+            statement_sets.append({a["id"] for a in statement})
+            coros.append(queued_sync(store, name, alerts, statement))
+        else:
+            coros.append(queued_upload(store, name, alerts))
+    start = time.perf_counter()
+    await asyncio.gather(*coros)
+    await store.stop()
+    elapsed = time.perf_counter() - start
+    # Exactly one sync's statement alerts must survive the replaces
+    current = {
+        a["id"] for a in storage.get_snapshot().data["alerts"]
+        if a.get("source") == "statement_analysis"
+    }
+    if statement_sets and current not in statement_sets:
+        raise SystemExit("statement_analysis alerts are a mix of several replaces")
+    return elapsed, current
+
+
+def report(label: str, jobs: list[tuple], elapsed: float, extra_ids: set, reload) -> int:
+    expected = {a["id"] for _, _, alerts in jobs for a in alerts} | extra_ids
+    in_memory = {a["id"] for a in storage.get_snapshot().data["alerts"]}
+    on_disk = {a["id"] for a in reload()["alerts"]}
+    lost = len(expected - on_disk)
+    print(
+        f"{label:7s} {len(jobs):4d} pipelines  {elapsed * 1000:8.1f} ms  "
+        f"expected {len(expected):5d}  on disk {len(on_disk):5d}  lost {lost:5d}"
+        + ("" if in_memory == on_disk else "  (memory and disk disagree!)")
+    )
+    return lost
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["json", "sqlite", "journal"], default="json")
+    parser.add_argument("--syncs", type=int, default=25)
+    parser.add_argument("--uploads", type=int, default=25)
+    parser.add_argument("--alerts", type=int, default=5, help="alerts per pipeline")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir, queued_dir = Path(tmp, "legacy"), Path(tmp, "queued")
+        legacy_dir.mkdir()
+        queued_dir.mkdir()
+
+        backend = make_backend(args.backend, legacy_dir)
+        storage.use_backend(backend)
+        jobs = plan(args)
+        elapsed, extra = asyncio.run(run_legacy(jobs))
+        report("legacy", jobs, elapsed, extra, make_backend(args.backend, legacy_dir).load)
+
+        backend = make_backend(args.backend, queued_dir)
+        storage.use_backend(backend)
+        store = AsyncStorage()
+        jobs = plan(args)
+        elapsed, extra = asyncio.run(run_queued(jobs, store))
+        lost = report("queued", jobs, elapsed, extra, make_backend(args.backend, queued_dir).load)
+
+        stats = store.stats()
+        print(
+            f"queued: {stats['requests']} write request(s) in {stats['commits']} commit(s), "
+            f"largest batch {stats['largestBatch']}"
+        )
+        mismatches = storage.check_aggregates(repair=False)
+        if mismatches:
+            print(f"aggregates out of sync: {', '.join(mismatches)}")
+        if hasattr(backend, "close"):
+            backend.close()
+        if lost or mismatches:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
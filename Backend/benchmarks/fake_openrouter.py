@@ -0,0 +1,156 @@
+"""Local stand-in for the OpenRouter chat-completions API, plus a load driver.
+
+The fake server answers /api/v1/chat/completions (plain and streamed) after a
+random latency and misbehaves on purpose:
+
+  - more than --capacity requests in flight get a 429 with Retry-After
+  - --error-rate of the other requests fail with a 503
+  - --outage SECONDS makes every request fail with a 503 after startup,
+    which should open the circuit breaker
+
+Run it on its own and point the backend at it:
+
+    python benchmarks/fake_openrouter.py serve --port 8099
+    FIRMWATCH_OPENROUTER_URL=http://127.0.0.1:8099/api/v1/chat/completions python server.py
+
+or let the script start it and drive the shared client against it, printing
+how many calls succeeded and what the resilience layer did:
+
+    python benchmarks/fake_openrouter.py drive [--calls N] [--capacity N] [--error-rate F]
+                                               [--outage SECONDS]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+REPLY = json.dumps({
+    "riskScore": 12,
+    "riskLevel": "LOW",
+    "reason": "Known vendor, expected amount",
+    "flags": [],
+    "summary": "Nothing unusual.",
+    "amount": 120.0,
+    "factors": [],
+})
+
+
+def make_app(capacity: int, error_rate: float, outage: float, latency: float) -> FastAPI:
+    app = FastAPI()
+    state = {"in_flight": 0, "started": time.monotonic(), "counts": {}}
+
+    def count(kind: str) -> None:
+        state["counts"][kind] = state["counts"].get(kind, 0) + 1
+
+    @app.get("/stats")
+    async def stats():
+        return state["counts"]
+
+    @app.post("/api/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        if time.monotonic() - state["started"] < outage:
+            count("outage")
+            return JSONResponse({"error": "outage"}, status_code=503)
+        if state["in_flight"] >= capacity:
+            count("429")
+            return JSONResponse(
+                {"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"}
+            )
+        if random.random() < error_rate:
+            count("503")
+            return JSONResponse({"error": "upstream error"}, status_code=503)
+
+        state["in_flight"] += 1
+        try:
+            await asyncio.sleep(random.uniform(latency / 2, latency * 1.5))
+        finally:
+            state["in_flight"] -= 1
+        count("ok")
+        if not body.get("stream"):
+            return {"choices": [{"message": {"role": "assistant", "content": REPLY}}]}
+
+        async def events():
+            for i in range(0, len(REPLY), 16):
+                chunk = {"choices": [{"delta": {"content": REPLY[i:i + 16]}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.005)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def start_server(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def drive(url: str, calls: int) -> None:
+    from llm import LLMClient
+    from resilience import CircuitOpenError, openrouter_policy
+
+    client = LLMClient(url=url, api_key="fake")
+    outcomes: dict[str, int] = {}
+    started = time.perf_counter()
+
+    async def one(i: int) -> None:
+        try:
+            await client.complete_json(f"email {i}")
+            kind = "ok"
+        except CircuitOpenError:
+            kind = "circuit open"
+        except Exception as e:
+            kind = type(e).__name__
+        outcomes[kind] = outcomes.get(kind, 0) + 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+
+    print(f"{calls} calls in {elapsed:.1f}s: {outcomes}")
+    print("policy:", json.dumps(openrouter_policy.stats()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("mode", choices=["serve", "drive"])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--capacity", type=int, default=4, help="requests served at once")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--outage", type=float, default=0.0, help="seconds of 503s at startup")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per reply")
+    parser.add_argument("--calls", type=int, default=100)
+    args = parser.parse_args()
+
+    app = make_app(args.capacity, args.error_rate, args.outage, args.latency)
+    if args.mode == "serve":
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="info")
+        return
+
+    server = start_server(app, args.port)
+    try:
+        asyncio.run(drive(f"http://127.0.0.1:{args.port}/api/v1/chat/completions", args.calls))
+        import httpx
+        print("server:", httpx.get(f"http://127.0.0.1:{args.port}/stats").json())
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
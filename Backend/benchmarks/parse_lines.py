@@ -0,0 +1,76 @@
+"""Statement line parser throughput and peak memory, without PDF extraction.
+
+Generates a synthetic statement of --transactions rows (about 2.3 text
+lines each) as page texts and parses it two ways: the whole text at once
+with statements.parse_text(), as the text of a PDF joined in memory would
+be, and page by page with statements.parse_pages(). Lines/sec is timed on
+pages generated beforehand. Peak memory is the tracemalloc peak of a
+second run fed by a lazy page generator, so it shows what each way holds
+at once. Both results must be identical.
+
+    python benchmarks/parse_lines.py [--transactions N] [--lines-per-page N] [--repeat N]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from synthetic_statements import iter_pages, iter_statement_lines  # noqa: E402
+
+
+def whole_text(pages) -> dict:
+    return statements.parse_text(statements.join_pages(pages))
+
+
+def streamed(pages) -> dict:
+    return statements.parse_pages(pages)
+
+
+def lazy_pages(args):
+    return iter_pages(iter_statement_lines(args.transactions), args.lines_per_page)
+
+
+def measure(parse, args) -> tuple[float, int, dict]:
+    """(best seconds on pre-generated pages, peak traced bytes on lazy pages, result)."""
+    pages = list(lazy_pages(args))
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = parse(pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    del pages
+    tracemalloc.start()
+    parse(lazy_pages(args))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--lines-per-page", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs; the best is reported")
+    args = parser.parse_args()
+
+    lines = sum(1 for _ in iter_statement_lines(args.transactions))
+    print(f"{args.transactions:,} transactions, {lines:,} lines, {args.lines_per_page} lines/page")
+    results = []
+    for name, parse in (("whole text", whole_text), ("page by page", streamed)):
+        elapsed, peak, result = measure(parse, args)
+        results.append(result)
+        print(
+            f"{name}: {elapsed:.2f}s, {lines / elapsed:,.0f} lines/s, "
+            f"peak {peak / 1024 / 1024:.1f} MiB, {len(result['transactions']):,} transactions"
+        )
+    print(f"results {'same' if results[0] == results[1] else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
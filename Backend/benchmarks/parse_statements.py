@@ -0,0 +1,74 @@
+"""Statement parsing throughput with 1..N worker processes.
+
+Parses a directory of statement PDFs with statements.parse_many() once per
+worker count and prints the wall time and speedup over one worker. The
+results of every run are compared with the single-worker run. Without
+--dir, synthetic statements are generated in a scratch directory.
+
+    python benchmarks/parse_statements.py [--dir DIR] [--files N] [--transactions N]
+                                          [--workers 1,2,4] [--pages-per-task N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from synthetic_statements import write_statements  # noqa: E402
+
+
+def run(paths: dict, workers: int) -> tuple[float, dict]:
+    statements.shutdown()
+    statements.PARSE_WORKERS = workers
+    # Start the workers outside the timed region
+    pool = statements._executor()
+    if pool is not None:
+        list(pool.map(abs, range(workers)))
+    started = time.perf_counter()
+    results = statements.parse_many(paths)
+    elapsed = time.perf_counter() - started
+    statements.shutdown()
+    return elapsed, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dir", type=Path, help="directory of statement PDFs")
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--transactions", type=int, default=400, help="per statement")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--pages-per-task", type=int, default=statements.PAGES_PER_TASK)
+    args = parser.parse_args()
+    statements.PAGES_PER_TASK = args.pages_per_task
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.dir
+        if directory is None:
+            directory = Path(scratch)
+            write_statements(directory, args.files, args.transactions)
+        paths = {i: p for i, p in enumerate(sorted(directory.glob("*.pdf")))}
+        print(f"{len(paths)} PDF(s) in {directory}")
+
+        baseline_time = reference = None
+        for workers in [int(w) for w in args.workers.split(",")]:
+            elapsed, results = run(paths, workers)
+            if reference is None:
+                baseline_time, reference = elapsed, results
+            same = "same" if results.keys() == reference.keys() and all(
+                str(results[k]) == str(reference[k]) for k in results
+            ) else "DIFFERENT"
+            transactions = sum(
+                len(r["transactions"]) for r in results.values() if isinstance(r, dict)
+            )
+            print(
+                f"workers={workers}: {elapsed:.2f}s, {transactions / elapsed:,.0f} transactions/s, "
+                f"speedup {baseline_time / elapsed:.2f}x, results {same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Text extraction throughput of each PDF text engine, in pages/sec.
+
+Extracts every page of a set of statement PDFs with each engine in
+pdf_text.py, in this process, and prints pages/sec and the time to
+extract and parse a statement. Without --dir, synthetic statements are
+generated in a scratch directory.
+
+    python benchmarks/pdf_text_engines.py [--dir DIR] [--files N] [--transactions N] [--repeat N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pdf_text  # noqa: E402
+import statements  # noqa: E402
+from synthetic_statements import write_statements  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dir", type=Path, help="directory of statement PDFs")
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--transactions", type=int, default=400, help="per statement")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs; the best is reported")
+    parser.add_argument("--engines", default=",".join(pdf_text.ENGINES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.dir
+        if directory is None:
+            directory = Path(scratch)
+            write_statements(directory, args.files, args.transactions)
+        paths = [str(p) for p in sorted(directory.glob("*.pdf"))]
+        print(f"{len(paths)} PDF(s) in {directory}")
+
+        for engine in pdf_text.chain(args.engines.split(",")):
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                pages = sum(len(statements.extract_pages(path, engine=engine.name)) for path in paths)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            started = time.perf_counter()
+            parsed = [statements._extract_and_parse(path, [engine.name])[1] for path in paths]
+            parse_time = time.perf_counter() - started
+            accepted = sum(statements.plausible(p) for p in parsed)
+            print(
+                f"{engine.name}: {pages / best:,.1f} pages/s ({pages} pages in {best:.2f}s), "
+                f"{parse_time / len(paths) * 1000:.1f} ms per statement parsed, "
+                f"{accepted}/{len(paths)} plausible"
+            )
+
+
+if __name__ == "__main__":
+    main()
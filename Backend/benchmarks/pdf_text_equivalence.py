@@ -0,0 +1,122 @@
+"""Check that every PDF text engine parses statements as pdfplumber does.
+
+For each PDF in the corpus, each engine's text is parsed and compared
+with the parse of pdfplumber's text. An engine may read a layout
+differently, as long as statements.plausible() rejects its parse so the
+fallback engine takes over; a parse that is accepted but differs is a
+failure, and the script exits non-zero.
+
+The built-in corpus is synthetic (benchmarks/synthetic_statements.py):
+statements of several sizes, page lengths that split transaction rows
+across pages, an empty statement, a non-statement letter, and a columnar
+layout whose amounts are drawn before their descriptions. Add real
+statements with --dir.
+
+    python benchmarks/pdf_text_equivalence.py [--dir DIR] [--engines pdfium,pdfplumber]
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pdf_text  # noqa: E402
+import statements  # noqa: E402
+from synthetic_statements import _escape, statement_lines, write_pdf  # noqa: E402
+
+
+def write_columns_pdf(path: Path, lines: list[str]) -> None:
+    """One page (up to 70 lines) with each row's amounts drawn first, at the right."""
+    ops = []
+    for i, line in enumerate(lines[:70]):
+        y = 810 - 11 * i
+        words = line.rsplit(" ", 2)
+        if len(words) == 3 and "." in words[1] and words[2][-3:-2] == ".":
+            ops.append(f"BT /F1 9 Tf 420 {y} Td ({words[1]}  {words[2]}) Tj ET")
+            ops.append(f"BT /F1 9 Tf 40 {y} Td ({_escape(words[0])}) Tj ET")
+        else:
+            ops.append(f"BT /F1 9 Tf 40 {y} Td ({_escape(line)}) Tj ET")
+    stream = "\n".join(ops).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [4 0 R] /Count 1 >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 5 0 R "
+        b"/Resources << /Font << /F1 3 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def synthetic_corpus(directory: Path) -> list[Path]:
+    cases = {
+        "small": (statement_lines(12, month=2, seed=1), 60),
+        "large": (statement_lines(1500, month=7, seed=2), 60),
+        "rows_across_pages": (statement_lines(200, month=11, seed=3), 7),
+        "empty": (statement_lines(0, month=4, seed=4), 60),
+        "letter": (["Dear customer", "Your invoice 123 is attached.", "Total due 100.00"], 60),
+    }
+    paths = []
+    for name, (lines, per_page) in cases.items():
+        path = directory / f"{name}.pdf"
+        write_pdf(path, lines, per_page)
+        paths.append(path)
+    path = directory / "columns.pdf"
+    write_columns_pdf(path, statement_lines(25, month=5, seed=5))
+    paths.append(path)
+    return paths
+
+
+def parse(path: Path, engine: str) -> dict:
+    parser = statements.StatementParser()
+    for page in pdf_text.get(engine).iter_pages(str(path)):
+        parser.feed_page(page)
+    parser.close()
+    return parser.result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dir", type=Path, help="directory of statement PDFs to add to the corpus")
+    parser.add_argument("--engines", default=",".join(pdf_text.ENGINES))
+    args = parser.parse_args()
+    engines = [e.name for e in pdf_text.chain(args.engines.split(","))]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus = synthetic_corpus(Path(scratch))
+        if args.dir:
+            corpus += sorted(args.dir.glob("*.pdf"))
+        for path in corpus:
+            reference = parse(path, "pdfplumber")
+            verdicts = []
+            for engine in engines:
+                if engine == "pdfplumber":
+                    continue
+                result = parse(path, engine)
+                accepted = statements.plausible(result)
+                if result == reference:
+                    verdicts.append(f"{engine}: same ({'accepted' if accepted else 'falls back'})")
+                elif accepted:
+                    failures += 1
+                    verdicts.append(f"{engine}: DIFFERENT but accepted")
+                else:
+                    verdicts.append(f"{engine}: differs, falls back")
+            print(f"{path.name}: {len(reference['transactions'])} transactions; " + "; ".join(verdicts))
+    print("FAILED" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Synthetic bank statements in the layout statements.parse_text() reads.
+
+statement_lines() produces the text lines of one statement: the period and
+closing-balance metadata, the opening balance, and transaction rows whose
+description wraps onto continuation lines. write_pdf() lays lines out on
+plain text-only PDF pages (no third-party writer needed), so the result
+goes through the same pdfplumber extraction as a real statement.
+iter_statement_lines() and iter_pages() produce statements of any size
+(e.g. 100k+ transaction lines) lazily, for benchmarking the parser alone.
+
+    python benchmarks/synthetic_statements.py OUT_DIR [--files N] [--transactions N]
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+PAYEES = [
+    ("DIRECT DEBIT - PROPERTY", "MANAGEMENT CO Office Lease"),
+    ("EFTPOS PURCHASE - OFFICEWORKS", "Stationery and supplies"),
+    ("DIRECT CREDIT - CLIENT", "PAYMENT Invoice settlement"),
+    ("BPAY - ENERGY AUSTRALIA", "Electricity account"),
+    ("TRANSFER TO - PAYROLL", "ACCOUNT Fortnightly wages"),
+    ("ATM WITHDRAWAL - CBD", "BRANCH Cash"),
+]
+
+
+def _rows(transactions: int, month: int, year: int, seed: int):
+    """(line, balance after it) of the opening balance and transaction rows."""
+    rng = random.Random(seed * 1000 + month)
+    short = MONTHS[(month - 1) % 12][:3]
+    balance = round(rng.uniform(20000, 60000), 2)
+    yield f"01 {short} {year} OPENING BALANCE {balance:.2f}", balance
+    for i in range(transactions):
+        day = min(28, 1 + i * 28 // max(transactions, 1))
+        head, tail = rng.choice(PAYEES)
+        amount = round(rng.uniform(5, 5000), 2)
+        balance = round(balance + amount if "CREDIT" in head else balance - amount, 2)
+        yield f"{day:02d} {short} {head} {amount:.2f} {balance:.2f}", balance
+        yield f"{tail} - {rng.randint(100, 999)} CR", balance
+        if rng.random() < 0.3:
+            yield f"Reference {rng.randint(10000, 99999)}", balance
+
+
+def iter_statement_lines(transactions: int, month: int = 1, year: int = 2018, seed: int = 0):
+    """statement_lines() one at a time, without holding the statement in memory."""
+    closing = None
+    # The closing balance heads the statement; a dry run of the rows finds it
+    for _, closing in _rows(transactions, month, year, seed):
+        pass
+    name = MONTHS[(month - 1) % 12]
+    yield "Statement Period"
+    yield f"1 {name} {year} - 28 {name} {year}"
+    yield "Closing Balance"
+    yield f"${closing:.2f} CR"
+    for line, _ in _rows(transactions, month, year, seed):
+        yield line
+
+
+def statement_lines(transactions: int, month: int = 1, year: int = 2018, seed: int = 0) -> list[str]:
+    return list(iter_statement_lines(transactions, month, year, seed))
+
+
+def iter_pages(lines, lines_per_page: int = 60):
+    """Group lines into page texts as extract_pages() returns them."""
+    page = []
+    for line in lines:
+        page.append(line)
+        if len(page) == lines_per_page:
+            yield "\n".join(page)
+            page = []
+    if page:
+        yield "\n".join(page)
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, lines: list[str], lines_per_page: int = 60) -> int:
+    """Write lines as a text-only PDF; returns the number of pages."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a page and its
+    # content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(len(pages))), len(pages)
+        ),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, page in enumerate(pages):
+        text = " ".join(f"({_escape(line)}) '" for line in page)
+        stream = f"BT /F1 9 Tf 11 TL 40 810 Td {text} ET".encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(out))
+    return len(pages)
+
+
+def write_statements(directory: Path, files: int, transactions: int, seed: int = 0) -> list[Path]:
+    """statement_month_1.pdf .. statement_month_N.pdf in directory."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for month in range(1, files + 1):
+        path = directory / f"statement_month_{month}.pdf"
+        write_pdf(path, statement_lines(transactions, month=month, seed=seed))
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--transactions", type=int, default=200, help="per statement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = write_statements(args.out_dir, args.files, args.transactions, args.seed)
+    print(f"Wrote {len(paths)} statement(s) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Map-reduce analysis of long statements: token-budgeted, overlapping windows.
+
+An uploaded statement is turned into rows (one per parsed transaction, or
+one per text line when the layout is not recognised) and split into windows
+of at most FIRMWATCH_CHUNK_TOKENS estimated tokens. Consecutive windows
+share FIRMWATCH_CHUNK_OVERLAP rows, so a duplicate or near-duplicate pair
+that straddles a boundary is still seen together by one request.
+
+The windows are analysed concurrently (FIRMWATCH_CHUNK_CONCURRENCY at a
+time, on top of the OpenRouter policy's own limits) and FlaggedMerger drops
+the copies of a flagged transaction that two neighbouring windows both
+reported because it sits in their overlap. Only items whose amount appears
+in the rows the two windows share are merged, so identical transactions
+elsewhere in the windows (or with FIRMWATCH_CHUNK_OVERLAP=0) all survive.
+"""
+
+import os
+import re
+from collections import Counter
+
+from baseline import transaction_header, transaction_line
+from email_batch import estimate_tokens
+from prescreen import vendor_key
+
+CHUNK_TOKENS = int(os.getenv("FIRMWATCH_CHUNK_TOKENS", "6000"))
+CHUNK_OVERLAP = int(os.getenv("FIRMWATCH_CHUNK_OVERLAP", "8"))
+CHUNK_CONCURRENCY = int(os.getenv("FIRMWATCH_CHUNK_CONCURRENCY", "4"))
+
+stats = Counter()
+
+_NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def statement_rows(parsed: dict, text: str) -> tuple[str, list[str]]:
+    """(header, rows) to chunk: parsed transactions, else non-empty text lines."""
+    transactions = parsed.get("transactions") or []
+    if transactions:
+        return transaction_header(parsed), [transaction_line(t) for t in transactions]
+    return "", [line for line in (text or "").splitlines() if line.strip()]
+
+
+def plan_windows(
+    rows: list[str], token_budget: int | None = None, overlap: int | None = None
+) -> list[tuple[int, int]]:
+    """Split rows into [start, end) windows of at most token_budget tokens.
+
+    Each window after the first starts overlap rows before the previous one
+    ended. A row too large for the budget on its own gets a window of one.
+    """
+    budget = token_budget or CHUNK_TOKENS
+    overlap = CHUNK_OVERLAP if overlap is None else overlap
+    costs = [estimate_tokens(row) for row in rows]
+    windows: list[tuple[int, int]] = []
+    start = 0
+    while start < len(rows):
+        end, used = start, 0
+        while end < len(rows) and (end == start or used + costs[end] <= budget):
+            used += costs[end]
+            end += 1
+        windows.append((start, end))
+        if end >= len(rows):
+            break
+        # Always move forward, even when the overlap would cover the whole window
+        start = max(end - overlap, start + 1)
+    return windows
+
+
+def render_window(header: str, rows: list[str], window: tuple[int, int], part: int, parts: int) -> str:
+    start, end = window
+    lines = [header] if header else []
+    if parts > 1:
+        lines.insert(0, f"Part {part} of {parts} (rows {start + 1}-{end} of {len(rows)}; "
+                        "neighbouring parts share a few rows)")
+    lines.extend(rows[start:end])
+    return "\n".join(lines)
+
+
+def shared_amounts(rows: list[str], windows: list[tuple[int, int]]) -> list[frozenset]:
+    """Amounts in the rows each pair of consecutive windows shares.
+
+    Element i is for windows i and i + 1, and is empty when they share no
+    rows.
+    """
+    shared = []
+    for (_, end), (start, _) in zip(windows, windows[1:]):
+        shared.append(frozenset(
+            amount
+            for row in rows[start:end]
+            for amount in map(_amount, _NUMBER.findall(row))
+            if amount is not None
+        ))
+    return shared
+
+
+
+def _amount(value) -> float | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    match = re.search(r"-?[\d,]+(?:\.\d+)?", str(value or ""))
+    if not match:
+        return None
+    try:
+        return round(float(match.group(0).replace(",", "")), 2)
+    except ValueError:
+        return None
+
+
+def flagged_key(item: dict) -> tuple:
+    """What identifies a flagged transaction across two windows' replies."""
+    amount = _amount(item.get("amount"))
+    date = " ".join(str(item.get("transactionDate") or "").lower().split())
+    vendor = vendor_key(item.get("vendor"))
+    if amount is None:
+        return vendor, date, vendor_key(item.get("reason"))
+    return vendor, date, amount
+
+
+def _score(item: dict) -> float:
+    score = item.get("riskScore")
+    return score if isinstance(score, (int, float)) and not isinstance(score, bool) else 0
+
+
+class FlaggedMerger:
+    """Merges flagged items streamed from overlapping windows.
+
+    An item matches an earlier one with the same flagged_key() that came
+    from a neighbouring window and has not been matched by this window
+    yet, so two genuinely repeated transactions within one window both
+    survive. The two windows must also share a row with the item's amount
+    (any row, for an item without one), per shared_amounts(). The merged
+    entry keeps the higher-risk copy.
+    """
+
+    def __init__(self, shared: list[frozenset] = ()):
+        self._shared = list(shared)
+        # key -> [(position, windows it has been reported by), ...]
+        self._entries: dict[tuple, list[tuple]] = {}
+        self._items: list[dict] = []
+
+    def _in_overlap(self, first: int, item: dict) -> bool:
+        """Whether item can be in the rows windows first and first + 1 share."""
+        amounts = self._shared[first] if first < len(self._shared) else frozenset()
+        amount = _amount(item.get("amount"))
+        return amount in amounts if amount is not None else bool(amounts)
+
+    def add(self, window: int, item: dict) -> tuple[int, bool]:
+        """Record an item from a window.
+
+        Returns (position in items(), changed): changed is False when the
+        item was an overlap copy that did not raise the stored risk.
+        """
+        stats["items"] += 1
+        entries = self._entries.setdefault(flagged_key(item), [])
+        for position, windows in entries:
+            if window not in windows and any(
+                abs(w - window) == 1 and self._in_overlap(min(w, window), item) for w in windows
+            ):
+                windows.add(window)
+                stats["duplicates"] += 1
+                if _score(item) <= _score(self._items[position]):
+                    return position, False
+                self._items[position] = dict(item)
+                return position, True
+        entries.append((len(self._items), {window}))
+        self._items.append(dict(item))
+        return len(self._items) - 1, True
+
+    def get(self, position: int) -> dict:
+        return self._items[position]
+
+    def items(self) -> list[dict]:
+        return list(self._items)
+
+
+def summary() -> dict:
+    return {
+        "chunkTokens": CHUNK_TOKENS,
+        "overlapRows": CHUNK_OVERLAP,
+        "concurrency": CHUNK_CONCURRENCY,
+        "documents": stats["documents"],
+        "chunks": stats["chunks"],
+        "failedChunks": stats["failedChunks"],
+        "flaggedItems": stats["items"],
+        "overlapDuplicates": stats["duplicates"],
+    }
@@ -0,0 +1,179 @@
+"""Persistent index of processed Gmail message IDs for sync deduplication.
+
+The IDs live in their own SQLite file, separate from the alert data, and are
+loaded once per process. By default membership is checked against an
+in-memory hash set. With FIRMWATCH_DEDUPE_BLOOM_CAPACITY set, only a Bloom
+filter is kept in memory: a negative answer is final, and the rare positive
+is confirmed with an indexed lookup on disk, so memory stays bounded no
+matter how many IDs are stored.
+
+FIRMWATCH_DEDUPE_RETENTION_DAYS drops IDs first seen longer ago than that;
+the sync query must then be limited to the same window (see server.py).
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEDUPE_DB = Path(os.getenv("FIRMWATCH_DEDUPE_DB", Path(__file__).parent / "processed_emails.db"))
+RETENTION_DAYS = int(os.getenv("FIRMWATCH_DEDUPE_RETENTION_DAYS", "0"))  # 0 keeps IDs forever
+BLOOM_CAPACITY = int(os.getenv("FIRMWATCH_DEDUPE_BLOOM_CAPACITY", "0"))  # 0 disables the filter
+BLOOM_ERROR_RATE = float(os.getenv("FIRMWATCH_DEDUPE_BLOOM_ERROR_RATE", "0.001"))
+
+# Extra slack past the retention window before an ID is forgotten
+RETENTION_SLACK_SECONDS = 24 * 3600
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on blake2b)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class EmailDedupeIndex:
+    """Set of processed email IDs with O(1) membership and optional TTL."""
+
+    def __init__(
+        self,
+        path: Path = DEDUPE_DB,
+        retention_days: int = RETENTION_DAYS,
+        bloom_capacity: int = BLOOM_CAPACITY,
+        bloom_error_rate: float = BLOOM_ERROR_RATE,
+    ):
+        self.path = Path(path)
+        self.retention_days = retention_days
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_emails ("
+            "email_id TEXT PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_processed_emails_seen_at "
+            "ON processed_emails(seen_at)"
+        )
+        self._conn.commit()
+        self._ids: set[str] | None = None
+        self._bloom: BloomFilter | None = None
+        self._load()
+
+    def _load(self) -> None:
+        rows = self._conn.execute("SELECT email_id FROM processed_emails")
+        if self.bloom_capacity:
+            self._ids = None
+            self._bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+            for (eid,) in rows:
+                self._bloom.add(eid)
+        else:
+            self._bloom = None
+            self._ids = {eid for (eid,) in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._ids is not None:
+                return len(self._ids)
+            return self._conn.execute("SELECT COUNT(*) FROM processed_emails").fetchone()[0]
+
+    def __contains__(self, email_id: str) -> bool:
+        with self._lock:
+            return self._contains(email_id)
+
+    def _contains(self, email_id: str) -> bool:
+        if self._ids is not None:
+            return email_id in self._ids
+        if email_id not in self._bloom:
+            return False
+        row = self._conn.execute(
+            "SELECT 1 FROM processed_emails WHERE email_id = ?", (email_id,)
+        ).fetchone()
+        return row is not None
+
+    def filter_new(self, email_ids: list[str]) -> list[str]:
+        """Return the IDs that have not been processed yet, in input order."""
+        with self._lock:
+            return [eid for eid in email_ids if not self._contains(eid)]
+
+    def add(self, email_ids: list[str], seen_at: float | None = None) -> None:
+        """Mark email IDs as processed."""
+        if not email_ids:
+            return
+        seen_at = time.time() if seen_at is None else seen_at
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO processed_emails (email_id, seen_at) VALUES (?, ?)",
+                [(eid, seen_at) for eid in email_ids],
+            )
+            for eid in email_ids:
+                if self._ids is not None:
+                    self._ids.add(eid)
+                else:
+                    self._bloom.add(eid)
+
+    def prune(self, now: float | None = None) -> int:
+        """Forget IDs older than the retention window; return how many."""
+        if not self.retention_days:
+            return 0
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_days * 86400 - RETENTION_SLACK_SECONDS
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute(
+                    "DELETE FROM processed_emails WHERE seen_at < ?", (cutoff,)
+                ).rowcount
+            if removed:
+                # Sets shrink in place; Bloom filters cannot, so rebuild
+                self._load()
+            return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": "bloom" if self._bloom is not None else "set",
+                "bloomBytes": self._bloom.size_bytes if self._bloom is not None else 0,
+                "retentionDays": self.retention_days,
+            }
+
+
+_index: EmailDedupeIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index(legacy_ids: list[str] = ()) -> EmailDedupeIndex:
+    """Open the shared index once, importing legacy IDs on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = EmailDedupeIndex()
+            if legacy_ids and not len(_index):
+                _index.add(list(legacy_ids))
+        return _index
@@ -0,0 +1,142 @@
+"""Batched invoice-email analysis: several emails per chat completion.
+
+Opt-in with FIRMWATCH_EMAIL_BATCH_SIZE > 1. Emails are packed into one
+request until the batch size or the token budget is reached, so the
+instructions and JSON schema are sent once per batch rather than once per
+email. The model answers with an array keyed by the email labels, and each
+element is validated on its own; anything missing or malformed is left for
+the caller to re-analyze with a single-email request.
+"""
+
+import os
+from collections import Counter
+
+BATCH_SIZE = int(os.getenv("FIRMWATCH_EMAIL_BATCH_SIZE", "0"))  # 0/1 disables batching
+# Rough input + output tokens one request may use
+TOKEN_BUDGET = int(os.getenv("FIRMWATCH_EMAIL_BATCH_TOKENS", "12000"))
+
+# Crude estimate that errs on the high side for English text
+CHARS_PER_TOKEN = 3.5
+# Expected reply size per email, reserved from the budget
+OUTPUT_TOKENS_PER_EMAIL = 350
+# Labels and field names around each email
+EMAIL_OVERHEAD_TOKENS = 40
+
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH")
+
+BATCH_ANALYSIS_PROMPT = """You are a financial fraud analyst AI. Analyze each of the following emails independently and determine if it may be a fraudulent or suspicious invoice.
+
+{emails}
+
+Respond ONLY with valid JSON (no markdown, no extra text): an array with exactly one object per email, in this exact structure:
+[
+  {{
+    "key": "<the email label, e.g. E1>",
+    "riskScore": <integer 0-100>,
+    "riskLevel": "<LOW|MEDIUM|HIGH>",
+    "reason": "<one-line reason>",
+    "flags": ["<flag1>", "<flag2>"],
+    "summary": "<2-3 sentence analysis>",
+    "amount": <number or null if no dollar amount found>,
+    "factors": [
+      {{
+        "title": "<factor name>",
+        "severity": "<high|medium|low>",
+        "description": "<explanation>"
+      }}
+    ]
+  }}
+]"""
+
+EMAIL_BLOCK = """=== EMAIL {key} ===
+EMAIL SUBJECT: {subject}
+EMAIL FROM: {sender}
+EMAIL BODY:
+{body}
+"""
+
+stats = Counter()
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def email_cost(fields: dict) -> int:
+    text = "".join(str(fields.get(k) or "") for k in ("subject", "sender", "body"))
+    return estimate_tokens(text) + EMAIL_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_EMAIL
+
+
+def plan_batches(
+    emails: list[dict], batch_size: int | None = None, token_budget: int | None = None
+) -> list[list[int]]:
+    """Split email field dicts into consecutive index groups.
+
+    A group closes when it holds batch_size emails or the next email would
+    push it past token_budget. An email too large for the budget on its
+    own still gets a group of one.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    budget = (token_budget or TOKEN_BUDGET) - estimate_tokens(BATCH_ANALYSIS_PROMPT)
+    groups: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, fields in enumerate(emails):
+        cost = email_cost(fields)
+        if current and (len(current) >= max(batch_size, 1) or used + cost > budget):
+            groups.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def batch_key(position: int) -> str:
+    return f"E{position + 1}"
+
+
+def render_prompt(emails: list[dict]) -> str:
+    """The batch prompt for emails given as server.email_cache_inputs() values."""
+    blocks = "\n".join(
+        EMAIL_BLOCK.format(key=batch_key(i), **fields) for i, fields in enumerate(emails)
+    )
+    return BATCH_ANALYSIS_PROMPT.format(emails=blocks)
+
+
+def _valid_analysis(item) -> bool:
+    if not isinstance(item, dict):
+        return False
+    score = item.get("riskScore")
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+        return False
+    if item.get("riskLevel") not in RISK_LEVELS:
+        return False
+    if not isinstance(item.get("flags", []), list) or not isinstance(item.get("factors", []), list):
+        return False
+    amount = item.get("amount")
+    return amount is None or (isinstance(amount, (int, float)) and not isinstance(amount, bool))
+
+
+def match_item(item, count: int) -> dict[int, dict]:
+    """Email positions answered by one element of a (streamed) batch reply.
+
+    An element is normally one keyed analysis; a reply that is an object
+    keyed by label arrives as a single element answering several emails.
+    """
+    if not isinstance(item, dict):
+        return {}
+    if "key" not in item:
+        items = [{**v, "key": k} for k, v in item.items() if isinstance(v, dict)]
+    else:
+        items = [item]
+    positions = {batch_key(i): i for i in range(count)}
+    matched = {}
+    for item in items:
+        pos = positions.get(str(item.get("key", "")).strip().upper())
+        if pos is None or pos in matched or not _valid_analysis(item):
+            continue
+        matched[pos] = {k: v for k, v in item.items() if k != "key"}
+    return matched
+
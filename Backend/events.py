@@ -0,0 +1,52 @@
+"""In-process fan-out of live pipeline events to server-sent-event clients.
+
+Pipelines publish alerts as soon as they are produced (before they are
+committed) plus start/finish notices; every connected /api/events client
+gets its own bounded queue. A client that falls too far behind loses the
+oldest events rather than slowing the pipelines down.
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.getenv("FIRMWATCH_EVENTS_QUEUE_SIZE", "1000"))
+
+
+def format_sse(event: str, data) -> str:
+    """Encode one server-sent event."""
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class EventBroker:
+    """Publish/subscribe hub for live pipeline events."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data) -> None:
+        message = format_sse(event, data)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                logger.warning("Live event client is lagging; dropped its oldest event.")
+            queue.put_nowait(message)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+broker = EventBroker()
@@ -0,0 +1,71 @@
+"""Incremental parser for a JSON array arriving in chunks (streamed LLM replies).
+
+JsonArrayStream.feed() returns every top-level element whose closing brace
+has arrived, so callers can act on the first flagged transaction while the
+model is still writing the rest. Text before the opening "[" (a markdown
+fence, a stray sentence) is skipped.
+"""
+
+import json
+
+
+class JsonArrayStream:
+    """Yield the elements of a top-level JSON array as soon as each closes."""
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self._current: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._text: list[str] = []
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> list:
+        elements = []
+        self._text.append(chunk)
+        for ch in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                continue
+            if self._in_string:
+                self._current.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0 and ch in ",]":
+                # End of a scalar element, or of the array itself
+                if "".join(self._current).strip():
+                    elements.append(self._pop_element())
+                if ch == "]":
+                    self.finished = True
+                continue
+            if self._depth == 0 and ch.isspace() and not self._current:
+                continue
+            self._current.append(ch)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    elements.append(self._pop_element())
+        return elements
+
+    def _pop_element(self):
+        raw = "".join(self._current)
+        self._current = []
+        return json.loads(raw)
@@ -0,0 +1,329 @@
+"""Shared OpenRouter chat-completions client.
+
+One httpx.AsyncClient lives for the whole app (opened in the FastAPI
+lifespan, see server.py), so analysis calls reuse pooled keep-alive
+connections instead of paying a TCP + TLS handshake each. HTTP/2 is used
+when the h2 package is installed (httpx[http2]); otherwise the client falls
+back to HTTP/1.1 keep-alive.
+
+stream() and stream_json_array() use streaming completions, so callers can
+act on the first element of a long JSON reply before the rest is written.
+
+Connection setup, reuse and time spent waiting for a pooled connection are
+collected through the httpcore "trace" extension and exposed by stats().
+
+Every request goes through the OpenRouter policy in resilience.py (rate
+limit, adaptive concurrency, retries, circuit breaker). A stream is only
+retried if it fails before its first token.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import httpx
+
+from json_stream import JsonArrayStream
+from resilience import Resilience, openrouter_policy
+
+logger = logging.getLogger(__name__)
+
+# Overridable to point at a local fake server (see benchmarks/fake_openrouter.py)
+OPENROUTER_URL = os.getenv(
+    "FIRMWATCH_OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions"
+)
+DEFAULT_MODEL = "anthropic/claude-sonnet-4"
+
+MAX_CONNECTIONS = int(os.getenv("FIRMWATCH_LLM_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("FIRMWATCH_LLM_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("FIRMWATCH_LLM_KEEPALIVE_SECONDS", "60"))
+CONNECT_TIMEOUT = float(os.getenv("FIRMWATCH_LLM_CONNECT_TIMEOUT", "10"))
+POOL_TIMEOUT = float(os.getenv("FIRMWATCH_LLM_POOL_TIMEOUT", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def strip_fences(content: str) -> str:
+    """Remove a surrounding ```/```json markdown fence from a model reply."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+    if content.endswith("```"):
+        content = content.rsplit("```", 1)[0]
+    return content.strip()
+
+
+def parse_json_reply(content: str):
+    """Parse a model reply that should be JSON, tolerating markdown fences."""
+    return json.loads(strip_fences(content))
+
+
+class LLMClient:
+    """Pooled, app-lifetime client for OpenRouter chat completions."""
+
+    def __init__(
+        self,
+        url: str = OPENROUTER_URL,
+        api_key: str | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive: int = MAX_KEEPALIVE,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY,
+        http2: bool = HTTP2_AVAILABLE,
+        policy: Resilience = openrouter_policy,
+    ):
+        self.url = url
+        self.policy = policy
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._metrics = Counter()
+        self._http_versions = Counter()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._pool_wait_max = 0.0
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def _headers(self) -> dict:
+        api_key = self.api_key if self.api_key is not None else os.getenv("OPENROUTER_API_KEY", "")
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "X-Title": "FirWatch",
+        }
+
+    async def start(self) -> None:
+        """Open the shared client on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop:
+            return
+        if self._client is not None:
+            # Connections belong to the loop that opened them
+            logger.info("Event loop changed; reopening the LLM client.")
+        if not self.http2:
+            logger.info("h2 is not installed; LLM client will use HTTP/1.1 keep-alive.")
+        self._loop = loop
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            headers=self._headers(),
+            timeout=httpx.Timeout(60.0, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    # -- calls --------------------------------------------------------------
+
+    def _tracer(self, timing: dict):
+        async def trace(event: str, info: dict) -> None:
+            now = time.perf_counter()
+            if event == "connection.connect_tcp.started":
+                timing["connect_started"] = now
+            elif event == "connection.connect_tcp.complete":
+                self._metrics["connectionsOpened"] += 1
+            elif event == "connection.start_tls.complete":
+                self._metrics["tlsHandshakes"] += 1
+            elif event.endswith(".send_request_headers.started") and timing["sent"] is None:
+                timing["sent"] = now
+            if event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                timing["connect"] = now - timing.get("connect_started", now)
+
+        return trace
+
+    @asynccontextmanager
+    async def _tracked(self):
+        """Count one request in the metrics; yields its timing record."""
+        await self.start()
+        timing = {"start": time.perf_counter(), "connect": 0.0, "sent": None}
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        self._metrics["requests"] += 1
+        try:
+            yield timing
+        except Exception:
+            self._metrics["failures"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._record_timing(timing)
+
+    def _record_response(self, resp: httpx.Response, timing: dict) -> None:
+        self._http_versions[resp.http_version] += 1
+        if not timing["connect"]:
+            self._metrics["reusedConnections"] += 1
+
+    def _record_timing(self, timing: dict) -> None:
+        end = time.perf_counter()
+        self._metrics["latencyMs"] += (end - timing["start"]) * 1000
+        if timing["sent"] is not None:
+            # Time before the request went out that was not spent connecting,
+            # i.e. waiting for a pooled connection or an HTTP/2 stream
+            wait = max(0.0, timing["sent"] - timing["start"] - timing["connect"])
+            self._metrics["poolWaitMs"] += wait * 1000
+            self._pool_wait_max = max(self._pool_wait_max, wait * 1000)
+
+    def _body(self, prompt: str, model: str, temperature: float, stream: bool = False) -> dict:
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+        }
+        if stream:
+            body["stream"] = True
+        return body
+
+    @staticmethod
+    def _timeout(timeout: float) -> httpx.Timeout:
+        return httpx.Timeout(timeout, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT)
+
+    async def complete(
+        self,
+        prompt: str,
+        timeout: float = 60.0,
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.2,
+    ) -> str:
+        """Send one user prompt and return the reply text."""
+
+        async def send() -> httpx.Response:
+            async with self._tracked() as timing:
+                resp = await self._client.post(
+                    self.url,
+                    json=self._body(prompt, model, temperature),
+                    timeout=self._timeout(timeout),
+                    extensions={"trace": self._tracer(timing)},
+                )
+                resp.raise_for_status()
+                self._record_response(resp, timing)
+            return resp
+
+        resp = await self.policy.call(send)
+        return resp.json()["choices"][0]["message"]["content"]
+
+    async def complete_json(self, prompt: str, timeout: float = 60.0, **kwargs):
+        """complete() and parse the reply as JSON."""
+        return parse_json_reply(await self.complete(prompt, timeout=timeout, **kwargs))
+
+    async def stream(
+        self,
+        prompt: str,
+        timeout: float = 60.0,
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.2,
+    ):
+        """Send one user prompt and yield the reply text as it is generated.
+
+        timeout bounds each read, so a long reply is fine as long as tokens
+        keep arriving.
+        """
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.policy.attempt():
+                    async for delta in self._stream_once(prompt, timeout, model, temperature):
+                        started = True
+                        yield delta
+                return
+            except Exception as e:
+                # Text already handed to the caller cannot be taken back
+                delay = None if started else self.policy.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.info(f"OpenRouter stream failed ({e}); retry {attempt} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def _stream_once(self, prompt: str, timeout: float, model: str, temperature: float):
+        async with self._tracked() as timing:
+            async with self._client.stream(
+                "POST",
+                self.url,
+                json=self._body(prompt, model, temperature, stream=True),
+                timeout=self._timeout(timeout),
+                extensions={"trace": self._tracer(timing)},
+            ) as resp:
+                if resp.is_error:
+                    await resp.aread()
+                resp.raise_for_status()
+                self._record_response(resp, timing)
+                self._metrics["streams"] += 1
+                first = True
+                async for line in resp.aiter_lines():
+                    # Server-sent events; ":"-prefixed lines are keep-alive comments
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    chunk = json.loads(payload)
+                    if "error" in chunk:
+                        raise RuntimeError(f"OpenRouter stream error: {chunk['error']}")
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if not delta:
+                        continue
+                    if first:
+                        first = False
+                        self._metrics["firstTokenMs"] += (time.perf_counter() - timing["start"]) * 1000
+                    yield delta
+
+    async def stream_json_array(self, prompt: str, timeout: float = 60.0, **kwargs):
+        """stream() a reply that should be a JSON array; yield each element.
+
+        A reply that turns out not to be an array is parsed whole at the end
+        (a bare object counts as a one-element array).
+        """
+        parser = JsonArrayStream()
+        async for delta in self.stream(prompt, timeout=timeout, **kwargs):
+            for element in parser.feed(delta):
+                yield element
+        if not parser.started:
+            reply = parse_json_reply(parser.text)
+            for element in reply if isinstance(reply, list) else [reply]:
+                yield element
+
+    def stats(self) -> dict:
+        requests = self._metrics["requests"]
+        return {
+            "http2": self.http2,
+            "maxConnections": self.limits.max_connections,
+            "maxKeepalive": self.limits.max_keepalive_connections,
+            "requests": requests,
+            "failures": self._metrics["failures"],
+            "inFlight": self._in_flight,
+            "peakInFlight": self._peak_in_flight,
+            "connectionsOpened": self._metrics["connectionsOpened"],
+            "tlsHandshakes": self._metrics["tlsHandshakes"],
+            "reusedConnections": self._metrics["reusedConnections"],
+            "httpVersions": dict(self._http_versions),
+            "avgLatencyMs": round(self._metrics["latencyMs"] / requests, 1) if requests else 0.0,
+            "streams": self._metrics["streams"],
+            "avgFirstTokenMs": (
+                round(self._metrics["firstTokenMs"] / self._metrics["streams"], 1)
+                if self._metrics["streams"] else 0.0
+            ),
+            "avgPoolWaitMs": round(self._metrics["poolWaitMs"] / requests, 1) if requests else 0.0,
+            "maxPoolWaitMs": round(self._pool_wait_max, 1),
+        }
+
+
+llm = LLMClient()
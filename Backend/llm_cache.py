@@ -0,0 +1,278 @@
+"""Content-addressed, disk-backed cache of LLM analysis results.
+
+Entries are keyed on a hash of (model, prompt name, prompt template hash,
+normalized input), so an edited prompt template never serves stale answers
+and an email re-fetched under a new ID costs no tokens. Results live in an
+SQLite file, fronted by a small in-memory LRU so repeated lookups in one
+process skip the disk entirely.
+
+Eviction is LRU by last access under a total size cap, plus a TTL. Failed
+calls are never cached. FIRMWATCH_LLM_CACHE=0 bypasses the cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB = Path(os.getenv("FIRMWATCH_LLM_CACHE_DB", Path(__file__).parent / "llm_cache.db"))
+CACHE_ENABLED = os.getenv("FIRMWATCH_LLM_CACHE", "1").lower() not in ("0", "false", "off")
+TTL_DAYS = float(os.getenv("FIRMWATCH_LLM_CACHE_TTL_DAYS", "30"))  # 0 never expires
+MAX_BYTES = int(float(os.getenv("FIRMWATCH_LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+MEMORY_ENTRIES = int(os.getenv("FIRMWATCH_LLM_CACHE_MEMORY_ENTRIES", "1024"))
+
+# After exceeding the cap, evict down to this share of it
+EVICT_TO = 0.9
+
+_REPLY_PREFIX = re.compile(r"^\s*((re|fw|fwd)\s*:\s*)+", re.IGNORECASE)
+
+
+def normalize_text(value) -> str:
+    """Collapse whitespace so re-wrapped copies of a text hash the same."""
+    return " ".join(str(value or "").split())
+
+
+def normalize_subject(subject) -> str:
+    """normalize_text without leading Re:/Fwd: markers."""
+    return _REPLY_PREFIX.sub("", normalize_text(subject))
+
+
+def prompt_version(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(model: str, name: str, template: str, inputs) -> str:
+    payload = json.dumps(
+        [model, name, prompt_version(template), inputs],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Persistent LRU/TTL cache in front of the analyze_* LLM calls."""
+
+    def __init__(
+        self,
+        path: Path = CACHE_DB,
+        enabled: bool = CACHE_ENABLED,
+        ttl_days: float = TTL_DAYS,
+        max_bytes: int = MAX_BYTES,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.ttl_seconds = ttl_days * 86400
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._counters = Counter()
+
+    # -- storage ------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed_at ON llm_cache(accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and created_at < now - self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0], time.time()):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[1]
+
+    def _disk_get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            with conn:
+                if self._expired(created_at, now):
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._remember(key, created_at, value)
+            return value
+
+    def _disk_put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(key) + len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._remember(key, now, value)
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds:
+            expired = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            self._counters["evictions"] += expired
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        for (key,) in victims:
+            self._memory.pop(key, None)
+        self._counters["evictions"] += len(victims)
+
+    # -- API ----------------------------------------------------------------
+
+    async def cached(self, name: str, template: str, inputs, compute, model: str):
+        """Return the cached result for inputs, or await compute() and store it.
+
+        name and template identify the prompt, inputs is the normalized
+        JSON-able input, and compute is a no-argument coroutine function
+        making the real LLM call. Concurrent misses on one key share a call.
+        """
+        if not self.enabled:
+            self._counters["bypassed"] += 1
+            return await compute()
+
+        key = cache_key(model, name, template, inputs)
+        value = await self._lookup(key)
+        if value is not None:
+            self._counters["hits"] += 1
+            return json.loads(value)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._counters["hits"] += 1
+            return json.loads(await asyncio.shield(pending))
+
+        self._counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters see the error; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+        value = json.dumps(result, ensure_ascii=False)
+        if not future.done():
+            future.set_result(value)
+        await self._store(key, value)
+        return result
+
+    async def get(self, name: str, template: str, inputs, model: str):
+        """Cached result for inputs, or None; for callers that batch misses."""
+        if not self.enabled:
+            self._counters["bypassed"] += 1
+            return None
+        value = await self._lookup(cache_key(model, name, template, inputs))
+        self._counters["hits" if value is not None else "misses"] += 1
+        return json.loads(value) if value is not None else None
+
+    async def put(self, name: str, template: str, inputs, model: str, result) -> None:
+        if self.enabled:
+            await self._store(
+                cache_key(model, name, template, inputs), json.dumps(result, ensure_ascii=False)
+            )
+
+    async def _lookup(self, key: str) -> str | None:
+        value = self._memory_get(key)
+        if value is None:
+            value = await asyncio.to_thread(self._disk_get, key)
+        return value
+
+    async def _store(self, key: str, value: str) -> None:
+        try:
+            await asyncio.to_thread(self._disk_put, key, value)
+        except Exception as e:
+            logger.warning(f"Could not store LLM result in cache: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            with self._connect() as conn:
+                conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        with self._lock:
+            entries, size = (0, 0)
+            if self._conn is not None or self.path.exists():
+                entries, size = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                ).fetchone()
+        return {
+            "enabled": self.enabled,
+            "hits": self._counters["hits"],
+            "misses": self._counters["misses"],
+            "bypassed": self._counters["bypassed"],
+            "evictions": self._counters["evictions"],
+            "hitRate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "sizeBytes": size,
+            "maxBytes": self.max_bytes,
+            "memoryEntries": len(self._memory),
+        }
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,148 @@
+"""Disk cache of extracted PDF page text and parsed statements.
+
+Entries are keyed on (kind, sha256 of the PDF content, version): "pages"
+holds the text of every page under the text extractor's version, "parsed"
+the structured statement under the parser's version (see statements.py).
+A replaced PDF hashes differently and simply misses; a parser change only
+invalidates the parsed entries, and the page text is parsed again without
+re-extracting it.
+
+Values are zlib-compressed JSON in an SQLite file. Least recently used
+entries are evicted past FIRMWATCH_PARSE_CACHE_MAX_MB. FIRMWATCH_PARSE_CACHE=0
+disables the cache.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB = Path(os.getenv("FIRMWATCH_PARSE_CACHE_DB", Path(__file__).parent / "parse_cache.db"))
+CACHE_ENABLED = os.getenv("FIRMWATCH_PARSE_CACHE", "1").lower() not in ("0", "false", "off")
+MAX_BYTES = int(float(os.getenv("FIRMWATCH_PARSE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# After exceeding the cap, evict down to this share of it
+EVICT_TO = 0.9
+
+
+class ParseCache:
+    """Persistent LRU cache of page text and parsed statements by content hash."""
+
+    def __init__(self, path: Path = CACHE_DB, enabled: bool = CACHE_ENABLED, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "kind TEXT NOT NULL, digest TEXT NOT NULL, version TEXT NOT NULL, "
+                "value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, digest, version)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_parse_cache_accessed_at ON parse_cache(accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, kind: str, digest: str, version: str):
+        """The cached value, or None."""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value FROM parse_cache WHERE kind = ? AND digest = ? AND version = ?",
+                    (kind, digest, version),
+                ).fetchone()
+                if row is not None:
+                    with conn:
+                        conn.execute(
+                            "UPDATE parse_cache SET accessed_at = ? "
+                            "WHERE kind = ? AND digest = ? AND version = ?",
+                            (time.time(), kind, digest, version),
+                        )
+        except sqlite3.Error as e:
+            logger.warning(f"Parse cache lookup failed: {e}")
+            return None
+        self._counters[f"{kind}Hits" if row is not None else f"{kind}Misses"] += 1
+        return json.loads(zlib.decompress(row[0])) if row is not None else None
+
+    def put(self, kind: str, digest: str, version: str, value) -> None:
+        if not self.enabled:
+            return
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO parse_cache "
+                        "(kind, digest, version, value, size, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (kind, digest, version, blob, len(blob) + len(digest), time.time()),
+                    )
+                    self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store {kind} in the parse cache: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        victims = []
+        for kind, digest, version, size in conn.execute(
+            "SELECT kind, digest, version, size FROM parse_cache ORDER BY accessed_at"
+        ):
+            victims.append((kind, digest, version))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany(
+            "DELETE FROM parse_cache WHERE kind = ? AND digest = ? AND version = ?", victims
+        )
+        self._counters["evictions"] += len(victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM parse_cache")
+
+    def stats(self) -> dict:
+        entries, size = 0, 0
+        if self.enabled and (self._conn is not None or self.path.exists()):
+            with self._lock:
+                entries, size = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM parse_cache"
+                ).fetchone()
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "sizeBytes": size,
+            "maxBytes": self.max_bytes,
+            "pagesHits": self._counters["pagesHits"],
+            "pagesMisses": self._counters["pagesMisses"],
+            "parsedHits": self._counters["parsedHits"],
+            "parsedMisses": self._counters["parsedMisses"],
+            "evictions": self._counters["evictions"],
+        }
+
+
+parse_cache = ParseCache()
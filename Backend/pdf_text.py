@@ -0,0 +1,135 @@
+"""PDF text extraction engines for statement parsing.
+
+Every engine returns one string per page, with lines separated by "\n"
+and no trailing newline, as pdfplumber's page.extract_text() does:
+
+  - "pdfium": PDFium's text layer through pypdfium2 (installed with
+    pdfplumber). Compiled code, by far the fastest; lines come out in the
+    order the PDF draws them.
+  - "pdfplumber": pdfplumber's layout-aware extraction, which orders words
+    by their position on the page. Accurate for any layout, and slow.
+
+FIRMWATCH_PDF_ENGINES lists the engines to try in order (default
+"pdfium,pdfplumber"). statements.py uses the first one whose text parses
+as a plausible statement and the last one regardless, so
+FIRMWATCH_PDF_ENGINES=pdfplumber restores layout-aware extraction only.
+An engine whose library cannot be imported is left out with a warning.
+
+pdfminer.six on its own is not offered: without layout analysis it emits
+a page's characters with no line breaks, and with it, it is most of
+pdfplumber's cost.
+"""
+
+import logging
+import os
+import threading
+
+import pdfplumber
+
+logger = logging.getLogger(__name__)
+
+ENGINE_NAMES = [
+    name.strip().lower()
+    for name in os.getenv("FIRMWATCH_PDF_ENGINES", "pdfium,pdfplumber").split(",")
+    if name.strip()
+]
+
+
+def _normalize(text: str) -> str:
+    """Page text in extract_text()'s shape: "\n" line breaks, no blank first or last line.
+
+    A stray blank line at a page edge would end a transaction row whose
+    description continues on the next page.
+    """
+    return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+class PdfplumberEngine:
+    name = "pdfplumber"
+    version = f"pdfplumber-{pdfplumber.__version__}"
+
+    def page_count(self, pdf_path: str) -> int:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+    def iter_pages(self, pdf_path: str, first_page: int = 0, last_page: int | None = None):
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages[first_page:last_page]:
+                yield page.extract_text() or ""
+
+
+class PdfiumEngine:
+    name = "pdfium"
+
+    def __init__(self):
+        import pypdfium2
+        import pypdfium2.version
+
+        self._pdfium = pypdfium2
+        self.version = f"pdfium-{pypdfium2.version.PYPDFIUM_INFO}-{pypdfium2.version.PDFIUM_INFO}"
+        # PDFium is not thread-safe
+        self._lock = threading.Lock()
+
+    def page_count(self, pdf_path: str) -> int:
+        with self._lock:
+            pdf = self._pdfium.PdfDocument(pdf_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def iter_pages(self, pdf_path: str, first_page: int = 0, last_page: int | None = None):
+        # The lock is held per PDFium call, not across yields: each page is
+        # handed over as soon as it is extracted, and a slow consumer does
+        # not hold up other documents
+        with self._lock:
+            pdf = self._pdfium.PdfDocument(pdf_path)
+        try:
+            with self._lock:
+                numbers = range(len(pdf))[first_page:last_page]
+            for number in numbers:
+                with self._lock:
+                    page = pdf[number]
+                    textpage = page.get_textpage()
+                    text = _normalize(textpage.get_text_range())
+                    textpage.close()
+                    page.close()
+                yield text
+        finally:
+            with self._lock:
+                pdf.close()
+
+
+ENGINES = {"pdfium": PdfiumEngine, "pdfplumber": PdfplumberEngine}
+
+_engines: dict = {}
+_engines_lock = threading.Lock()
+
+
+def get(name: str):
+    """The engine called name; raises ValueError if it is unknown or unavailable."""
+    with _engines_lock:
+        if name not in _engines:
+            if name not in ENGINES:
+                raise ValueError(f"Unknown PDF text engine: {name!r}")
+            try:
+                _engines[name] = ENGINES[name]()
+            except ImportError as e:
+                raise ValueError(f"PDF text engine {name!r} is unavailable: {e}")
+        return _engines[name]
+
+
+def chain(names: list[str] | None = None) -> list:
+    """The configured engines in the order to try them."""
+    engines = []
+    for name in names or ENGINE_NAMES:
+        try:
+            engines.append(get(name))
+        except ValueError as e:
+            if name in ENGINES:
+                logger.warning(f"{e}; skipped")
+                continue
+            raise
+    if not engines:
+        engines.append(get("pdfplumber"))
+    return engines
@@ -0,0 +1,282 @@
+"""Rule-based pre-screening of invoice emails before LLM analysis.
+
+screen() scores an email locally from a handful of cheap signals: an
+allowlisted or historically known vendor, the invoice amount against that
+vendor's earlier amounts, lookalike or mismatched sender domains,
+bank-detail-change wording and urgency language. Clearly routine emails
+(score at or below FIRMWATCH_PRESCREEN_LOW with no risk signal) and clearly
+fraudulent ones (score at or above FIRMWATCH_PRESCREEN_HIGH) are settled
+here; everything in between still goes to the LLM.
+
+Vendor history comes from earlier LOW-risk invoice alerts (VendorHistory is
+built once per sync from the storage snapshot). FIRMWATCH_PRESCREEN=0 sends
+every email to the LLM.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+
+ENABLED = os.getenv("FIRMWATCH_PRESCREEN", "1").lower() not in ("0", "false", "off")
+LOW_THRESHOLD = int(os.getenv("FIRMWATCH_PRESCREEN_LOW", "10"))
+HIGH_THRESHOLD = int(os.getenv("FIRMWATCH_PRESCREEN_HIGH", "85"))
+# Sender domains always treated as known vendors, e.g. "acme.com,globex.io"
+ALLOWLIST = {
+    d.strip().lower()
+    for d in os.getenv("FIRMWATCH_PRESCREEN_ALLOWLIST", "").split(",")
+    if d.strip()
+}
+# Earlier LOW-risk invoices needed before a vendor counts as known
+KNOWN_VENDOR_MIN = int(os.getenv("FIRMWATCH_PRESCREEN_KNOWN_MIN", "3"))
+
+BASE_SCORE = 30
+WEIGHTS = {
+    "allowlisted": -30,
+    "known_vendor": -15,
+    "usual_amount": -10,
+    "amount_anomaly": 25,
+    "lookalike_domain": 40,
+    "domain_mismatch": 30,
+    "free_mail_sender": 10,
+    "bank_detail_change": 30,
+    "urgency_language": 10,
+}
+RISK_SIGNALS = {
+    "amount_anomaly", "lookalike_domain", "domain_mismatch", "free_mail_sender",
+    "bank_detail_change", "urgency_language",
+}
+
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "outlook.com", "hotmail.com",
+    "live.com", "aol.com", "icloud.com", "proton.me", "protonmail.com", "gmx.com",
+}
+# Second-level labels under which the registrable domain has three labels
+_SECOND_LEVEL = {"co", "com", "net", "org", "gov", "ac", "edu"}
+
+BANK_CHANGE = re.compile(
+    r"\b(new|updated?|changed?|change of|different)\b[^.\n]{0,40}"
+    r"\b(bank|account|iban|routing|sort code|remittance|payment) (details|information|number|info)\b"
+    r"|\b(bank|account) (details|information) (have|has) (been )?(changed|updated)\b"
+    r"|\bplease (update|change) (our|the) (bank|account|payment)",
+    re.IGNORECASE,
+)
+URGENCY = re.compile(
+    r"\b(urgent(ly)?|immediate(ly)?|asap|right away|final notice|overdue|past due|"
+    r"within (24|48) hours|today only|avoid (suspension|late fees?)|act now)\b",
+    re.IGNORECASE,
+)
+AMOUNT = re.compile(
+    r"(?:[$€£]|\b(?:USD|EUR|GBP)\s?)\s?(\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)",
+    re.IGNORECASE,
+)
+TOTAL_HINT = re.compile(r"\b(total|amount due|balance due|invoice amount)\b", re.IGNORECASE)
+_HOMOGLYPHS = str.maketrans({"0": "o", "1": "l", "3": "e", "5": "s", "@": "a"})
+
+stats = Counter()
+
+
+def vendor_key(name) -> str:
+    return "".join(re.findall(r"[a-z0-9]+", str(name or "").lower()))
+
+
+def sender_parts(sender: str) -> tuple[str, str]:
+    """(display name, registrable domain) of a From header."""
+    match = re.search(r"[\w.+-]+@([\w-]+(?:\.[\w-]+)+)", sender or "")
+    domain = match.group(1).lower() if match else ""
+    name = sender.split("<")[0].strip().strip('"') if "<" in (sender or "") else ""
+    labels = domain.split(".")
+    if len(labels) > 2 and labels[-2] in _SECOND_LEVEL:
+        domain = ".".join(labels[-3:])
+    elif len(labels) > 2:
+        domain = ".".join(labels[-2:])
+    return name, domain
+
+
+def extract_amount(text: str) -> float | None:
+    """The invoice total: an amount on a "total"/"amount due" line, else the largest."""
+    best = None
+    for line in (text or "").splitlines():
+        amounts = [float(m.replace(",", "")) for m in AMOUNT.findall(line)]
+        if not amounts:
+            continue
+        if TOTAL_HINT.search(line):
+            return max(amounts)
+        best = max(amounts + ([best] if best is not None else []))
+    return best
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _skeleton(domain: str) -> str:
+    label = domain.split(".")[0]
+    return label.translate(_HOMOGLYPHS).replace("rn", "m").replace("vv", "w").replace("-", "")
+
+
+def lookalike_of(domain: str, known: set) -> str | None:
+    """A known domain that domain imitates (close spelling or homoglyphs)."""
+    if not domain or domain in known:
+        return None
+    skeleton = _skeleton(domain)
+    for other in known:
+        if _skeleton(other) == skeleton:
+            return other
+        if len(other) > 5 and _edit_distance(domain, other, 2) <= 2:
+            return other
+    return None
+
+
+class VendorHistory:
+    """Earlier LOW-risk invoice amounts and sender domains per vendor."""
+
+    def __init__(self, alerts: list[dict] = ()):
+        self._invoices = Counter()
+        self._amounts: dict[str, list[float]] = {}
+        self._domains: dict[str, set] = {}
+        self._stats: dict[str, tuple | None] = {}
+        self.known_domains: set = set(ALLOWLIST)
+        for alert in alerts:
+            if alert.get("type") != "Invoice" or alert.get("riskLevel") != "LOW":
+                continue
+            key = vendor_key(alert.get("vendor"))
+            if not key or key == "unknown":
+                continue
+            self._invoices[key] += 1
+            amount = alert.get("amount")
+            if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+                self._amounts.setdefault(key, []).append(float(amount))
+            domain = alert.get("senderDomain")
+            if domain:
+                self._domains.setdefault(key, set()).add(domain)
+        for key, domains in self._domains.items():
+            if self.invoices(key) >= KNOWN_VENDOR_MIN:
+                self.known_domains |= domains
+
+    def invoices(self, key: str) -> int:
+        return self._invoices[key]
+
+    def domains(self, key: str) -> set:
+        return self._domains.get(key, set())
+
+    def amount_stats(self, key: str) -> tuple[float, float, float] | None:
+        """(mean, std, max) of the vendor's earlier amounts, with enough history."""
+        if key not in self._stats:
+            amounts = self._amounts.get(key, ())
+            if len(amounts) < KNOWN_VENDOR_MIN:
+                self._stats[key] = None
+            else:
+                mean = sum(amounts) / len(amounts)
+                std = math.sqrt(sum((a - mean) ** 2 for a in amounts) / len(amounts))
+                self._stats[key] = (mean, std, max(amounts))
+        return self._stats[key]
+
+
+def _factor(signal: str, description: str) -> dict:
+    weight = WEIGHTS[signal]
+    severity = "high" if weight >= 30 else "medium" if weight > 0 else "low"
+    return {"title": signal.replace("_", " ").capitalize(), "severity": severity, "description": description}
+
+
+def signals(fields: dict, history: VendorHistory) -> dict[str, str]:
+    """Rule name -> explanation for every rule the email triggers."""
+    found: dict[str, str] = {}
+    name, domain = sender_parts(fields.get("sender", ""))
+    vendor = vendor_key(name or fields.get("sender"))
+    text = f"{fields.get('subject', '')}\n{fields.get('body', '')}"
+
+    if domain in ALLOWLIST:
+        found["allowlisted"] = f"Sender domain {domain} is on the vendor allowlist."
+    known = history.invoices(vendor) >= KNOWN_VENDOR_MIN
+    vendor_domains = history.domains(vendor)
+    if known and (not vendor_domains or domain in vendor_domains):
+        found["known_vendor"] = f"{history.invoices(vendor)} earlier routine invoices from {name or domain}."
+    if known and vendor_domains and domain and domain not in vendor_domains:
+        found["domain_mismatch"] = (
+            f"{name} usually sends from {', '.join(sorted(vendor_domains))}, not {domain}."
+        )
+    imitated = lookalike_of(domain, history.known_domains)
+    if imitated:
+        found["lookalike_domain"] = f"Sender domain {domain} resembles known domain {imitated}."
+    elif "xn--" in domain:
+        found["lookalike_domain"] = f"Sender domain {domain} uses look-alike Unicode characters."
+    if domain in FREE_MAIL_DOMAINS and domain not in ALLOWLIST:
+        found["free_mail_sender"] = f"Invoice sent from a free mail account ({domain})."
+
+    amount = extract_amount(text)
+    amount_stats = history.amount_stats(vendor)
+    if amount is not None and amount_stats is not None:
+        mean, std, largest = amount_stats
+        spread = max(std, mean * 0.1, 1.0)
+        if amount > largest * 2 or (amount - mean) / spread >= 3:
+            found["amount_anomaly"] = (
+                f"${amount:,.2f} is far above this vendor's usual ${mean:,.2f} (max ${largest:,.2f})."
+            )
+        elif abs(amount - mean) / spread <= 2:
+            found["usual_amount"] = f"${amount:,.2f} is in line with earlier invoices (avg ${mean:,.2f})."
+
+    if BANK_CHANGE.search(text):
+        found["bank_detail_change"] = "Email asks to change or update payment details."
+    if URGENCY.search(text):
+        found["urgency_language"] = "Email pressures for urgent payment."
+    return found
+
+
+def screen(fields: dict, history: VendorHistory) -> dict | None:
+    """A local analysis for a clear-cut email, or None to ask the LLM.
+
+    The result has the same shape as an LLM analysis (see ANALYSIS_PROMPT).
+    """
+    if not ENABLED:
+        return None
+    stats["screened"] += 1
+    found = signals(fields, history)
+    score = max(0, min(100, BASE_SCORE + sum(WEIGHTS[s] for s in found)))
+    risky = RISK_SIGNALS & found.keys()
+    if score >= HIGH_THRESHOLD:
+        stats["localHigh"] += 1
+        level, verdict = "HIGH", "Matches several strong fraud indicators"
+    elif score <= LOW_THRESHOLD and not risky:
+        stats["localLow"] += 1
+        level, verdict = "LOW", "Routine invoice from a known vendor"
+    else:
+        stats["sentToLLM"] += 1
+        return None
+
+    amount = extract_amount(f"{fields.get('subject', '')}\n{fields.get('body', '')}")
+    return {
+        "riskScore": score,
+        "riskLevel": level,
+        "reason": verdict,
+        "flags": sorted(risky) if risky else ["prescreened_routine"],
+        "summary": f"{verdict} (settled by local pre-screening rules). " + " ".join(found.values()),
+        "amount": amount,
+        "factors": [_factor(s, d) for s, d in found.items()],
+    }
+
+
+def summary() -> dict:
+    screened = stats["screened"]
+    local = stats["localLow"] + stats["localHigh"]
+    return {
+        "enabled": ENABLED,
+        "lowThreshold": LOW_THRESHOLD,
+        "highThreshold": HIGH_THRESHOLD,
+        "screened": screened,
+        "localLow": stats["localLow"],
+        "localHigh": stats["localHigh"],
+        "sentToLLM": stats["sentToLLM"],
+        "localFraction": round(local / screened, 3) if screened else 0.0,
+    }
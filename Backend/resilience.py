@@ -0,0 +1,432 @@
+"""Rate limiting, retries and circuit breaking for calls to external APIs.
+
+A Resilience policy wraps one upstream (OpenRouter, Composio). Every attempt
+first passes a circuit breaker, then takes a token from a token bucket, then
+waits for a slot under an AIMD (additive increase, multiplicative decrease)
+concurrency limit: each success raises the limit by about one per window of
+calls, and each 429 halves it. Transient failures (429, 5xx, timeouts,
+dropped connections) are retried with exponential backoff and full jitter;
+a Retry-After header replaces the computed delay and also pauses the bucket
+for every caller.
+
+After enough consecutive server-side failures the breaker opens and calls
+fail fast with CircuitOpenError until a probe succeeds. Callers that cannot
+finish an item then park it in a RetryQueue rather than recording a failure.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+try:
+    from composio_client import APIConnectionError as ComposioConnectionError
+except ImportError:
+    # Composio SDKs without the generated client raise their own types
+    ComposioConnectionError = ()
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE = float(os.getenv("FIRMWATCH_LLM_RATE_PER_SECOND", "10"))  # 0 disables the bucket
+LLM_BURST = int(os.getenv("FIRMWATCH_LLM_BURST", "20"))
+LLM_MIN_CONCURRENCY = int(os.getenv("FIRMWATCH_LLM_MIN_CONCURRENCY", "1"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("FIRMWATCH_LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("FIRMWATCH_LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("FIRMWATCH_LLM_MAX_RETRIES", "4"))
+COMPOSIO_RATE = float(os.getenv("FIRMWATCH_COMPOSIO_RATE_PER_SECOND", "2"))
+COMPOSIO_MAX_RETRIES = int(os.getenv("FIRMWATCH_COMPOSIO_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("FIRMWATCH_RETRY_BACKOFF_SECONDS", "0.5"))
+BACKOFF_MAX = float(os.getenv("FIRMWATCH_RETRY_BACKOFF_MAX_SECONDS", "30"))
+# A Retry-After longer than this is not waited out; the call fails instead
+RETRY_AFTER_MAX = float(os.getenv("FIRMWATCH_RETRY_AFTER_MAX_SECONDS", "60"))
+BREAKER_THRESHOLD = int(os.getenv("FIRMWATCH_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("FIRMWATCH_BREAKER_RESET_SECONDS", "30"))
+# Times a parked item is retried before its caller gives up on it, and the
+# wait before its first retry (doubled on every further park)
+RETRY_QUEUE_MAX_ATTEMPTS = int(os.getenv("FIRMWATCH_RETRY_QUEUE_MAX_ATTEMPTS", "5"))
+RETRY_QUEUE_BACKOFF = float(os.getenv("FIRMWATCH_RETRY_QUEUE_BACKOFF_SECONDS", "60"))
+RETRY_QUEUE_BACKOFF_MAX = 3600.0
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing; the call was not attempted."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open; retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def http_status(exc: BaseException) -> int | None:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # SDK errors (Composio) carry the status of the response themselves
+    status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """The Retry-After of the response behind exc, if it had one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is None:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+def http_retryable(exc: BaseException) -> bool:
+    """429/5xx responses and transport-level failures of an httpx call."""
+    status = http_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, httpx.TimeoutException))
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failed OpenRouter call is worth trying again later."""
+    return isinstance(exc, CircuitOpenError) or http_retryable(exc)
+
+
+def sdk_retryable(exc: BaseException) -> bool:
+    """429/5xx responses, timeouts and dropped connections of an SDK call.
+
+    Auth failures and other 4xx responses are not retried, nor are errors
+    the SDK reports without a status, such as a tool's own failure.
+    """
+    if http_retryable(exc):
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError, ComposioConnectionError))
+
+
+class TokenBucket:
+    """Allows rate calls per second on average, bursts of up to capacity."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for a while (an upstream Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the wait."""
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that grows while calls succeed and halves on 429s."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+        # Only one decrease per window of in-flight calls, so a burst of
+        # 429s from calls sent under the old limit halves it once
+        self._decrease_gen = 0
+        self._started_gen: dict[int, int] = {}
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        token = object()
+        self._started_gen[id(token)] = self._decrease_gen
+        try:
+            yield token
+        finally:
+            self._started_gen.pop(id(token), None)
+            async with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_overload(self, token) -> None:
+        if self._started_gen.get(id(token)) != self._decrease_gen:
+            return
+        self._decrease_gen += 1
+        self.limit = max(self.minimum, self.limit / 2)
+        logger.info(f"Upstream throttling; concurrency limit now {int(self.limit)}.")
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+
+class CircuitBreaker:
+    """closed -> open after threshold consecutive failures -> half-open probe."""
+
+    def __init__(self, name: str, threshold: int, reset_seconds: float):
+        self.name = name
+        self.threshold = max(threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        if self.state == "closed":
+            return
+        retry_in = self._opened_at + self.reset_seconds - time.monotonic()
+        if self.state == "open" and retry_in <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def on_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"{self.name} circuit closed.")
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def on_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"{self.name} circuit opened after {self._failures} failure(s).")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def on_neutral(self) -> None:
+        """An attempt ended without saying anything about upstream health."""
+        self._probing = False
+
+
+class Resilience:
+    """Breaker, token bucket, AIMD limit and retries around one upstream."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        initial_concurrency: int,
+        min_concurrency: int,
+        max_concurrency: int,
+        max_retries: int,
+        retryable=http_retryable,
+        breaker_threshold: int = BREAKER_THRESHOLD,
+        breaker_reset: float = BREAKER_RESET,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.retryable = retryable
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial_concurrency, min_concurrency, max_concurrency)
+        self.breaker = CircuitBreaker(name, breaker_threshold, breaker_reset)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._counters = Counter()
+
+    def _bind_loop(self) -> None:
+        # The bucket lock and limiter condition belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.bucket = TokenBucket(self.bucket.rate, self.bucket.capacity)
+            limit = self.limiter
+            self.limiter = AdaptiveLimiter(int(limit.limit), limit.minimum, limit.maximum)
+
+    @asynccontextmanager
+    async def attempt(self):
+        """One try of a call: breaker check, token, concurrency slot, accounting."""
+        self._bind_loop()
+        self.breaker.before_call()
+        self._counters["throttledMs"] += await self.bucket.acquire() * 1000
+        async with self.limiter.slot() as token:
+            self._counters["attempts"] += 1
+            try:
+                yield
+            except Exception as e:
+                self._record_failure(e, token)
+                raise
+            except BaseException:
+                self.breaker.on_neutral()
+                raise
+            self.limiter.on_success()
+            self.breaker.on_success()
+
+    def _record_failure(self, exc: Exception, token) -> None:
+        status = http_status(exc)
+        if status == 429:
+            self._counters["throttled"] += 1
+            self.limiter.on_overload(token)
+            pause = retry_after(exc)
+            if pause:
+                self.bucket.pause(min(pause, RETRY_AFTER_MAX))
+            self.breaker.on_neutral()
+        elif self.retryable(exc):
+            self._counters["failures"] += 1
+            self.breaker.on_failure()
+        else:
+            # e.g. a 400: the request is wrong, the upstream is fine
+            self.breaker.on_neutral()
+
+    def retry_delay(self, exc: BaseException, attempt: int) -> float | None:
+        """Seconds to wait before retry number attempt + 1, or None to give up."""
+        if isinstance(exc, CircuitOpenError) or attempt >= self.max_retries:
+            return None
+        if not self.retryable(exc):
+            return None
+        delay = retry_after(exc)
+        if delay is not None:
+            return delay if delay <= RETRY_AFTER_MAX else None
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    async def call(self, fn):
+        """await fn() under this policy, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                async with self.attempt():
+                    return await fn()
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    if isinstance(e, CircuitOpenError):
+                        self._counters["rejected"] += 1
+                    raise
+                attempt += 1
+                self._counters["retries"] += 1
+                logger.info(f"{self.name} call failed ({e}); retry {attempt} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self._counters["attempts"],
+            "retries": self._counters["retries"],
+            "failures": self._counters["failures"],
+            "throttled": self._counters["throttled"],
+            "rejected": self._counters["rejected"],
+            "throttledMs": round(self._counters["throttledMs"], 1),
+            "concurrencyLimit": int(self.limiter.limit),
+            "inFlight": self.limiter.in_flight,
+            "circuit": self.breaker.state,
+        }
+
+
+class RetryQueue:
+    """Work items parked after transient failures, keyed for deduplication.
+
+    Each park pushes the item's next attempt further out (exponential
+    backoff). An item parked max_attempts times is handed back by park() so
+    the caller can give up on it.
+    """
+
+    def __init__(
+        self, max_attempts: int = RETRY_QUEUE_MAX_ATTEMPTS, backoff: float = RETRY_QUEUE_BACKOFF
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._items: OrderedDict[str, dict] = OrderedDict()
+
+    def park(self, key: str, item, reason: str) -> bool:
+        """Queue item for a later retry; False once it has used up its attempts."""
+        entry = self._items.get(key)
+        attempts = (entry["attempts"] if entry else 0) + 1
+        if attempts > self.max_attempts:
+            self._items.pop(key, None)
+            return False
+        delay = min(RETRY_QUEUE_BACKOFF_MAX, self.backoff * 2 ** (attempts - 1))
+        self._items[key] = {
+            "item": item,
+            "attempts": attempts,
+            "reason": reason,
+            "notBefore": time.time() + delay,
+        }
+        return True
+
+    def due(self) -> list[tuple[str, object]]:
+        """(key, item) pairs whose backoff has passed; they stay queued until done()."""
+        now = time.time()
+        return [(k, e["item"]) for k, e in self._items.items() if e["notBefore"] <= now]
+
+    def done(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {
+            "parked": len(self._items),
+            "due": len(self.due()),
+            "reasons": dict(Counter(e["reason"] for e in self._items.values())),
+        }
+
+
+openrouter_policy = Resilience(
+    "OpenRouter",
+    rate=LLM_RATE,
+    burst=LLM_BURST,
+    initial_concurrency=LLM_INITIAL_CONCURRENCY,
+    min_concurrency=LLM_MIN_CONCURRENCY,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+)
+composio_policy = Resilience(
+    "Composio",
+    rate=COMPOSIO_RATE,
+    burst=2,
+    initial_concurrency=1,
+    min_concurrency=1,
+    max_concurrency=2,
+    max_retries=COMPOSIO_MAX_RETRIES,
+    retryable=sdk_retryable,
+)
@@ -4,43 +4,146 @@ import os
 import re
 import json
 import uuid
+import hashlib
 import logging
+import asyncio
 import tempfile
+import threading
+import functools
+from bisect import bisect_left
+from collections import Counter
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
-from collections import Counter
 
-import httpx
-import pdfplumber
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from composio import Composio
 
-from storage import load_data, save_data
+# Load .env before importing local modules that read configuration at import
+load_dotenv()
+
+import baseline
+import chunking
+import email_batch
+import prescreen
+import statements
+from alert_index import decode_cursor, encode_cursor, normalize_date, project
+from events import broker
+from llm import DEFAULT_MODEL, llm
+from llm_cache import llm_cache, normalize_subject, normalize_text, prompt_version
+from parse_cache import parse_cache
+from dedupe import RETENTION_DAYS as DEDUPE_RETENTION_DAYS, get_index as get_dedupe_index
+from statement_catalog import DEFAULT_ACCOUNT, catalog, iso_date, summary as catalog_summary
+from storage import check_aggregates, write_json_atomic
+from storage_async import store
+from resilience import RetryQueue, composio_policy, is_transient, openrouter_policy
 
 # Project root where statement PDFs live
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
-load_dotenv()
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="FirWatch API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One writer task serializes every storage mutation (see storage_async)
+    store.start()
+    await llm.start()
+    yield
+    if _statement_task is not None:
+        _statement_task.cancel()
+    await llm.close()
+    await store.stop()
+    statements.shutdown()
+
+
+app = FastAPI(title="FirWatch API", lifespan=lifespan)
+
+
+# ---------------------------------------------------------------------------
+# Conditional GET: strong ETags keyed on the storage generation
+# ---------------------------------------------------------------------------
+# A GET route whose handler reads anything besides the storage snapshot must
+# add that source to _validator_version() or be listed in _UNCACHED_PATHS.
+# Generations restart at 1 with every process, so tag them with a process nonce
+_ETAG_EPOCH = uuid.uuid4().hex
+# Live counters that do not follow the storage generation
+_UNCACHED_PATHS = {"/api/llm/metrics", "/api/events"}
+
+
+async def _validator_version(path: str) -> tuple | None:
+    """What a GET response at path depends on, or None if it is not cacheable.
+
+    The version must cover everything the route's handler reads, including
+    anything the handler would refresh lazily: the statement routes re-scan
+    the catalog first, so a PDF added or replaced on disk moves the tag.
+    """
+    if path in _UNCACHED_PATHS:
+        return None
+    if path == "/api/statements" or path.startswith("/api/statements/"):
+        await asyncio.to_thread(catalog.refresh)
+        return ("statements", catalog.generation)
+    if path == "/api/dashboard":
+        await asyncio.to_thread(catalog.refresh)
+        return (await store.generation(), catalog.generation)
+    if path.startswith("/api/"):
+        return (await store.generation(),)
+    return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """Answer 304 for unchanged data before any handler work is done.
+
+    The tag is computed before the handler runs, so every route's validator
+    in _validator_version() must cover everything its handler reads and
+    bring any lazily refreshed source up to date first. A change landing
+    between the two only makes the response newer than its tag, which the
+    next request corrects with a 200; a response is never labelled with a
+    newer generation than the data it contains.
+    """
+    if request.method != "GET":
+        return await call_next(request)
+    version = await _validator_version(request.url.path)
+    if version is None:
+        return await call_next(request)
+
+    raw = f"{_ETAG_EPOCH}|{version}|{request.url.path}?{request.url.query}"
+    etag = f'"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
 
+# Added after conditional_get so it wraps it: an early 304 carries the CORS
+# headers too, or a cross-origin browser would reject it
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+
 # ---------------------------------------------------------------------------
 # Composio setup (reuses the same user id as agent.py)
 # ---------------------------------------------------------------------------
 COMPOSIO_API_KEY = os.getenv("COMPOSIO_API_KEY", "")
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 
 # Lazy-init Composio so the server starts instantly
 _composio = None
@@ -67,7 +170,6 @@ ANALYSIS_PROMPT = """You are a financial fraud analyst AI. Analyze the following
 
 EMAIL SUBJECT: {subject}
 EMAIL FROM: {sender}
-EMAIL DATE: {date}
 EMAIL BODY:
 {body}
 
@@ -89,115 +191,70 @@ Respond ONLY with valid JSON (no markdown, no extra text) in this exact structur
 }}"""
 
 
+def email_cache_inputs(fields: dict) -> dict:
+    """The parts of an email the analysis prompts show, and the cache key hashes.
+
+    Prompts are rendered from exactly these values, so equal keys always
+    mean equal prompts. The date is left out and Re:/Fwd: markers are
+    dropped, so a re-sent or forwarded reminder reuses the first verdict.
+    """
+    return {
+        "subject": normalize_subject(fields["subject"]),
+        "sender": normalize_text(fields["sender"]),
+        "body": normalize_text(fields["body"]),
+    }
+
+
 async def analyze_email(subject: str, sender: str, date: str, body: str) -> dict:
     """Send an email to OpenRouter for fraud risk analysis."""
-    prompt = ANALYSIS_PROMPT.format(
-        subject=subject, sender=sender, date=date, body=body
+    inputs = email_cache_inputs(
+        {"subject": subject, "sender": sender, "date": date, "body": body}
+    )
+    prompt = ANALYSIS_PROMPT.format(**inputs)
+    return await llm_cache.cached(
+        "email", ANALYSIS_PROMPT, inputs,
+        lambda: llm.complete_json(prompt, timeout=60.0),
+        model=DEFAULT_MODEL,
     )
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "anthropic/claude-sonnet-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.2,
-            },
-        )
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-
-        # Strip markdown fences if present
-        content = content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1]
-        if content.endswith("```"):
-            content = content.rsplit("```", 1)[0]
-        content = content.strip()
-
-        return json.loads(content)
 
 
 # ---------------------------------------------------------------------------
-# Endpoints
+# Dashboard panels (each computed from one storage snapshot)
 # ---------------------------------------------------------------------------
 
-@app.get("/api/dashboard/summary")
-async def dashboard_summary():
-    data = load_data()
-    return data.get("summary", {
-        "totalInvoices": 0,
-        "highRiskAlerts": 0,
-        "flaggedAmount": 0,
-        "casesResolved": 0,
-    })
+def summary_panel(snapshot) -> dict:
+    return snapshot.aggregates.summary()
 
 
-@app.get("/api/alerts")
-async def get_alerts():
-    data = load_data()
-    return data.get("alerts", [])
+def risk_distribution_panel(snapshot) -> dict:
+    return snapshot.aggregates.risk_distribution()
 
 
-@app.get("/api/risk-distribution")
-async def risk_distribution():
-    data = load_data()
-    alerts = data.get("alerts", [])
-    counts = Counter(a.get("riskLevel", "LOW") for a in alerts)
-    return {
-        "low": counts.get("LOW", 0),
-        "medium": counts.get("MEDIUM", 0),
-        "high": counts.get("HIGH", 0),
-    }
+def alerts_over_time_panel(snapshot) -> list[dict]:
+    return snapshot.aggregates.alerts_over_time()
 
 
-@app.get("/api/alerts-over-time")
-async def alerts_over_time():
-    data = load_data()
-    alerts = data.get("alerts", [])
-    day_counts: dict[str, int] = {}
-    for a in alerts:
-        date_str = a.get("date", "")
-        if date_str:
-            try:
-                dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-                day_name = dt.strftime("%a")
-            except (ValueError, TypeError):
-                day_name = "Unknown"
-        else:
-            day_name = "Unknown"
-        day_counts[day_name] = day_counts.get(day_name, 0) + 1
+def top_anomalies_panel(snapshot) -> list[dict]:
+    return [{"type": t, "count": c} for t, c in snapshot.aggregates.top_flags(10)]
 
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    return [{"date": d, "count": day_counts.get(d, 0)} for d in days]
 
+SIMILAR_CASES = 3
 
-@app.get("/api/top-anomalies")
-async def top_anomalies():
-    data = load_data()
-    alerts = data.get("alerts", [])
-    flag_counter: Counter = Counter()
-    for a in alerts:
-        for flag in a.get("flags", []):
-            flag_counter[flag] += 1
-    return [{"type": t, "count": c} for t, c in flag_counter.most_common(10)]
 
+def similar_cases(snapshot, alert_id: str) -> list[dict]:
+    return [
+        {"caseId": a["id"], "status": a.get("status", "New Alert"), "similarity": round(score, 3)}
+        for a, score in snapshot.similarity.similar(alert_id, SIMILAR_CASES)
+    ]
 
-@app.get("/api/investigation-case")
-async def investigation_case():
-    data = load_data()
-    alerts = data.get("alerts", [])
-    if not alerts:
+
+def investigation_case_panel(snapshot) -> dict | None:
+    entries = snapshot.alert_index().order("riskScore")
+    if not entries:
         return None
-    highest = max(alerts, key=lambda a: a.get("riskScore", 0))
-    similar = [
-        {"caseId": a["id"], "status": a.get("status", "New Alert")}
-        for a in alerts
-        if a["id"] != highest["id"] and a.get("riskLevel") == highest.get("riskLevel")
-    ][:3]
+    # First alert in document order among those with the top score
+    top = bisect_left(entries, (entries[-1][0],))
+    highest = snapshot.alert_index().by_id[min(entries[top:], key=lambda e: e[2])[1]]
     return {
         "caseId": highest["id"],
         "riskScore": highest.get("riskScore", 0),
@@ -205,39 +262,33 @@ async def investigation_case():
         "vendor": highest.get("vendor", "Unknown"),
         "amount": highest.get("amount", 0) or 0,
         "flags": highest.get("flags", []),
-        "similarCases": similar,
+        "similarCases": similar_cases(snapshot, highest["id"]),
     }
 
 
-@app.get("/api/pattern-insights")
-async def pattern_insights():
-    data = load_data()
-    alerts = data.get("alerts", [])
+def pattern_insights_panel(snapshot) -> list[dict]:
+    views = snapshot.aggregates
     insights = []
-    if not alerts:
+    if not len(views):
         return insights
 
-    high_count = sum(1 for a in alerts if a.get("riskLevel") == "HIGH")
+    high_count = views.risk_level_count("HIGH")
     if high_count:
         insights.append({
             "id": "insight-1",
             "text": f"{high_count} high-risk alert(s) detected across scanned invoices.",
         })
 
-    vendors = Counter(a.get("vendor", "Unknown") for a in alerts)
-    top_vendor, top_count = vendors.most_common(1)[0]
+    top_vendor, top_count = views.top_vendors(1)[0]
     if top_count > 1:
         insights.append({
             "id": "insight-2",
             "text": f"Vendor \"{top_vendor}\" appears in {top_count} alerts — possible repeat offender.",
         })
 
-    flag_counter: Counter = Counter()
-    for a in alerts:
-        for f in a.get("flags", []):
-            flag_counter[f] += 1
-    if flag_counter:
-        top_flag, flag_count = flag_counter.most_common(1)[0]
+    top_flags = views.top_flags(1)
+    if top_flags:
+        top_flag, flag_count = top_flags[0]
         insights.append({
             "id": "insight-3",
             "text": f"Most common flag: \"{top_flag}\" (seen {flag_count} time(s)).",
@@ -246,31 +297,209 @@ async def pattern_insights():
     return insights
 
 
-@app.get("/api/top-risk-vendors")
-async def top_risk_vendors():
-    data = load_data()
-    alerts = data.get("alerts", [])
-    vendor_counts = Counter(a.get("vendor", "Unknown") for a in alerts)
+def top_risk_vendors_panel(snapshot) -> list[dict]:
     return [
         {"vendor": v, "alertCount": c}
-        for v, c in vendor_counts.most_common(10)
+        for v, c in snapshot.aggregates.top_vendors(10)
     ]
 
 
+# Sections of /api/dashboard that come from the alert snapshot
+DASHBOARD_PANELS = {
+    "summary": summary_panel,
+    "riskDistribution": risk_distribution_panel,
+    "alertsOverTime": alerts_over_time_panel,
+    "topAnomalies": top_anomalies_panel,
+    "investigationCase": investigation_case_panel,
+    "patternInsights": pattern_insights_panel,
+    "topRiskVendors": top_risk_vendors_panel,
+}
+DASHBOARD_SECTIONS = ("alerts", *DASHBOARD_PANELS, "statements")
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@app.get("/api/dashboard")
+async def dashboard_bundle(sections: str | None = None, fields: str | None = None):
+    """Every dashboard panel computed from a single storage snapshot.
+
+    sections is a comma-separated subset of DASHBOARD_SECTIONS (default: all);
+    fields projects the alerts section like /api/alerts?fields=.
+    """
+    wanted = _split_param(sections) or list(DASHBOARD_SECTIONS)
+    unknown = [name for name in wanted if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown section(s): {', '.join(unknown)}")
+
+    snapshot = await store.snapshot()
+    bundle = {"generation": snapshot.generation}
+    for name in wanted:
+        if name == "alerts":
+            field_list = _split_param(fields)
+            bundle[name] = [project(a, field_list) for a in snapshot.data.get("alerts", [])]
+        elif name == "statements":
+            entries = await asyncio.to_thread(refresh_catalog)
+            bundle[name] = statement_listing(entries, None)
+        else:
+            bundle[name] = DASHBOARD_PANELS[name](snapshot)
+    return bundle
+
+
+@app.get("/api/dashboard/summary")
+async def dashboard_summary():
+    return summary_panel(await store.snapshot())
+
+
+ALERTS_PAGE_MAX = 500
+
+
+def _split_param(value: str | None) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+def _date_param(value: str | None, name: str) -> str:
+    if not value:
+        return ""
+    day = normalize_date(value)[:10]
+    if not day:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date such as 2018-01-31")
+    return day
+
+
+@app.get("/api/alerts")
+async def get_alerts(
+    risk_level: str | None = Query(None, alias="riskLevel"),
+    alert_type: str | None = Query(None, alias="type"),
+    status: str | None = None,
+    vendor: str | None = None,
+    source: str | None = None,
+    date_from: str | None = Query(None, alias="dateFrom"),
+    date_to: str | None = Query(None, alias="dateTo"),
+    sort: str = "date",
+    order: str = "desc",
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=ALERTS_PAGE_MAX),
+    fields: str | None = None,
+):
+    """List alerts, optionally filtered, sorted, projected and paginated.
+
+    Filters take comma-separated values. Without limit/cursor the response
+    is a plain list; with them it is {"items", "nextCursor"}.
+    """
+    snapshot = await store.snapshot()
+    filters = {
+        field: _split_param(value)
+        for field, value in (
+            ("riskLevel", risk_level),
+            ("type", alert_type),
+            ("status", status),
+            ("vendor", vendor),
+            ("source", source),
+        )
+        if value
+    }
+    paginated = limit is not None or cursor is not None
+    if not (filters or date_from or date_to or paginated or fields):
+        return snapshot.data.get("alerts", [])
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    day_from, day_to = _date_param(date_from, "dateFrom"), _date_param(date_to, "dateTo")
+
+    try:
+        items, next_cursor = snapshot.alert_index().query(
+            filters=filters,
+            date_from=day_from,
+            date_to=day_to,
+            sort=sort,
+            descending=order == "desc",
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    field_list = _split_param(fields)
+    items = [project(a, field_list) for a in items]
+    if not paginated:
+        return items
+    return {"items": items, "nextCursor": next_cursor}
+
+
+@app.get("/api/risk-distribution")
+async def risk_distribution():
+    return risk_distribution_panel(await store.snapshot())
+
+
+@app.get("/api/alerts-over-time")
+async def alerts_over_time():
+    return alerts_over_time_panel(await store.snapshot())
+
+
+@app.get("/api/top-anomalies")
+async def top_anomalies():
+    return top_anomalies_panel(await store.snapshot())
+
+
+@app.get("/api/investigation-case")
+async def investigation_case():
+    return investigation_case_panel(await store.snapshot())
+
+
+@app.get("/api/pattern-insights")
+async def pattern_insights():
+    return pattern_insights_panel(await store.snapshot())
+
+
+@app.get("/api/top-risk-vendors")
+async def top_risk_vendors():
+    return top_risk_vendors_panel(await store.snapshot())
+
+
+@app.post("/api/aggregates/check")
+async def aggregates_check(repair: bool = True):
+    """Verify the materialized analytics views against a full rebuild."""
+    mismatches = await asyncio.to_thread(check_aggregates, repair)
+    return {
+        "consistent": not mismatches,
+        "mismatches": mismatches,
+        "repaired": bool(mismatches) and repair,
+    }
+
+
+@app.get("/api/llm/metrics")
+async def llm_metrics():
+    """Connection reuse, pool pressure, caching and retry/circuit state of upstream calls."""
+    return {
+        **llm.stats(),
+        "cache": await asyncio.to_thread(llm_cache.stats),
+        "parseCache": await asyncio.to_thread(parse_cache.stats),
+        "pdfText": statements.summary(),
+        "prescreen": prescreen.summary(),
+        "chunking": chunking.summary(),
+        "emailBatches": {
+            "enabled": email_batch.BATCH_SIZE > 1,
+            "requests": email_batch.stats["requests"],
+            "emails": email_batch.stats["emails"],
+            "fallbacks": email_batch.stats["fallbacks"],
+        },
+        "resilience": {
+            "openrouter": openrouter_policy.stats(),
+            "composio": composio_policy.stats(),
+            "emailRetryQueue": email_retry_queue.stats(),
+        },
+    }
+
+
 @app.get("/api/report/{alert_id}")
 async def report_analysis(alert_id: str):
-    data = load_data()
-    alerts = data.get("alerts", [])
-    alert = next((a for a in alerts if a["id"] == alert_id), None)
+    snapshot = await store.snapshot()
+    alert = snapshot.similarity.get(alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
 
     risk_level = alert.get("riskLevel", "LOW")
-    similar = [
-        {"caseId": a["id"], "status": a.get("status", "New Alert")}
-        for a in alerts
-        if a["id"] != alert_id and a.get("riskLevel") == risk_level
-    ][:3]
 
     return {
         "alert": {
@@ -287,25 +516,305 @@ async def report_analysis(alert_id: str):
         "summary": alert.get("summary", ""),
         "factors": alert.get("factors", []),
         "flags": alert.get("flags", []),
-        "similarCases": similar,
+        "similarCases": similar_cases(snapshot, alert_id),
     }
 
 
+# ---------------------------------------------------------------------------
+# Live events: alerts pushed to the dashboard as the pipelines produce them
+# ---------------------------------------------------------------------------
+# Comment lines keep idle connections open through proxies
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("FIRMWATCH_EVENTS_HEARTBEAT_SECONDS", "15"))
+# Reconnect delay suggested to EventSource clients
+EVENTS_RETRY_MS = 3000
+
+
+def publish_alert(pipeline: str, alert: dict) -> None:
+    """Push a freshly built (not yet saved) alert to live clients."""
+    broker.publish("alert", {"pipeline": pipeline, "alert": alert})
+
+
+def live_pipeline(pipeline: str):
+    """Announce when an endpoint's pipeline starts and finishes or fails.
+
+    Clients reload from the API on "finished", by which time every alert
+    the run pushed has been saved.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            broker.publish("status", {"pipeline": pipeline, "state": "started"})
+            try:
+                result = await handler(*args, **kwargs)
+            except BaseException:
+                broker.publish("status", {"pipeline": pipeline, "state": "failed"})
+                raise
+            broker.publish("status", {"pipeline": pipeline, "state": "finished"})
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@app.get("/api/events")
+async def live_events(request: Request):
+    """Server-sent events: "alert" for each new alert, "status" per pipeline run."""
+    queue = broker.subscribe()
+
+    async def stream():
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ---------------------------------------------------------------------------
 # Core pipeline: sync email
 # ---------------------------------------------------------------------------
+# Emails analyzed at once, and how many finished alerts are saved together
+SYNC_CONCURRENCY = int(os.getenv("FIRMWATCH_SYNC_CONCURRENCY", "8"))
+SYNC_COMMIT_BATCH = int(os.getenv("FIRMWATCH_SYNC_COMMIT_BATCH", "20"))
+
+# Emails whose analysis hit an overloaded or unavailable OpenRouter. They are
+# not marked processed, and are retried by later syncs instead of becoming
+# "analysis_error" alerts.
+email_retry_queue = RetryQueue()
+
+
+def email_fields(email: dict) -> dict:
+    """Subject, sender, date and body of a fetched email, with fallbacks."""
+    return {
+        "subject": email.get("subject", email.get("Subject", "No subject")),
+        "sender": (
+            email.get("from")
+            or email.get("sender")
+            or email.get("From")
+            or "Unknown"
+        ),
+        "date": (
+            email.get("date")
+            or email.get("Date")
+            or email.get("receivedAt")
+            or datetime.utcnow().isoformat()
+        ),
+        "body": (
+            email.get("body")
+            or email.get("snippet")
+            or email.get("text")
+            or email.get("Body")
+            or email.get("preview")
+            or ""
+        ),
+    }
+
+
+def analysis_error_result(error) -> dict:
+    """A MEDIUM "analysis_error" result, flagging the email for manual review."""
+    return {
+        "riskScore": 50,
+        "riskLevel": "MEDIUM",
+        "reason": "Analysis failed — flagged for manual review",
+        "flags": ["analysis_error"],
+        "summary": f"Automated analysis failed: {error}",
+        "amount": None,
+        "factors": [],
+    }
+
+
+async def analyze_email_or_fallback(fields: dict) -> dict | None:
+    """analyze_email, turning a failure into an "analysis_error" result.
+
+    One bad email never fails the whole sync. Returns None instead when
+    OpenRouter is overloaded or down (after retries), so the caller can
+    park the email and try again later.
+    """
+    try:
+        return await analyze_email(**fields)
+    except Exception as e:
+        if is_transient(e):
+            logger.warning(f"OpenRouter unavailable for '{fields['subject']}': {e}")
+            return None
+        logger.error(f"OpenRouter analysis failed for '{fields['subject']}': {e}")
+        return analysis_error_result(e)
+
+
+async def analyze_email_batch(fields_list: list[dict], on_result=None) -> list[dict]:
+    """Analyze several emails in one request (see email_batch.py).
+
+    Cached emails are answered from the cache; emails whose element of the
+    reply is missing or invalid are re-analyzed one by one. The reply is
+    streamed, and on_result(position, analysis) is called for each email
+    as soon as its verdict is known. The analysis is None for emails that
+    could not be analyzed because OpenRouter is unavailable.
+    """
+    inputs = [email_cache_inputs(f) for f in fields_list]
+    results: list[dict | None] = [None] * len(fields_list)
+
+    def settle(i: int, analysis: dict | None) -> None:
+        results[i] = analysis
+        if on_result is not None:
+            on_result(i, analysis)
+
+    for i, cache_inputs in enumerate(inputs):
+        analysis = await llm_cache.get(
+            "email-batch", email_batch.BATCH_ANALYSIS_PROMPT, cache_inputs, DEFAULT_MODEL
+        )
+        if analysis is not None:
+            settle(i, analysis)
+    misses = [i for i, r in enumerate(results) if r is None]
+    if len(misses) > 1:
+        email_batch.stats["requests"] += 1
+        email_batch.stats["emails"] += len(misses)
+        prompt = email_batch.render_prompt([inputs[i] for i in misses])
+        try:
+            async for item in llm.stream_json_array(prompt, timeout=120.0):
+                for pos, analysis in email_batch.match_item(item, len(misses)).items():
+                    i = misses[pos]
+                    if results[i] is not None:
+                        continue
+                    settle(i, analysis)
+                    await llm_cache.put(
+                        "email-batch", email_batch.BATCH_ANALYSIS_PROMPT, inputs[i],
+                        DEFAULT_MODEL, analysis,
+                    )
+        except Exception as e:
+            # Verdicts that already arrived are kept
+            logger.warning(f"Batch analysis of {len(misses)} email(s) failed: {e}")
+
+    fallback = [i for i, r in enumerate(results) if r is None]
+    if len(misses) > 1:
+        email_batch.stats["fallbacks"] += len(fallback)
+
+    async def analyze_single(i: int) -> None:
+        settle(i, await analyze_email_or_fallback(fields_list[i]))
+
+    await asyncio.gather(*(analyze_single(i) for i in fallback))
+    return results
+
+
+def email_alert(email: dict, fields: dict, analysis: dict) -> dict:
+    """Build the stored alert for an analyzed email."""
+    # Extract vendor name from sender
+    vendor = fields["sender"]
+    if "<" in vendor:
+        vendor = vendor.split("<")[0].strip()
+    if not vendor:
+        vendor = "Unknown"
+
+    alert_id = f"alert-{uuid.uuid4().hex[:8]}"
+    factors = []
+    for f in analysis.get("factors", []):
+        factors.append({
+            "id": f"factor-{uuid.uuid4().hex[:6]}",
+            "title": f.get("title", "Unknown"),
+            "severity": f.get("severity", "medium"),
+            "description": f.get("description", ""),
+        })
+
+    alert = {
+        "id": alert_id,
+        "emailId": email["_eid"],
+        "riskScore": analysis.get("riskScore", 0),
+        "riskLevel": analysis.get("riskLevel", "LOW"),
+        "type": "Invoice",
+        "vendor": vendor,
+        "amount": analysis.get("amount"),
+        "reason": analysis.get("reason", ""),
+        "flags": analysis.get("flags", []),
+        "summary": analysis.get("summary", ""),
+        "factors": factors,
+        "status": "New Alert",
+        "date": fields["date"],
+        "senderDomain": prescreen.sender_parts(fields["sender"])[1] or None,
+    }
+
+    logger.info(f"Processed: {fields['subject']} -> risk={analysis.get('riskLevel')}")
+    return alert
+
+
+def transaction_alert(txn: dict, source: str, date: str) -> dict:
+    """Build the stored alert for a transaction the model flagged."""
+    factors = []
+    for f in txn.get("factors", []):
+        factors.append({
+            "id": f"factor-{uuid.uuid4().hex[:6]}",
+            "title": f.get("title", "Unknown"),
+            "severity": f.get("severity", "medium"),
+            "description": f.get("description", ""),
+        })
+
+    return {
+        "id": f"alert-{uuid.uuid4().hex[:8]}",
+        "riskScore": txn.get("riskScore", 0),
+        "riskLevel": txn.get("riskLevel", "LOW"),
+        "type": "Transaction",
+        "vendor": txn.get("vendor", "Unknown"),
+        "amount": txn.get("amount"),
+        "reason": txn.get("reason", ""),
+        "flags": txn.get("flags", []),
+        "summary": txn.get("summary", ""),
+        "factors": factors,
+        "status": "New Alert",
+        "date": date,
+        "source": source,
+    }
+
+
+async def build_email_alerts(emails: list[dict]) -> list[dict]:
+    """Analyze a group of emails (batched if more than one) into alerts.
+
+    Each alert is pushed to live clients as soon as its email is analyzed.
+    Emails OpenRouter could not take are parked in email_retry_queue and
+    get no alert, unless they have used up their retries.
+    """
+    fields_list = [email_fields(e) for e in emails]
+    alerts: list[dict | None] = [None] * len(emails)
+
+    def emit(i: int, analysis: dict | None) -> None:
+        if analysis is None:
+            if email_retry_queue.park(emails[i]["_eid"], emails[i], "openrouter_unavailable"):
+                return
+            analysis = analysis_error_result("OpenRouter unavailable after repeated retries")
+        alerts[i] = email_alert(emails[i], fields_list[i], analysis)
+        publish_alert("email", alerts[i])
+
+    if len(emails) == 1:
+        emit(0, await analyze_email_or_fallback(fields_list[0]))
+    else:
+        await analyze_email_batch(fields_list, on_result=emit)
+    return [a for a in alerts if a is not None]
+
 
 @app.post("/api/sync-email")
+@live_pipeline("email")
 async def sync_email():
     """Fetch invoice emails via Composio, analyze with OpenRouter, save alerts."""
     logger.info("Starting email sync...")
 
     # 1. Fetch emails using Composio
-    try:
+    query = "subject:invoice"
+    if DEDUPE_RETENTION_DAYS:
+        # Processed IDs are forgotten after the retention window, so never
+        # search further back than that
+        query += f" newer_than:{DEDUPE_RETENTION_DAYS}d"
+
+    def fetch_emails() -> dict:
         composio_client = get_composio()
         result = composio_client.tools.execute(
             slug="GMAIL_FETCH_EMAILS",
-            arguments={"query": "subject:invoice", "max_results": 20},
+            arguments={"query": query, "max_results": 20},
             user_id="kamalesh",
             dangerously_skip_version_check=True,
         )
@@ -314,8 +823,11 @@ async def sync_email():
         logger.info(f"Composio result: {result}")
         if result.get("error"):
             raise Exception(result["error"])
-    except HTTPException:
-        raise
+        return result
+
+    # Transient Composio failures are retried with backoff before giving up
+    try:
+        result = await composio_policy.call(lambda: asyncio.to_thread(fetch_emails))
     except Exception as e:
         logger.error(f"Composio GMAIL_FETCH_EMAILS failed: {e}")
         raise HTTPException(status_code=502, detail=f"Gmail fetch failed: {e}")
@@ -345,152 +857,108 @@ async def sync_email():
 
     logger.info(f"Parsed {len(emails)} email(s) from Composio response")
 
-    # 2. Deduplicate
-    data = load_data()
-    processed_ids = set(data.get("processed_email_ids", []))
-    new_emails = []
+    # 2. Deduplicate (IDs from before the dedupe index existed are imported once)
+    snapshot = await store.snapshot()
+    dedupe_index = await asyncio.to_thread(
+        get_dedupe_index, snapshot.data.get("processed_email_ids", [])
+    )
+    await asyncio.to_thread(dedupe_index.prune)
     for email in emails:
-        eid = (
+        email["_eid"] = (
             email.get("id")
             or email.get("messageId")
             or email.get("message_id")
             or email.get("threadId")
             or str(uuid.uuid4())
         )
-        if eid not in processed_ids:
-            email["_eid"] = eid
-            new_emails.append(email)
+    # Parked emails are retried once their backoff has passed, whether or
+    # not this fetch returned them again
+    due = dict(email_retry_queue.due())
+    fetched_ids = {e["_eid"] for e in emails}
+    emails += [e for eid, e in due.items() if eid not in fetched_ids]
+    emails = [e for e in emails if e["_eid"] not in email_retry_queue or e["_eid"] in due]
+    new_ids = set(await asyncio.to_thread(dedupe_index.filter_new, [e["_eid"] for e in emails]))
+    new_emails = [e for e in emails if e["_eid"] in new_ids]
 
-    logger.info(f"{len(new_emails)} new email(s) to process")
+    logger.info(f"{len(new_emails)} new email(s) to process ({len(due)} retried from the queue)")
 
     if not new_emails:
-        return {"success": True, "message": "No new invoice emails found.", "processed": 0}
+        return {
+            "success": True,
+            "message": "No new invoice emails found.",
+            "processed": 0,
+            "statementAnalysis": schedule_statement_refresh(),
+        }
 
-    # 3. Analyze each email with OpenRouter
-    processed_count = 0
+    # 3. Settle clear-cut emails with the local rules; analyze the rest
+    #    concurrently (in groups when batching is on) and commit finished
+    #    alerts in order
+    history = prescreen.VendorHistory(snapshot.data.get("alerts", []))
+    finished: list[dict] = []
+    to_analyze = []
     for email in new_emails:
-        subject = email.get("subject", email.get("Subject", "No subject"))
-        sender = (
-            email.get("from")
-            or email.get("sender")
-            or email.get("From")
-            or "Unknown"
-        )
-        date = (
-            email.get("date")
-            or email.get("Date")
-            or email.get("receivedAt")
-            or datetime.utcnow().isoformat()
-        )
-        body = (
-            email.get("body")
-            or email.get("snippet")
-            or email.get("text")
-            or email.get("Body")
-            or email.get("preview")
-            or ""
-        )
-
-        try:
-            analysis = await analyze_email(subject, sender, date, body)
-        except Exception as e:
-            logger.error(f"OpenRouter analysis failed for '{subject}': {e}")
-            analysis = {
-                "riskScore": 50,
-                "riskLevel": "MEDIUM",
-                "reason": "Analysis failed — flagged for manual review",
-                "flags": ["analysis_error"],
-                "summary": f"Automated analysis failed: {e}",
-                "amount": None,
-                "factors": [],
-            }
-
-        # Extract vendor name from sender
-        vendor = sender
-        if "<" in vendor:
-            vendor = vendor.split("<")[0].strip()
-        if not vendor:
-            vendor = "Unknown"
-
-        alert_id = f"alert-{uuid.uuid4().hex[:8]}"
-        factors = []
-        for f in analysis.get("factors", []):
-            factors.append({
-                "id": f"factor-{uuid.uuid4().hex[:6]}",
-                "title": f.get("title", "Unknown"),
-                "severity": f.get("severity", "medium"),
-                "description": f.get("description", ""),
-            })
-
-        alert = {
-            "id": alert_id,
-            "emailId": email["_eid"],
-            "riskScore": analysis.get("riskScore", 0),
-            "riskLevel": analysis.get("riskLevel", "LOW"),
-            "type": "Invoice",
-            "vendor": vendor,
-            "amount": analysis.get("amount"),
-            "reason": analysis.get("reason", ""),
-            "flags": analysis.get("flags", []),
-            "summary": analysis.get("summary", ""),
-            "factors": factors,
-            "status": "New Alert",
-            "date": date,
-        }
+        fields = email_fields(email)
+        analysis = prescreen.screen(fields, history)
+        if analysis is None:
+            to_analyze.append(email)
+            continue
+        alert = email_alert(email, fields, analysis)
+        publish_alert("email", alert)
+        finished.append(alert)
+    if finished:
+        logger.info(f"Pre-screening settled {len(finished)} of {len(new_emails)} email(s) locally.")
+
+    if email_batch.BATCH_SIZE > 1:
+        groups = email_batch.plan_batches([email_fields(e) for e in to_analyze])
+    else:
+        groups = [[i] for i in range(len(to_analyze))]
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def analyze_bounded(group: list[int]) -> list[dict]:
+        async with semaphore:
+            return await build_email_alerts([to_analyze[i] for i in group])
 
-        data["alerts"].append(alert)
-        data.setdefault("processed_email_ids", []).append(email["_eid"])
-        processed_count += 1
-        logger.info(f"Processed: {subject} -> risk={analysis.get('riskLevel')}")
+    processed_count = 0
 
-    # 4. Save (auto-recomputes summary)
-    save_data(data)
-    logger.info(f"Sync complete. {processed_count} new alert(s) saved.")
+    async def save(alerts: list[dict]) -> None:
+        # 4. Save this batch; its emails count as processed only once saved
+        nonlocal processed_count
+        await store.append_alerts(alerts)
+        await asyncio.to_thread(dedupe_index.add, [a["emailId"] for a in alerts])
+        for alert in alerts:
+            email_retry_queue.done(alert["emailId"])
+        processed_count += len(alerts)
 
-    # 5. Also trigger bank statement analysis
-    stmt_count = 0
+    tasks = [asyncio.create_task(analyze_bounded(g)) for g in groups]
     try:
-        flagged = await analyze_statements_with_ai()
-        if isinstance(flagged, list) and flagged:
-            data = load_data()
-            # Remove previous statement-analysis alerts to avoid duplicates
-            data["alerts"] = [a for a in data["alerts"] if a.get("source") != "statement_analysis"]
-            for txn in flagged:
-                aid = f"alert-{uuid.uuid4().hex[:8]}"
-                factors = []
-                for fct in txn.get("factors", []):
-                    factors.append({
-                        "id": f"factor-{uuid.uuid4().hex[:6]}",
-                        "title": fct.get("title", "Unknown"),
-                        "severity": fct.get("severity", "medium"),
-                        "description": fct.get("description", ""),
-                    })
-                data["alerts"].append({
-                    "id": aid,
-                    "riskScore": txn.get("riskScore", 0),
-                    "riskLevel": txn.get("riskLevel", "LOW"),
-                    "type": "Transaction",
-                    "vendor": txn.get("vendor", "Unknown"),
-                    "amount": txn.get("amount"),
-                    "reason": txn.get("reason", ""),
-                    "flags": txn.get("flags", []),
-                    "summary": txn.get("summary", ""),
-                    "factors": factors,
-                    "status": "New Alert",
-                    "date": txn.get("transactionDate", datetime.utcnow().isoformat()),
-                    "source": "statement_analysis",
-                })
-                stmt_count += 1
-            save_data(data)
-            logger.info(f"Statement analysis added {stmt_count} alert(s) during sync.")
-    except Exception as e:
-        logger.warning(f"Statement analysis during sync failed (non-fatal): {e}")
+        for task in tasks:
+            finished.extend(await task)
+            if len(finished) >= SYNC_COMMIT_BATCH:
+                await save(finished)
+                finished = []
+        if finished:
+            await save(finished)
+    finally:
+        for task in tasks:
+            task.cancel()
+    parked_count = len(new_emails) - processed_count
+    logger.info(
+        f"Sync complete. {processed_count} new alert(s) saved, {parked_count} email(s) parked for retry."
+    )
+
+    # 5. Refresh the bank statement analysis in the background; it is
+    #    skipped there when no statement changed
+    statement_analysis = schedule_statement_refresh()
 
+    message = f"Processed {processed_count} email(s)."
+    if parked_count:
+        message += f" {parked_count} email(s) will be retried on a later sync."
     return {
         "success": True,
-        "message": f"Processed {processed_count} email(s) and flagged {stmt_count} statement transaction(s).",
+        "message": message,
         "processed": processed_count,
-        "statementAlerts": stmt_count,
+        "parked": parked_count,
+        "statementAnalysis": statement_analysis,
     }
 
 
@@ -521,6 +989,7 @@ Respond ONLY with valid JSON (no markdown, no extra text) — an array of suspic
     "summary": "<2-3 sentence analysis>",
     "amount": <number or null>,
     "vendor": "<vendor/entity name or 'Unknown'>",
+    "transactionDate": "<date of the transaction as written, or null>",
     "factors": [
       {{
         "title": "<factor name>",
@@ -534,37 +1003,98 @@ Respond ONLY with valid JSON (no markdown, no extra text) — an array of suspic
 If no suspicious transactions are found, return an empty array: []"""
 
 
-async def analyze_transactions(text: str) -> list[dict]:
-    """Send income statement text to OpenRouter for transaction risk analysis."""
-    prompt = TRANSACTION_ANALYSIS_PROMPT.format(text=text)
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        resp = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "anthropic/claude-sonnet-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.2,
-            },
-        )
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
+async def stream_flagged(name: str, template: str, inputs, prompt: str, on_item=None) -> list:
+    """Cached, streamed analysis whose reply is a JSON array of flagged items.
+
+    on_item(item) is called for each flagged transaction as soon as the
+    model closes its object; on a cache hit, for each cached item in turn.
+    """
+    streamed = False
+
+    async def compute() -> list:
+        nonlocal streamed
+        streamed = True
+        items = []
+        async for item in llm.stream_json_array(prompt, timeout=120.0):
+            items.append(item)
+            if on_item is not None and isinstance(item, dict):
+                on_item(item)
+        return items
+
+    items = await llm_cache.cached(name, template, inputs, compute, model=DEFAULT_MODEL)
+    if not isinstance(items, list):
+        items = []
+    if on_item is not None and not streamed:
+        for item in items:
+            if isinstance(item, dict):
+                on_item(item)
+    return items
+
+
+async def analyze_windows(
+    name: str, template: str, prompts: list[str], on_item=None, shared=()
+) -> tuple[list[dict], int]:
+    """Map-reduce over the window prompts of one long document.
+
+    Each prompt is a cached, streamed request; at most CHUNK_CONCURRENCY run
+    at once. Flagged items are merged across overlapping windows, where
+    shared is chunking.shared_amounts() of the windows, and on_item(position,
+    item) is called for each new merged item and again when a higher-risk
+    overlap copy replaces it. Returns the merged items and how many windows
+    failed; raises if every window failed.
+    """
+    merger = chunking.FlaggedMerger(shared)
+    semaphore = asyncio.Semaphore(chunking.CHUNK_CONCURRENCY)
+    chunking.stats["documents"] += 1
+    chunking.stats["chunks"] += len(prompts)
+
+    def collector(window: int):
+        def collect(item: dict) -> None:
+            position, changed = merger.add(window, item)
+            if changed and on_item is not None:
+                on_item(position, merger.get(position))
+        return collect
+
+    async def run(window: int, prompt: str) -> None:
+        async with semaphore:
+            await stream_flagged(name, template, normalize_text(prompt), prompt, collector(window))
+
+    results = await asyncio.gather(
+        *(run(i, prompt) for i, prompt in enumerate(prompts)), return_exceptions=True
+    )
+    failures = [r for r in results if isinstance(r, BaseException)]
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.error(f"{name} window {i + 1}/{len(prompts)} failed: {result}")
+    chunking.stats["failedChunks"] += len(failures)
+    if failures and len(failures) == len(prompts):
+        raise failures[0]
+    return merger.items(), len(failures)
 
-        # Strip markdown fences if present
-        content = content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1]
-        if content.endswith("```"):
-            content = content.rsplit("```", 1)[0]
-        content = content.strip()
 
-        return json.loads(content)
+async def analyze_transactions(parsed: dict, text: str, on_item=None) -> tuple[list[dict], int]:
+    """Analyze an uploaded statement in token-budgeted, overlapping windows.
+
+    Rows are the parsed transactions when the layout is recognised, else
+    the text lines. Returns (merged flagged transactions, failed windows).
+    """
+    header, rows = chunking.statement_rows(parsed, text)
+    windows = chunking.plan_windows(rows)
+    prompts = [
+        TRANSACTION_ANALYSIS_PROMPT.format(
+            text=chunking.render_window(header, rows, window, i + 1, len(windows))
+        )
+        for i, window in enumerate(windows)
+    ]
+    logger.info(f"Analyzing {len(rows)} row(s) in {len(windows)} window(s)")
+    return await analyze_windows(
+        "transactions", TRANSACTION_ANALYSIS_PROMPT, prompts, on_item,
+        chunking.shared_amounts(rows, windows),
+    )
 
 
 @app.post("/api/upload-statement")
+@live_pipeline("upload")
 async def upload_statement(file: UploadFile = File(...)):
     """Upload an income statement PDF, analyze transactions, save alerts."""
     if not file.filename.lower().endswith(".pdf"):
@@ -572,18 +1102,16 @@ async def upload_statement(file: UploadFile = File(...)):
 
     logger.info(f"Received income statement upload: {file.filename}")
 
-    # 1. Save to temp file and extract text with pdfplumber
+    # 1. Save to temp file and extract its text (see statements.py)
+    content = await file.read()
     try:
         with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(await file.read())
+            tmp.write(content)
             tmp_path = tmp.name
 
-        text = ""
-        with pdfplumber.open(tmp_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        # A re-upload of the same file reuses its cached text and parse
+        digest = hashlib.sha256(content).hexdigest()
+        text, parsed = await asyncio.to_thread(statements.load, tmp_path, digest)
     except Exception as e:
         logger.error(f"PDF text extraction failed: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to read PDF: {e}")
@@ -598,59 +1126,40 @@ async def upload_statement(file: UploadFile = File(...)):
 
     logger.info(f"Extracted {len(text)} chars from {file.filename}")
 
-    # 2. Analyze with OpenRouter
+    # 2. Analyze with OpenRouter, window by window; 3. alerts are built (and
+    #    pushed live) as each flagged transaction arrives
+    new_alerts = []
+
+    def emit(position: int, txn: dict) -> None:
+        alert = transaction_alert(txn, source=file.filename, date=datetime.utcnow().isoformat())
+        if position < len(new_alerts):
+            # A higher-risk copy from an overlapping window replaces the first one
+            alert["id"] = new_alerts[position]["id"]
+            new_alerts[position] = alert
+        else:
+            new_alerts.append(alert)
+        publish_alert("upload", alert)
+        logger.info(f"Transaction alert: {txn.get('vendor', 'Unknown')} -> risk={txn.get('riskLevel')}")
+
     try:
-        flagged = await analyze_transactions(text)
+        _, failed_windows = await analyze_transactions(parsed, text, on_item=emit)
     except Exception as e:
         logger.error(f"Transaction analysis failed: {e}")
         raise HTTPException(status_code=502, detail=f"Analysis failed: {e}")
-
-    if not isinstance(flagged, list):
-        flagged = []
-
-    # 3. Create alerts
-    data = load_data()
-    processed_count = 0
-
-    for txn in flagged:
-        alert_id = f"alert-{uuid.uuid4().hex[:8]}"
-        factors = []
-        for f in txn.get("factors", []):
-            factors.append({
-                "id": f"factor-{uuid.uuid4().hex[:6]}",
-                "title": f.get("title", "Unknown"),
-                "severity": f.get("severity", "medium"),
-                "description": f.get("description", ""),
-            })
-
-        alert = {
-            "id": alert_id,
-            "riskScore": txn.get("riskScore", 0),
-            "riskLevel": txn.get("riskLevel", "LOW"),
-            "type": "Transaction",
-            "vendor": txn.get("vendor", "Unknown"),
-            "amount": txn.get("amount"),
-            "reason": txn.get("reason", ""),
-            "flags": txn.get("flags", []),
-            "summary": txn.get("summary", ""),
-            "factors": factors,
-            "status": "New Alert",
-            "date": datetime.utcnow().isoformat(),
-            "source": file.filename,
-        }
-
-        data["alerts"].append(alert)
-        processed_count += 1
-        logger.info(f"Transaction alert: {txn.get('vendor', 'Unknown')} -> risk={txn.get('riskLevel')}")
+    processed_count = len(new_alerts)
 
     # 4. Save
-    save_data(data)
+    await store.append_alerts(new_alerts)
     logger.info(f"Upload complete. {processed_count} transaction alert(s) saved.")
 
+    message = f"Processed {processed_count} suspicious transaction(s) from {file.filename}."
+    if failed_windows:
+        message += f" {failed_windows} part(s) of the statement could not be analyzed."
     return {
         "success": True,
-        "message": f"Processed {processed_count} suspicious transaction(s) from {file.filename}.",
+        "message": message,
         "processed": processed_count,
+        "failedParts": failed_windows,
     }
 
 
@@ -658,209 +1167,191 @@ async def upload_statement(file: UploadFile = File(...)):
 # Bank Statement parsing + analysis
 # ---------------------------------------------------------------------------
 
-MONTH_LABELS = {1: "Jan", 2: "Feb", 3: "Mar", 4: "Apr", 5: "May", 6: "Jun"}
+# Parsed statements by catalog ID: (content hash, parsed statement)
+_parsed_statements: dict[str, tuple[str, dict]] = {}
+# load_statements runs in worker threads (endpoints, background analysis)
+_statements_lock = threading.Lock()
 
-# In-memory cache for parsed statements (they never change)
-_statements_cache: dict | None = None
+STATEMENT_PAGE_MAX = 500
 
 
-def _parse_statement_pdf(pdf_path: str) -> dict:
-    """Parse a single bank statement PDF into structured data.
+def refresh_catalog() -> list[dict]:
+    """Re-scan the statement catalog (no parsing) and return its entries."""
+    catalog.refresh()
+    entries = catalog.entries()
+    with _statements_lock:
+        for statement_id in set(_parsed_statements) - {e["id"] for e in entries}:
+            del _parsed_statements[statement_id]
+    return entries
 
-    The PDF text has metadata on separate lines:
-        Statement Period
-        1 January 2018 - 31 January 2018
-        Closing Balance
-        $37643.40 CR
 
-    Transaction rows span multiple lines:
-        02 Jan DIRECT DEBIT - PROPERTY 4500.00 38000.00
-        MANAGEMENT CO Office Lease - 123 CR
-        Business St
-    """
-    text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-
-    lines = text.split("\n")
-
-    # Extract metadata by finding the label line, then reading the next line
-    period = ""
-    closing_balance_str = "0"
-    opening_balance_str = "0"
-
-    for idx, line in enumerate(lines):
-        stripped = line.strip()
-        if stripped == "Statement Period" and idx + 1 < len(lines):
-            period = lines[idx + 1].strip()
-        elif stripped == "Closing Balance" and idx + 1 < len(lines):
-            # e.g. "$37643.40 CR" or "$-58192.00 CR"
-            cb_line = lines[idx + 1].strip()
-            cb_match = re.search(r"\$?([\-]?[\d,]+\.\d{2})", cb_line)
-            if cb_match:
-                closing_balance_str = cb_match.group(1).replace(",", "")
-
-    # Opening balance is in the transaction area: "01 Jan 2018 OPENING BALANCE 42500.00"
-    date_pattern = re.compile(
-        r"^(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)(?:\s+\d{4})?)\s+"
-    )
+def _empty_statement() -> dict:
+    return {"period": "", "openingBalance": 0, "closingBalance": 0, "transactions": []}
 
-    for line in lines:
-        stripped = line.strip()
-        m = date_pattern.match(stripped)
-        if m and "OPENING BALANCE" in stripped.upper():
-            ob_match = re.search(r"([\-]?\d+[\d,]*\.\d{2})", stripped[m.end():])
-            if ob_match:
-                opening_balance_str = ob_match.group(1).replace(",", "")
-            break
-
-    # Parse transactions
-    # Each transaction block starts with a date line containing amounts at the end:
-    #   "02 Jan DIRECT DEBIT - PROPERTY 4500.00 38000.00"
-    # Followed by optional continuation lines (extra description, "CR"):
-    #   "MANAGEMENT CO Office Lease - 123 CR"
-    #   "Business St"
-    transactions = []
-    two_amounts = re.compile(r"([\-]?\d+\.\d{2})\s+([\-]?\d+\.\d{2})\s*$")
-
-    i = 0
-    while i < len(lines):
-        stripped = lines[i].strip()
-        m = date_pattern.match(stripped)
-        if m:
-            date_str = m.group(1).strip()
-            first_line_rest = stripped[m.end():].strip()
-
-            # Skip OPENING BALANCE
-            if "OPENING BALANCE" in first_line_rest.upper():
-                i += 1
-                continue
 
-            # The amounts (amount + balance) are at the end of the FIRST line only
-            am = two_amounts.search(first_line_rest)
-            if am:
-                desc_part1 = first_line_rest[: am.start()].strip()
-                amt1 = float(am.group(1))
-                balance = float(am.group(2))
-
-                # Collect continuation lines for more description text
-                desc_parts = [desc_part1] if desc_part1 else []
-                j = i + 1
-                while j < len(lines):
-                    next_stripped = lines[j].strip()
-                    if not next_stripped or date_pattern.match(next_stripped):
-                        break
-                    # Strip "CR" from continuation lines
-                    cleaned = next_stripped.replace(" CR", "").replace("CR", "").strip()
-                    if cleaned:
-                        desc_parts.append(cleaned)
-                    j += 1
-
-                description = " ".join(desc_parts)
-
-                # Determine debit vs credit by comparing balance to previous
-                debit = None
-                credit = None
-                if transactions:
-                    prev_balance = transactions[-1]["balance"]
-                else:
-                    try:
-                        prev_balance = float(opening_balance_str)
-                    except ValueError:
-                        prev_balance = 0.0
-
-                if balance < prev_balance:
-                    debit = amt1
-                else:
-                    credit = amt1
-
-                transactions.append({
-                    "date": date_str,
-                    "description": description,
-                    "debit": debit,
-                    "credit": credit,
-                    "balance": balance,
-                })
-                i = j
+def load_statements(entries: list[dict]) -> dict[str, dict]:
+    """Parsed statements for catalog entries, by ID in the entries' order.
+
+    Each statement is parsed at most once per content hash: it comes from
+    memory, else the parse cache, else the worker processes (see
+    statements.py), and parsing fills in its catalog metadata. Blocking;
+    call it off the event loop.
+    """
+    with _statements_lock:
+        stale = {
+            e["id"]: e for e in entries
+            if _parsed_statements.get(e["id"], (None,))[0] != e["digest"]
+        }
+        parsed = statements.parse_many(
+            {i: e["path"] for i, e in stale.items()}, {i: e["digest"] for i, e in stale.items()}
+        )
+        for statement_id, data in parsed.items():
+            entry = stale[statement_id]
+            if isinstance(data, Exception):
+                logger.error(f"Failed to parse {entry['path']}: {data}")
+                if isinstance(data, statements.WorkerError):
+                    # Not the file's fault; try it again on the next call
+                    continue
+                data = _empty_statement()
             else:
-                i += 1
-        else:
-            i += 1
+                logger.info(
+                    f"Parsed statement {entry['account']} {entry['period']}: "
+                    f"{len(data['transactions'])} transactions"
+                )
+            _parsed_statements[statement_id] = (entry["digest"], data)
+            catalog.record(statement_id, entry["digest"], data)
+
+        result = {}
+        for entry in entries:
+            cached = _parsed_statements.get(entry["id"])
+            data = cached[1] if cached is not None else _empty_statement()
+            result[entry["id"]] = {
+                "id": entry["id"],
+                "account": entry["account"],
+                "month": entry["month"],
+                "label": entry["label"],
+                **data,
+            }
+        return result
 
-    try:
-        ob_val = float(opening_balance_str)
-    except ValueError:
-        ob_val = 0.0
-    try:
-        cb_val = float(closing_balance_str)
-    except ValueError:
-        cb_val = 0.0
 
+def statement_listing(entries: list[dict], account: str | None = None) -> dict:
     return {
-        "period": period,
-        "openingBalance": ob_val,
-        "closingBalance": cb_val,
-        "transactions": transactions,
+        "accounts": sorted({e["account"] for e in entries}),
+        "statements": [
+            catalog_summary(e) for e in entries if account is None or e["account"] == account
+        ],
     }
 
 
-def parse_all_statements() -> dict:
-    """Parse all 6 statement PDFs, return dict keyed by month number."""
-    global _statements_cache
-    if _statements_cache is not None:
-        return _statements_cache
-
-    result = {}
-    for month_num in range(1, 7):
-        pdf_path = PROJECT_ROOT / f"statement_month_{month_num}.pdf"
-        if pdf_path.exists():
-            try:
-                data = _parse_statement_pdf(str(pdf_path))
-                result[month_num] = {
-                    "month": month_num,
-                    "label": MONTH_LABELS.get(month_num, f"M{month_num}"),
-                    **data,
-                }
-                logger.info(
-                    f"Parsed statement month {month_num}: "
-                    f"{len(data['transactions'])} transactions"
-                )
-            except Exception as e:
-                logger.error(f"Failed to parse statement_month_{month_num}.pdf: {e}")
-                result[month_num] = {
-                    "month": month_num,
-                    "label": MONTH_LABELS.get(month_num, f"M{month_num}"),
-                    "period": "",
-                    "openingBalance": 0,
-                    "closingBalance": 0,
-                    "transactions": [],
-                }
-        else:
-            logger.warning(f"Statement PDF not found: {pdf_path}")
-
-    _statements_cache = result
-    return result
+@app.get("/api/statements")
+async def get_statements(account: str | None = None):
+    """The statement catalog: accounts and per-statement metadata.
 
+    Nothing is parsed here; balances and transaction counts are filled in
+    once a statement has been parsed. Transactions are served by
+    /api/statements/transactions.
+    """
+    entries = await asyncio.to_thread(refresh_catalog)
+    return statement_listing(entries, account)
+
+
+def _statement_may_overlap(entry: dict, date_from: str, date_to: str) -> bool:
+    """Whether a statement can hold rows in [date_from, date_to], without parsing it."""
+    first, last = entry["first_date"], entry["last_date"]
+    if entry["parsed_digest"] != entry["digest"] or first is None:
+        if not re.match(r"\d{4}-\d{2}$", entry["period"]):
+            return True
+        first, last = f"{entry['period']}-01", f"{entry['period']}-31"
+    return (not date_from or last >= date_from) and (not date_to or first <= date_to)
+
+
+def _transaction_page(
+    entries: list[dict], date_from: str, date_to: str, cursor: str | None, limit: int
+) -> tuple[list[dict], str | None]:
+    after_key, after_row = decode_cursor(cursor) if cursor else (None, -1)
+    if after_key is not None and not (isinstance(after_key, list) and isinstance(after_row, int)):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    items: list[dict] = []
+    for entry in entries:
+        key = [entry["account"], entry["period"], entry["id"]]
+        if after_key is not None and key < after_key:
+            continue
+        start = after_row + 1 if key == after_key else 0
+        month = load_statements([entry])[entry["id"]]
+        for row, txn in enumerate(month["transactions"]):
+            if row < start:
+                continue
+            day = iso_date(txn.get("date", ""), month.get("period", ""), entry["period"])
+            if (date_from or date_to) and not day:
+                continue
+            if (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+            if len(items) == limit:
+                last = items[-1]
+                return items, encode_cursor(last["_key"], last["_row"])
+            items.append({
+                **txn,
+                "isoDate": day or None,
+                "statementId": entry["id"],
+                "account": entry["account"],
+                "_key": key,
+                "_row": row,
+            })
+    return items, None
+
+
+@app.get("/api/statements/transactions")
+async def get_statement_transactions(
+    account: str | None = None,
+    statement_id: str | None = Query(None, alias="statementId"),
+    date_from: str | None = Query(None, alias="dateFrom"),
+    date_to: str | None = Query(None, alias="dateTo"),
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=STATEMENT_PAGE_MAX),
+):
+    """One page of statement transactions, in account, period and row order.
+
+    Only statements that can overlap the date range are loaded, one at a
+    time until the page is full; each is parsed at most once (see
+    load_statements). Returns {"items", "nextCursor"}, plus the statement's
+    catalog entry when statementId is given.
+    """
+    day_from, day_to = _date_param(date_from, "dateFrom"), _date_param(date_to, "dateTo")
+    entries = await asyncio.to_thread(refresh_catalog)
+    if statement_id is not None:
+        entries = [e for e in entries if e["id"] == statement_id]
+        if not entries:
+            raise HTTPException(status_code=404, detail=f"Unknown statement: {statement_id}")
+    if account is not None:
+        entries = [e for e in entries if e["account"] == account]
+    entries = [e for e in entries if _statement_may_overlap(e, day_from, day_to)]
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            _transaction_page, entries, day_from, day_to, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/api/statements")
-async def get_statements():
-    """Return parsed transaction data for all 6 months."""
-    return parse_all_statements()
+    for item in items:
+        del item["_key"], item["_row"]
+    response = {"items": items, "nextCursor": next_cursor}
+    if statement_id is not None:
+        entry = catalog.get(statement_id)
+        response["statement"] = catalog_summary(entry) if entry is not None else None
+    return response
 
 
 # Prompt for baseline-comparison fraud analysis
 STATEMENT_ANALYSIS_PROMPT = """You are a financial fraud analyst AI for FIRM HACKS PVT LTD, an Australian business.
 
-Below are 6 months of bank statements. Months 1-5 (January to May) represent NORMAL business operations — this is the baseline. Month 6 (June) is the CURRENT month under review.
+Below is a statistical digest of {baseline_label}, which represent NORMAL business operations — this is the baseline — followed by every transaction of {current_label}, the CURRENT month under review.
 
-Your task: Compare Month 6 transactions against the baseline (Months 1-5) and identify ALL suspicious or fraudulent transactions in Month 6.
+Your task: Compare the current month's transactions against the baseline and identify ALL suspicious or fraudulent transactions in the current month.
 
 Flag these patterns:
 - Sudden spending spikes vs historical averages
-- New vendors/payees never seen in months 1-5
+- New vendors/payees never seen in the baseline
 - Offshore wire transfers or international payments
 - Cryptocurrency exchange purchases
 - ATM withdrawals that appear to be structuring (multiple same-day withdrawals)
@@ -870,10 +1361,16 @@ Flag these patterns:
 - Missing recurring vendors (normal business payments that stopped)
 - Account balance going negative (overdraft)
 
-BANK STATEMENTS:
-{statements_text}
+BASELINE DIGEST:
+{digest}
+
+RECURRING PAYEES NOT SEEN IN THE CURRENT MONTH:
+{missing}
+
+CURRENT MONTH TRANSACTIONS ({current_label}):
+{transactions}
 
-Respond ONLY with valid JSON (no markdown, no extra text) — an array of flagged transactions from Month 6:
+Respond ONLY with valid JSON (no markdown, no extra text) — an array of flagged transactions from the current month:
 [
   {{
     "riskScore": <integer 0-100>,
@@ -894,113 +1391,257 @@ Respond ONLY with valid JSON (no markdown, no extra text) — an array of flagge
   }}
 ]
 
-Be thorough — flag every suspicious transaction in Month 6. If a Month 5 transaction is also suspicious (early warning), include it too with a note."""
+Be thorough — flag every suspicious transaction in the current month."""
 
 
-async def analyze_statements_with_ai() -> list[dict]:
-    """Send all 6 months of statement text to OpenRouter for baseline-comparison analysis."""
-    # Extract raw text from each PDF
-    statements_text = ""
-    for month_num in range(1, 7):
-        pdf_path = PROJECT_ROOT / f"statement_month_{month_num}.pdf"
-        if not pdf_path.exists():
-            continue
-        text = ""
-        with pdfplumber.open(str(pdf_path)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        statements_text += f"\n{'='*60}\nMONTH {month_num} ({MONTH_LABELS.get(month_num, '')})\n{'='*60}\n{text}\n"
-
-    prompt = STATEMENT_ANALYSIS_PROMPT.format(statements_text=statements_text)
-
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        resp = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "anthropic/claude-sonnet-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.2,
-            },
+def _month_label(month: dict) -> str:
+    if month.get("month") is not None:
+        return f"Month {month['month']} ({month.get('label', '')})"
+    return month.get("label", "")
+
+
+def statement_prompts(months: list[dict]) -> tuple[list[str], list[frozenset]]:
+    """STATEMENT_ANALYSIS_PROMPT for an account's latest parsed month against its earlier ones.
+
+    months are one account's loaded statements in period order. A current
+    month too long for one request is split into overlapping windows (see
+    chunking.py); every window gets the same baseline digest. Returns the
+    window prompts and the windows' chunking.shared_amounts().
+    """
+    months = [m for m in months if m.get("transactions")]
+    if not months:
+        return [], []
+    current, history = months[-1], months[:-1]
+    stats = baseline.build_baseline(history)
+    if history:
+        baseline_label = f"{_month_label(history[0])} to {_month_label(history[-1])}"
+    else:
+        baseline_label = "no earlier months"
+    digest = baseline.render_digest(stats)
+    missing = ", ".join(baseline.missing_recurring(stats, current)) or "none"
+    header, rows = chunking.statement_rows(current, "")
+    windows = chunking.plan_windows(rows)
+    prompts = [
+        STATEMENT_ANALYSIS_PROMPT.format(
+            baseline_label=baseline_label,
+            current_label=_month_label(current),
+            digest=digest,
+            missing=missing,
+            transactions=chunking.render_window(header, rows, window, i + 1, len(windows)),
         )
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
+        for i, window in enumerate(windows)
+    ]
+    return prompts, chunking.shared_amounts(rows, windows)
 
-        # Strip markdown fences if present
-        content = content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1]
-        if content.endswith("```"):
-            content = content.rsplit("```", 1)[0]
-        content = content.strip()
 
-        return json.loads(content)
+def account_prompts(entries: list[dict]) -> dict[str, tuple[list[str], list[frozenset]]]:
+    """statement_prompts() of every account with parsed transactions. Blocking."""
+    loaded = load_statements(entries)
+    by_account: dict[str, list[dict]] = {}
+    for entry in entries:
+        by_account.setdefault(entry["account"], []).append(loaded[entry["id"]])
+    prompts = {account: statement_prompts(months) for account, months in sorted(by_account.items())}
+    return {account: p for account, p in prompts.items() if p[0]}
 
 
-@app.post("/api/analyze-statements")
-async def analyze_statements_endpoint():
-    """Analyze all 6 bank statements: compare month 6 against months 1-5 baseline."""
-    logger.info("Starting bank statement analysis...")
+async def analyze_statements_with_ai(prompts: list[str], on_item=None, shared=()) -> list[dict]:
+    """Analyze an account's latest statement month against a digest of the earlier months.
 
+    Raises if any window fails, so a partial result is never taken for
+    the month's full analysis.
+    """
+    if not prompts:
+        logger.info("No parsed statement transactions to analyze.")
+        return []
+    logger.info(
+        f"Statement analysis prompt: {sum(len(p) for p in prompts)} chars in {len(prompts)} window(s)"
+    )
+
+    items, failed = await analyze_windows(
+        "statements", STATEMENT_ANALYSIS_PROMPT, prompts, on_item, shared
+    )
+    if failed:
+        raise RuntimeError(f"{failed} of {len(prompts)} statement window(s) failed")
+    return items
+
+
+# ---------------------------------------------------------------------------
+# Change-aware statement analysis
+# ---------------------------------------------------------------------------
+# What the last completed analysis was run on; matching inputs skip the LLM
+STATEMENT_STATE_FILE = Path(
+    os.getenv("FIRMWATCH_STATEMENT_STATE", Path(__file__).parent / "statement_state.json")
+)
+
+_statement_task: asyncio.Task | None = None
+_statement_rerun = False
+# One analysis at a time, whether started in the background or by the endpoint
+_statement_lock = asyncio.Lock()
+
+
+def _load_statement_state() -> dict:
     try:
-        flagged = await analyze_statements_with_ai()
-    except Exception as e:
-        logger.error(f"Statement analysis failed: {e}")
-        raise HTTPException(status_code=502, detail=f"Analysis failed: {e}")
+        with open(STATEMENT_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    if not isinstance(flagged, list):
-        flagged = []
 
-    # Create alerts from flagged transactions
-    data = load_data()
+def _sha256(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
 
-    # Remove previous statement-analysis alerts to avoid duplicates on re-sync
-    data["alerts"] = [a for a in data["alerts"] if a.get("source") != "statement_analysis"]
 
-    processed_count = 0
-    for txn in flagged:
-        alert_id = f"alert-{uuid.uuid4().hex[:8]}"
-        factors = []
-        for f in txn.get("factors", []):
-            factors.append({
-                "id": f"factor-{uuid.uuid4().hex[:6]}",
-                "title": f.get("title", "Unknown"),
-                "severity": f.get("severity", "medium"),
-                "description": f.get("description", ""),
-            })
+def statement_input_fingerprint(hashes: dict[str, str]) -> str:
+    """Statement file contents plus everything that shapes the prompt."""
+    return _sha256(
+        DEFAULT_MODEL, prompt_version(STATEMENT_ANALYSIS_PROMPT), baseline.MAX_PAYEES,
+        sorted(hashes.items()),
+    )
 
-        alert = {
-            "id": alert_id,
-            "riskScore": txn.get("riskScore", 0),
-            "riskLevel": txn.get("riskLevel", "LOW"),
-            "type": "Transaction",
-            "vendor": txn.get("vendor", "Unknown"),
-            "amount": txn.get("amount"),
-            "reason": txn.get("reason", ""),
-            "flags": txn.get("flags", []),
-            "summary": txn.get("summary", ""),
-            "factors": factors,
-            "status": "New Alert",
-            "date": txn.get("transactionDate", datetime.utcnow().isoformat()),
-            "source": "statement_analysis",
-        }
 
-        data["alerts"].append(alert)
-        processed_count += 1
-        logger.info(f"Statement alert: {txn.get('vendor', 'Unknown')} -> risk={txn.get('riskLevel')}")
+def statement_alert_id(txn: dict, seen: Counter, account: str = DEFAULT_ACCOUNT) -> str:
+    """Alert ID derived from the flagged transaction, stable across re-analyses."""
+    key = (txn.get("transactionDate"), baseline.payee_key(txn.get("vendor", "")), txn.get("amount"))
+    if account != DEFAULT_ACCOUNT:
+        key += (account,)
+    seen[key] += 1
+    return f"alert-{_sha256('statement_analysis', key, seen[key])[:8]}"
+
+
+async def refresh_statement_alerts(force: bool = False) -> dict:
+    """Re-analyze the statements if their inputs changed; replace the alerts.
+
+    Each account's latest month is compared with its earlier months.
+    Unchanged PDFs skip everything but a catalog scan. Changed PDFs are
+    re-parsed one by one; if the rendered prompts (baseline digest plus
+    current month) are still the same, the LLM is skipped too. Alerts keep
+    their IDs and triage status across re-analyses.
+
+    A call made while another analysis runs waits for it, then compares its
+    inputs with what that one saved.
+    """
+    async with _statement_lock:
+        return await _refresh_statement_alerts(force)
+
+
+async def _refresh_statement_alerts(force: bool) -> dict:
+    state = await asyncio.to_thread(_load_statement_state)
+    entries = await asyncio.to_thread(refresh_catalog)
+    hashes = {e["id"]: e["digest"] for e in entries}
+    fingerprint = statement_input_fingerprint(hashes)
+    if not force and state.get("fingerprint") == fingerprint:
+        logger.info("Statements unchanged since the last analysis; skipping.")
+        return {"skipped": True, "processed": state.get("alerts", 0)}
+
+    prompts = await asyncio.to_thread(account_prompts, entries)
+    content = _sha256(*[normalize_text(p) for account in prompts for p in prompts[account][0]])
+    if not force and state.get("content") == content:
+        logger.info("Statement files changed but their transactions did not; skipping.")
+        skipped = {**state, "fingerprint": fingerprint}
+        await asyncio.to_thread(write_json_atomic, STATEMENT_STATE_FILE, skipped)
+        return {"skipped": True, "processed": state.get("alerts", 0)}
+
+    new_alerts = []
+    for account, (account_windows, shared) in prompts.items():
+        account_alerts = []
+        seen = Counter()
+
+        def emit(
+            position: int, txn: dict, account=account, account_alerts=account_alerts, seen=seen
+        ) -> None:
+            date = txn.get("transactionDate", datetime.utcnow().isoformat())
+            alert = transaction_alert(txn, source="statement_analysis", date=date)
+            alert["account"] = account
+            if position < len(account_alerts):
+                # A higher-risk copy from an overlapping window replaces the first one
+                alert["id"] = account_alerts[position]["id"]
+                account_alerts[position] = alert
+            else:
+                alert["id"] = statement_alert_id(txn, seen, account)
+                account_alerts.append(alert)
+            publish_alert("statements", alert)
+            logger.info(f"Statement alert: {txn.get('vendor', 'Unknown')} -> risk={txn.get('riskLevel')}")
+
+        await analyze_statements_with_ai(account_windows, on_item=emit, shared=shared)
+        new_alerts.extend(account_alerts)
+
+    # Analysts' triage of alerts that were flagged again carries over
+    snapshot = await store.snapshot()
+    previous = {
+        a["id"]: a.get("status")
+        for a in snapshot.data.get("alerts", [])
+        if a.get("source") == "statement_analysis"
+    }
+    for alert in new_alerts:
+        if previous.get(alert["id"]):
+            alert["status"] = previous[alert["id"]]
+
+    # Replace previous statement-analysis alerts to avoid duplicates on re-sync
+    await store.replace_source_alerts("statement_analysis", new_alerts)
+    state = {
+        "fingerprint": fingerprint,
+        "content": content,
+        "statements": hashes,
+        "alerts": len(new_alerts),
+        "analyzedAt": datetime.utcnow().isoformat(),
+    }
+    await asyncio.to_thread(write_json_atomic, STATEMENT_STATE_FILE, state)
+    logger.info(f"Statement analysis complete. {len(new_alerts)} alert(s) saved.")
+    return {"skipped": False, "processed": len(new_alerts)}
+
+
+async def _refresh_statements_in_background() -> None:
+    global _statement_rerun
+    while True:
+        _statement_rerun = False
+        broker.publish("status", {"pipeline": "statements", "state": "started"})
+        try:
+            await refresh_statement_alerts()
+        except Exception as e:
+            broker.publish("status", {"pipeline": "statements", "state": "failed"})
+            logger.warning(f"Background statement analysis failed (non-fatal): {e}")
+        else:
+            broker.publish("status", {"pipeline": "statements", "state": "finished"})
+        if not _statement_rerun:
+            return
+
+
+def schedule_statement_refresh() -> str:
+    """Start a background statement refresh; "scheduled", or "queued" behind a running one."""
+    global _statement_task, _statement_rerun
+    if _statement_task is not None and not _statement_task.done():
+        _statement_rerun = True
+        return "queued"
+    _statement_task = asyncio.create_task(_refresh_statements_in_background())
+    return "scheduled"
 
-    save_data(data)
-    logger.info(f"Statement analysis complete. {processed_count} alert(s) saved.")
 
+@app.post("/api/analyze-statements")
+@live_pipeline("statements")
+async def analyze_statements_endpoint(force: bool = False):
+    """Analyze the bank statements: compare each account's latest month against its earlier months.
+
+    Skipped when no statement or prompt changed since the last analysis,
+    unless force is set.
+    """
+    logger.info("Starting bank statement analysis...")
+
+    try:
+        result = await refresh_statement_alerts(force=force)
+    except Exception as e:
+        logger.error(f"Statement analysis failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Analysis failed: {e}")
+
+    processed_count = result["processed"]
+    if result["skipped"]:
+        message = f"Statements unchanged; {processed_count} flagged transaction(s) from the last analysis."
+    else:
+        message = f"Flagged {processed_count} suspicious transaction(s) from bank statements."
     return {
         "success": True,
-        "message": f"Flagged {processed_count} suspicious transaction(s) from bank statements.",
+        "message": message,
         "processed": processed_count,
+        "skipped": result["skipped"],
     }
 
 
@@ -0,0 +1,259 @@
+"""Similar-case search over alerts, kept current by storage mutation records.
+
+SimilarityIndex holds an alert-ID hash index plus an inverted index from
+features (vendor, flags, factor titles) to alert IDs. A query only scores the
+alerts that share a feature with the case at hand, ranked by weighted
+Jaccard overlap where rarer features weigh more.
+
+Below FIRMWATCH_SIMILAR_LSH_MIN alerts, the candidates are every alert in
+any of the case's postings, so a flag most alerts carry makes a lookup scan
+most of the history: O(n), bounded by that threshold. Once the history
+reaches it, flag sets are also MinHash-signed into LSH buckets. Candidates
+then come from those buckets and from the selective postings only, so very
+common flags or vendors no longer pull most of the history into every query.
+
+Like AlertAggregates, an index belongs to one storage snapshot: writers take
+a copy(), apply the same records storage persists, and publish the copy.
+Posting sets are shared between copies until one of them changes a set.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import random
+import re
+from functools import lru_cache
+
+LSH_MIN_ALERTS = int(os.getenv("FIRMWATCH_SIMILAR_LSH_MIN", "5000"))
+
+# Relative weight of a shared feature by kind, before the rarity factor
+FEATURE_WEIGHTS = {"vendor": 3.0, "factor": 1.5, "flag": 1.0}
+
+# With LSH on, postings holding more than this share of all alerts are not
+# used to find candidates (they still count when scoring)
+COMMON_FEATURE_FRACTION = 0.02
+COMMON_FEATURE_MIN = 200
+
+NUM_PERMUTATIONS = 32
+LSH_BANDS = 8
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def _normalize(value) -> str:
+    # "Future date", "future_date" and "FUTURE-DATE" are the same feature
+    return "_".join(re.findall(r"[a-z0-9]+", str(value or "").lower()))
+
+
+def alert_features(alert: dict) -> frozenset:
+    """The "kind:value" features two alerts are compared on."""
+    features = set()
+    vendor = _normalize(alert.get("vendor"))
+    if vendor and vendor != "unknown":
+        features.add(f"vendor:{vendor}")
+    for flag in alert.get("flags") or []:
+        flag = _normalize(flag)
+        if flag:
+            features.add(f"flag:{flag}")
+    for factor in alert.get("factors") or []:
+        title = _normalize(factor.get("title"))
+        if title and title != "unknown":
+            features.add(f"factor:{title}")
+    return frozenset(features)
+
+
+@lru_cache(maxsize=65536)
+def _token_hashes(token: str) -> tuple:
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return tuple((a * h + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def minhash(tokens) -> tuple:
+    """MinHash signature of a non-empty set of strings."""
+    return tuple(map(min, zip(*(_token_hashes(t) for t in tokens))))
+
+
+def _band_keys(signature: tuple) -> list[tuple]:
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]) for band in range(LSH_BANDS)]
+
+
+class SimilarityIndex:
+    """Hash and inverted indexes over alerts for top-k similar-case queries."""
+
+    def __init__(self, alerts: list[dict] = (), lsh_min_alerts: int = LSH_MIN_ALERTS):
+        self.lsh_min_alerts = lsh_min_alerts
+        self._alerts: dict[str, dict] = {}
+        self._features: dict[str, frozenset] = {}
+        self._postings: dict[str, set] = {}
+        self._by_source: dict = {}
+        self._signatures: dict[str, tuple] = {}
+        self._buckets: dict[tuple, set] = {}
+        self._lsh = False
+        # (table, key) of the sets this copy created and may change in place
+        self._owned: set = set()
+        for alert in alerts:
+            self._put(alert)
+        self._maybe_enable_lsh()
+
+    def copy(self) -> "SimilarityIndex":
+        """Independent copy; sets are only duplicated when first changed."""
+        clone = SimilarityIndex.__new__(SimilarityIndex)
+        clone.lsh_min_alerts = self.lsh_min_alerts
+        clone._alerts = dict(self._alerts)
+        clone._features = dict(self._features)
+        clone._postings = dict(self._postings)
+        clone._by_source = dict(self._by_source)
+        clone._signatures = dict(self._signatures)
+        clone._buckets = dict(self._buckets)
+        clone._lsh = self._lsh
+        clone._owned = set()
+        # Every set is shared now, so neither side may change one in place
+        self._owned = set()
+        return clone
+
+    # -- maintenance --------------------------------------------------------
+
+    def apply(self, ops: list[dict]) -> None:
+        """Apply a batch of storage mutation records (see storage.apply_ops)."""
+        for op in ops:
+            kind = op["op"]
+            if kind == "put":
+                self._put(op["alert"])
+            elif kind == "patch":
+                if op["id"] in self._alerts:
+                    self._put({**self._alerts[op["id"]], **op["fields"]})
+            elif kind == "delete":
+                self._remove(op["id"])
+            elif kind == "delete_source":
+                for aid in list(self._by_source.get(op["source"], ())):
+                    self._remove(aid)
+        self._maybe_enable_lsh()
+
+    def _own(self, table: dict, name: str, key) -> set:
+        """table[key] as a set this copy may change, creating it if missing."""
+        if (name, key) not in self._owned or key not in table:
+            table[key] = set(table.get(key, ()))
+            self._owned.add((name, key))
+        return table[key]
+
+    def _discard(self, table: dict, name: str, key, alert_id: str) -> None:
+        members = self._own(table, name, key)
+        members.discard(alert_id)
+        if not members:
+            del table[key]
+
+    def _put(self, alert: dict) -> None:
+        alert_id = alert["id"]
+        features = alert_features(alert)
+        old = self._alerts.get(alert_id)
+        if (
+            old is not None
+            and self._features[alert_id] == features
+            and old.get("source") == alert.get("source")
+        ):
+            # e.g. a status change: nothing indexed moved
+            self._alerts[alert_id] = alert
+            return
+        self._remove(alert_id)
+        self._alerts[alert_id] = alert
+        self._features[alert_id] = features
+        for feature in features:
+            self._own(self._postings, "postings", feature).add(alert_id)
+        self._own(self._by_source, "sources", alert.get("source")).add(alert_id)
+        if self._lsh:
+            self._sign(alert_id, features)
+
+    def _remove(self, alert_id: str) -> None:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        for feature in self._features.pop(alert_id):
+            self._discard(self._postings, "postings", feature, alert_id)
+        self._discard(self._by_source, "sources", alert.get("source"), alert_id)
+        signature = self._signatures.pop(alert_id, None)
+        if signature is not None:
+            for key in _band_keys(signature):
+                self._discard(self._buckets, "buckets", key, alert_id)
+
+    def _sign(self, alert_id: str, features: frozenset) -> None:
+        flags = sorted(f for f in features if f.startswith("flag:"))
+        if not flags:
+            return
+        signature = minhash(flags)
+        self._signatures[alert_id] = signature
+        for key in _band_keys(signature):
+            self._own(self._buckets, "buckets", key).add(alert_id)
+
+    def _maybe_enable_lsh(self) -> None:
+        if self._lsh or len(self._alerts) < self.lsh_min_alerts:
+            return
+        self._lsh = True
+        for alert_id, features in self._features.items():
+            self._sign(alert_id, features)
+
+    # -- queries ------------------------------------------------------------
+
+    def get(self, alert_id: str) -> dict | None:
+        return self._alerts.get(alert_id)
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def _weight(self, feature: str) -> float:
+        df = len(self._postings.get(feature, ())) or 1
+        kind = feature.split(":", 1)[0]
+        return FEATURE_WEIGHTS.get(kind, 1.0) * math.log(1 + len(self._alerts) / df)
+
+    def _candidates(self, alert_id: str, features: frozenset) -> set:
+        candidates: set = set()
+        if not self._lsh:
+            # Exhaustive: a common feature's whole posting is scored (see above)
+            for feature in features:
+                candidates |= self._postings.get(feature, set())
+        else:
+            cap = max(COMMON_FEATURE_MIN, int(len(self._alerts) * COMMON_FEATURE_FRACTION))
+            for feature in features:
+                posting = self._postings.get(feature, set())
+                if len(posting) <= cap:
+                    candidates |= posting
+            signature = self._signatures.get(alert_id)
+            if signature is not None:
+                for key in _band_keys(signature):
+                    candidates |= self._buckets.get(key, set())
+        candidates.discard(alert_id)
+        return candidates
+
+    def similar(self, alert_id: str, k: int = 3) -> list[tuple[dict, float]]:
+        """Top-k (alert, score) most similar to alert_id, best first.
+
+        Score is the rarity-weighted Jaccard overlap of the feature sets.
+        Ties go to alerts with the same risk level, then the closest score.
+        """
+        alert = self._alerts.get(alert_id)
+        if alert is None:
+            return []
+        features = self._features[alert_id]
+        weights = {f: self._weight(f) for f in features}
+        query_weight = sum(weights.values())
+        risk_level = alert.get("riskLevel")
+        risk_score = alert.get("riskScore") or 0
+
+        def rank(candidate_id: str) -> tuple:
+            candidate = self._alerts[candidate_id]
+            candidate_features = self._features[candidate_id]
+            shared = sum(weights[f] for f in features & candidate_features)
+            union = query_weight + sum(
+                self._weight(f) for f in candidate_features - features
+            )
+            score = shared / union if union else 0.0
+            closeness = -abs((candidate.get("riskScore") or 0) - risk_score)
+            return (score, candidate.get("riskLevel") == risk_level, closeness, candidate_id)
+
+        best = heapq.nlargest(k, map(rank, self._candidates(alert_id, features)))
+        return [(self._alerts[r[3]], r[0]) for r in best if r[0] > 0]
@@ -0,0 +1,286 @@
+"""Indexed catalog of bank statement PDFs by account and period.
+
+Statements are discovered on disk rather than listed in code:
+
+  - PDFs directly in the project root belong to the default account
+    (FIRMWATCH_DEFAULT_ACCOUNT). The legacy statement_month_N.pdf names
+    become periods "month-01" .. "month-NN"; any other name needs a
+    YYYY-MM (or YYYYMM, YYYY_MM) date in it.
+  - Every directory under FIRMWATCH_STATEMENT_ACCOUNTS_DIR (default
+    <project root>/statements) is an account; PDFs anywhere below it are
+    cataloged by the YYYY-MM found in their path, e.g.
+    statements/operating/2018/2018-03.pdf or statements/savings/2018-03.pdf.
+
+refresh() stats the files and hashes only the new or changed ones, so
+listing the catalog never parses a PDF. Metadata that needs a parse
+(statement period, balances, transaction count, date range) is filled in
+by record() whenever a statement is parsed for another reason, and kept
+in an SQLite index with the file signature, so it survives restarts.
+"""
+
+import calendar
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from alert_index import normalize_date
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_ACCOUNT = os.getenv("FIRMWATCH_DEFAULT_ACCOUNT", "main")
+ACCOUNTS_DIR = Path(os.getenv("FIRMWATCH_STATEMENT_ACCOUNTS_DIR", PROJECT_ROOT / "statements"))
+CATALOG_DB = Path(
+    os.getenv("FIRMWATCH_STATEMENT_CATALOG_DB", Path(__file__).parent / "statement_catalog.db")
+)
+
+_LEGACY_NAME = re.compile(r"^statement_month_(\d{1,2})\.pdf$", re.IGNORECASE)
+_PERIOD = re.compile(r"(?<!\d)((?:19|20)\d{2})[-_/]?(0[1-9]|1[0-2])(?!\d)")
+_PERIOD_DATE = re.compile(r"\b(\d{1,2})\s+([A-Za-z]{3,9})\s+(\d{4})\b")
+_TXN_DATE = re.compile(r"^\s*(\d{1,2})\s+([A-Za-z]{3})")
+
+_COLUMNS = (
+    "id", "account", "period", "label", "month", "path", "mtime_ns", "size", "digest",
+    "parsed_digest", "statement_period", "opening_balance", "closing_balance",
+    "transaction_count", "first_date", "last_date",
+)
+
+
+def _sha1(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def classify(path: Path, account: str | None = None) -> tuple[str, str, str, int | None] | None:
+    """(account, period, label, legacy month number) for a statement file, or None."""
+    if account is None:
+        legacy = _LEGACY_NAME.match(path.name)
+        if legacy:
+            month = int(legacy.group(1))
+            label = calendar.month_abbr[month] if 1 <= month <= 12 else f"M{month}"
+            return DEFAULT_ACCOUNT, f"month-{month:02d}", label, month
+        account = DEFAULT_ACCOUNT
+        where = path.name
+    else:
+        where = str(path).replace(os.sep, "/")
+    match = None
+    for match in _PERIOD.finditer(where):
+        pass
+    if match is None:
+        return None
+    year, month = match.group(1), int(match.group(2))
+    return account, f"{year}-{month:02d}", f"{calendar.month_abbr[month]} {year}", None
+
+
+def iso_date(date: str, statement_period: str = "", period: str = "") -> str:
+    """"YYYY-MM-DD" for a statement row date such as "02 Jan", or "".
+
+    The year comes from the statement's own period text (matching the
+    month, so a Dec-Jan statement gets both years right), else from the
+    catalog period.
+    """
+    found = normalize_date(date)
+    if found:
+        return found[:10]
+    match = _TXN_DATE.match(date or "")
+    if not match:
+        return ""
+    month = match.group(2).title()
+    years = {}
+    for _, name, year in _PERIOD_DATE.findall(statement_period or ""):
+        years.setdefault(name[:3].title(), year)
+    year = years.get(month) or next(iter(years.values()), None)
+    if year is None and re.match(r"\d{4}-", period or ""):
+        year = period[:4]
+    if year is None:
+        return ""
+    return normalize_date(f"{match.group(1)} {month} {year}")[:10]
+
+
+class StatementCatalog:
+    """Discovered statements and their cheap metadata, indexed in SQLite."""
+
+    def __init__(
+        self,
+        db_path: Path = CATALOG_DB,
+        root: Path = PROJECT_ROOT,
+        accounts_dir: Path = ACCOUNTS_DIR,
+    ):
+        self.db_path = Path(db_path)
+        self.root = Path(root)
+        self.accounts_dir = Path(accounts_dir)
+        # Bumped whenever the catalog or any statement's metadata changes
+        self.generation = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS statements ("
+                "id TEXT PRIMARY KEY, account TEXT NOT NULL, period TEXT NOT NULL, "
+                "label TEXT NOT NULL, month INTEGER, path TEXT NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, digest TEXT NOT NULL, "
+                "parsed_digest TEXT, statement_period TEXT, opening_balance REAL, "
+                "closing_balance REAL, transaction_count INTEGER, first_date TEXT, last_date TEXT)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_statements_account_period "
+                "ON statements(account, period)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # -- discovery ------------------------------------------------------------
+
+    def discover(self) -> dict[str, tuple]:
+        """Statement files on disk: path -> classify() result."""
+        found = {}
+        if self.root.is_dir():
+            for entry in os.scandir(self.root):
+                if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                    info = classify(Path(entry.path))
+                    if info is not None:
+                        found[str(Path(entry.path).resolve())] = info
+        if self.accounts_dir.is_dir():
+            for account_dir in sorted(p for p in self.accounts_dir.iterdir() if p.is_dir()):
+                for path in account_dir.rglob("*"):
+                    if path.suffix.lower() != ".pdf" or not path.is_file():
+                        continue
+                    info = classify(path.relative_to(account_dir), account=account_dir.name)
+                    if info is None:
+                        logger.debug(f"No period in statement path, skipped: {path}")
+                        continue
+                    found[str(path.resolve())] = info
+        return found
+
+    def refresh(self) -> bool:
+        """Sync the index with the files on disk; True if anything changed.
+
+        Unchanged files (same mtime and size) are not even read.
+        """
+        found = self.discover()
+        with self._lock:
+            conn = self._connect()
+            known = {row["path"]: row for row in conn.execute("SELECT * FROM statements")}
+            changed = False
+            with conn:
+                for path in set(known) - set(found):
+                    conn.execute("DELETE FROM statements WHERE path = ?", (path,))
+                    changed = True
+                for path, (account, period, label, month) in found.items():
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    row = known.get(path)
+                    if (
+                        row is not None
+                        and (row["mtime_ns"], row["size"]) == (st.st_mtime_ns, st.st_size)
+                        and (row["account"], row["period"]) == (account, period)
+                    ):
+                        continue
+                    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+                    if row is not None and row["digest"] == digest and row["period"] == period:
+                        # Touched but not modified: keep the metadata
+                        conn.execute(
+                            "UPDATE statements SET mtime_ns = ?, size = ? WHERE path = ?",
+                            (st.st_mtime_ns, st.st_size, path),
+                        )
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO statements "
+                        "(id, account, period, label, month, path, mtime_ns, size, digest) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (f"st-{_sha1(path)[:10]}", account, period, label, month, path,
+                         st.st_mtime_ns, st.st_size, digest),
+                    )
+                    changed = True
+            if changed:
+                self.generation += 1
+            return changed
+
+    def record(self, statement_id: str, digest: str, parsed: dict) -> None:
+        """Store the metadata of a parsed statement (if it is still current)."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT period, digest, parsed_digest FROM statements WHERE id = ?", (statement_id,)
+            ).fetchone()
+            if row is None or row["digest"] != digest or row["parsed_digest"] == digest:
+                return
+            dates = [
+                d for d in (
+                    iso_date(t.get("date", ""), parsed.get("period", ""), row["period"])
+                    for t in parsed.get("transactions", [])
+                )
+                if d
+            ]
+            with conn:
+                conn.execute(
+                    "UPDATE statements SET parsed_digest = ?, statement_period = ?, "
+                    "opening_balance = ?, closing_balance = ?, transaction_count = ?, "
+                    "first_date = ?, last_date = ? WHERE id = ?",
+                    (digest, parsed.get("period", ""), parsed.get("openingBalance"),
+                     parsed.get("closingBalance"), len(parsed.get("transactions", [])),
+                     min(dates) if dates else None, max(dates) if dates else None, statement_id),
+                )
+            self.generation += 1
+
+    # -- queries --------------------------------------------------------------
+
+    def entries(self, account: str | None = None) -> list[dict]:
+        """Catalog rows ordered by account and period."""
+        sql = "SELECT * FROM statements"
+        params: tuple = ()
+        if account is not None:
+            sql += " WHERE account = ?"
+            params = (account,)
+        with self._lock:
+            rows = self._connect().execute(sql + " ORDER BY account, period, id", params).fetchall()
+        return [{column: row[column] for column in _COLUMNS} for row in rows]
+
+    def get(self, statement_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT * FROM statements WHERE id = ?", (statement_id,)
+            ).fetchone()
+        return {column: row[column] for column in _COLUMNS} if row is not None else None
+
+    def accounts(self) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT account FROM statements ORDER BY account"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+def summary(entry: dict) -> dict:
+    """API view of a catalog row."""
+    parsed = entry["parsed_digest"] is not None and entry["parsed_digest"] == entry["digest"]
+    return {
+        "id": entry["id"],
+        "account": entry["account"],
+        "period": entry["period"],
+        "label": entry["label"],
+        "month": entry["month"],
+        "file": Path(entry["path"]).name,
+        "sizeBytes": entry["size"],
+        "parsed": parsed,
+        "statementPeriod": entry["statement_period"] if parsed else None,
+        "openingBalance": entry["opening_balance"] if parsed else None,
+        "closingBalance": entry["closing_balance"] if parsed else None,
+        "transactionCount": entry["transaction_count"] if parsed else None,
+        "firstDate": entry["first_date"] if parsed else None,
+        "lastDate": entry["last_date"] if parsed else None,
+    }
+
+
+catalog = StatementCatalog()
@@ -0,0 +1,500 @@
+"""Bank statement PDF parsing, fanned out over a process pool.
+
+Page text comes from the engines in pdf_text.py, fastest first: a
+statement is read with the first engine whose text parses into a
+plausible statement (see plausible()), falling back to pdfplumber's
+layout-aware extraction otherwise.
+
+Extraction is CPU-bound, so parse_many() runs it in worker processes: one
+task per file, and a file with more than FIRMWATCH_PARSE_PAGES_PER_TASK
+pages is split into page ranges whose text is parsed in page order.
+Results come back keyed like the input, whatever order the workers
+finish in.
+
+StatementParser reads a statement in one pass, page by page, so the text
+of a whole document is never concatenated or scanned more than once.
+
+Given the files' content hashes, parse_many() and load() go through the
+disk cache in parse_cache.py first, so an unchanged PDF is never
+extracted again, even after a restart.
+
+parse_many() blocks until every file is done; call it off the event loop.
+FIRMWATCH_PARSE_WORKERS=0 parses in the calling process.
+"""
+
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_text
+from parse_cache import parse_cache
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.getenv("FIRMWATCH_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("FIRMWATCH_PARSE_PAGES_PER_TASK", "20"))
+
+# Cache versions: page text is cached under the version of the engine
+# that extracted it, and its parse under PARSER_VERSION plus that version;
+# bump PARSER_VERSION whenever parse_text() output changes
+PARSER_VERSION = "1"
+
+# Failures of the worker pool itself, as opposed to a file that cannot be parsed
+WorkerError = BrokenProcessPool
+
+# Documents extracted per engine, and how many needed a fallback engine
+stats = Counter()
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _engine_names() -> list[str]:
+    return [engine.name for engine in pdf_text.chain()]
+
+
+def page_count(pdf_path: str, engines: list[str] | None = None) -> int:
+    engines = engines or _engine_names()
+    for name in engines:
+        try:
+            return pdf_text.get(name).page_count(pdf_path)
+        except Exception:
+            if name == engines[-1]:
+                raise
+    raise ValueError("No PDF text engine")
+
+
+def extract_pages(
+    pdf_path: str, first_page: int = 0, last_page: int | None = None, engine: str | None = None
+) -> list[str]:
+    """Text of each page in [first_page, last_page) ("" for a page without text).
+
+    engine defaults to the first configured one, with no fallback.
+    """
+    engine = engine or _engine_names()[0]
+    return list(pdf_text.get(engine).iter_pages(pdf_path, first_page, last_page))
+
+
+def join_pages(pages: list[str]) -> str:
+    return "".join(page + "\n" for page in pages if page)
+
+
+def extract_text(pdf_path: str, first_page: int = 0, last_page: int | None = None) -> str:
+    """Text of pages [first_page, last_page), one trailing newline per page."""
+    return join_pages(extract_pages(pdf_path, first_page, last_page))
+
+
+def parse_pdf(pdf_path: str) -> dict:
+    """Parse a single bank statement PDF into structured data."""
+    return _extract_and_parse(pdf_path)[1]
+
+
+def _extract_and_parse(pdf_path: str, engines: list[str] | None = None) -> tuple[list[str], dict, str]:
+    """(page texts, parsed statement, engine), parsing each page as it is extracted.
+
+    Engines are tried in order until one's text parses plausibly; the last
+    one's result is taken as it is.
+    """
+    engines = engines or _engine_names()
+    for name in engines:
+        last = name == engines[-1]
+        parser = StatementParser()
+        pages = []
+        try:
+            for page in pdf_text.get(name).iter_pages(pdf_path):
+                pages.append(page)
+                parser.feed_page(page)
+        except Exception as e:
+            if last:
+                raise
+            logger.info(f"{name} could not read {pdf_path}, trying the next engine: {e}")
+            continue
+        parser.close()
+        parsed = parser.result()
+        if last or plausible(parsed):
+            return pages, parsed, name
+        logger.debug(f"{name} text of {pdf_path} is not a plausible statement; trying the next engine")
+    raise ValueError("No PDF text engine")
+
+
+def plausible(parsed: dict) -> bool:
+    """Whether a parse has transactions whose running balance moves by each row's amount.
+
+    Text read out of order or with rows split differently from the
+    statement's layout drops or garbles rows, which breaks the chain.
+    """
+    transactions = parsed.get("transactions") or []
+    previous = parsed.get("openingBalance", 0)
+    for txn in transactions:
+        amount = txn["debit"] if txn["debit"] is not None else txn["credit"]
+        if abs(abs(txn["balance"] - previous) - amount) > 0.011:
+            return False
+        previous = txn["balance"]
+    return bool(transactions)
+
+
+# A transaction row starts with a date: "02 Jan", or "01 Jan 2018"
+_DATE = re.compile(r"^(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)(?:\s+\d{4})?)\s+")
+# ... and ends with the amount and the running balance
+_AMOUNTS = re.compile(r"([\-]?\d+\.\d{2})\s+([\-]?\d+\.\d{2})\s*$")
+_CLOSING = re.compile(r"\$?([\-]?[\d,]+\.\d{2})")
+_OPENING = re.compile(r"([\-]?\d+[\d,]*\.\d{2})")
+
+_PERIOD_LABEL = "Statement Period"
+_CLOSING_LABEL = "Closing Balance"
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _transaction(row: tuple, previous: list[dict]) -> dict:
+    date, parts, amount, balance = row
+    txn = {"date": date, "description": " ".join(parts), "debit": None, "credit": None, "balance": balance}
+    # Debit or credit by the change in balance; the first row's is settled
+    # by StatementParser._release() once the opening balance is known
+    if previous:
+        txn["debit" if balance < previous[-1]["balance"] else "credit"] = amount
+    else:
+        txn["_amount"] = amount
+    return txn
+
+
+class StatementParser:
+    """Single-pass state machine over the text lines of a bank statement.
+
+    The PDF text has metadata on separate lines:
+        Statement Period
+        1 January 2018 - 31 January 2018
+        Closing Balance
+        $37643.40 CR
+
+    Transaction rows span multiple lines:
+        02 Jan DIRECT DEBIT - PROPERTY 4500.00 38000.00
+        MANAGEMENT CO Office Lease - 123 CR
+        Business St
+
+    Feed it pages (or lines) in order; each feed returns the transactions
+    completed so far, so callers can stream them while the rest of the
+    document is still being extracted. Whether the first transaction is a
+    debit depends on the opening balance, so transactions are held back
+    until the "OPENING BALANCE" row has been seen (it normally precedes
+    them) or the document ends.
+    """
+
+    def __init__(self):
+        self.period = ""
+        self._closing = "0"
+        self._opening = "0"
+        self._opening_seen = False
+        # The label whose value is on the next line
+        self._label = None
+        # (date, description parts, amount, balance) of the row being read
+        self._row = None
+        self._released = 0
+        self._pages = False
+        self.transactions: list[dict] = []
+
+    def feed_page(self, text: str) -> list[dict]:
+        """Parse one page of extract_pages() output ("" for a page without text).
+
+        Pages are read as join_pages() joins them, each ending in a newline.
+        """
+        if not text:
+            return []
+        self._pages = True
+        return self.feed_lines(text.split("\n"))
+
+    def feed_lines(self, lines) -> list[dict]:
+        date_match, amounts_search = _DATE.match, _AMOUNTS.search
+        transactions = self.transactions
+        label, row = self._label, self._row
+        for line in lines:
+            stripped = line.strip()
+
+            # Metadata: the line after a label
+            if label is not None:
+                if label is _PERIOD_LABEL:
+                    self.period = stripped
+                else:
+                    # e.g. "$37643.40 CR" or "$-58192.00 CR"
+                    found = _CLOSING.search(stripped)
+                    if found:
+                        self._closing = found.group(1).replace(",", "")
+                label = None
+            if stripped == _PERIOD_LABEL:
+                label = _PERIOD_LABEL
+            elif stripped == _CLOSING_LABEL:
+                label = _CLOSING_LABEL
+
+            m = date_match(stripped) if stripped[:1].isdigit() else None
+            if row is not None:
+                if stripped and m is None:
+                    # Continuation of the row's description, minus "CR"
+                    cleaned = stripped.replace(" CR", "").replace("CR", "").strip()
+                    if cleaned:
+                        row[1].append(cleaned)
+                    continue
+                transactions.append(_transaction(row, transactions))
+                row = None
+            if m is None:
+                continue
+
+            rest = stripped[m.end():].strip()
+            if "OPENING BALANCE" in rest.upper():
+                # "01 Jan 2018 OPENING BALANCE 42500.00"; the first one counts
+                if not self._opening_seen:
+                    self._opening_seen = True
+                    found = _OPENING.search(stripped[m.end():])
+                    if found:
+                        self._opening = found.group(1).replace(",", "")
+                continue
+            # The amount and balance are at the end of the first line only
+            amounts = amounts_search(rest)
+            if amounts:
+                description = rest[:amounts.start()].strip()
+                row = (
+                    m.group(1).strip(),
+                    [description] if description else [],
+                    float(amounts.group(1)),
+                    float(amounts.group(2)),
+                )
+        self._label, self._row = label, row
+        return self._release()
+
+    def _release(self, final: bool = False) -> list[dict]:
+        if not (self._opening_seen or final) or self._released == len(self.transactions):
+            return []
+        if self._released == 0:
+            first = self.transactions[0]
+            amount = first.pop("_amount")
+            first["debit" if first["balance"] < _float(self._opening) else "credit"] = amount
+        released = self.transactions[self._released:]
+        self._released = len(self.transactions)
+        return released
+
+    def close(self) -> list[dict]:
+        """End of the document; returns the transactions not returned yet."""
+        released = self._released
+        if self._pages:
+            # The empty line after the last page's newline
+            self.feed_lines([""])
+        if self._row is not None:
+            self.transactions.append(_transaction(self._row, self.transactions))
+            self._row = None
+        self._release(final=True)
+        return self.transactions[released:]
+
+    def result(self) -> dict:
+        """The parsed statement; call it after close()."""
+        return {
+            "period": self.period,
+            "openingBalance": _float(self._opening),
+            "closingBalance": _float(self._closing),
+            "transactions": self.transactions,
+        }
+
+
+def parse_pages(pages) -> dict:
+    """Parse a statement from its pages' text, page by page."""
+    parser = StatementParser()
+    for page in pages:
+        parser.feed_page(page)
+    parser.close()
+    return parser.result()
+
+
+def parse_text(text: str) -> dict:
+    """Parse the extracted text of a bank statement into structured data."""
+    parser = StatementParser()
+    parser.feed_lines(text.split("\n"))
+    parser.close()
+    return parser.result()
+
+
+def _executor() -> Executor | None:
+    """The shared worker pool, started on first use; None to parse inline."""
+    global _pool
+    if PARSE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process that runs threads (uvicorn, asyncio.to_thread)
+            # can deadlock the child, so workers are spawned
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _page_ranges(pages: int) -> list[tuple[int, int]]:
+    step = max(PAGES_PER_TASK, 1)
+    return [(first, min(first + step, pages)) for first in range(0, pages, step)]
+
+
+def _parsed_version(engine) -> str:
+    return f"{PARSER_VERSION}-{engine.version}"
+
+
+def _from_cache(digest: str) -> tuple[dict | None, str | None]:
+    """(parse, engine) cached for a PDF, chosen as _extract_and_parse() would.
+
+    Only the configured engines are considered, in order, and an engine's
+    cached parse is used only if it is plausible or the engine is the last
+    one, so neither text from an engine that has since been dropped nor an
+    implausible parse that a later engine would replace is served. A parse
+    missing for cached page text is re-parsed from it.
+    """
+    engines = pdf_text.chain()
+    for engine in engines:
+        parsed = parse_cache.get("parsed", digest, _parsed_version(engine))
+        if parsed is None:
+            pages = parse_cache.get("pages", digest, engine.version)
+            if pages is None:
+                continue
+            parsed = parse_pages(pages)
+            parse_cache.put("parsed", digest, _parsed_version(engine), parsed)
+        if engine is engines[-1] or plausible(parsed):
+            return parsed, engine.name
+    return None, None
+
+
+def _remember(digest: str | None, engine: str, pages: list[str], parsed: dict) -> None:
+    stats[engine] += 1
+    if engine != _engine_names()[0]:
+        stats["fallbacks"] += 1
+    if digest is not None:
+        engine = pdf_text.get(engine)
+        parse_cache.put("pages", digest, engine.version, pages)
+        parse_cache.put("parsed", digest, _parsed_version(engine), parsed)
+
+
+def load(pdf_path: str, digest: str | None = None) -> tuple[str, dict]:
+    """(text, parsed statement) of one PDF, through the cache when digest is given."""
+    if digest:
+        parsed, engine = _from_cache(digest)
+        if parsed is not None:
+            pages = parse_cache.get("pages", digest, pdf_text.get(engine).version)
+            if pages is not None:
+                return join_pages(pages), parsed
+    pages, parsed, engine = _extract_and_parse(pdf_path)
+    _remember(digest, engine, pages, parsed)
+    return join_pages(pages), parsed
+
+
+def _parse_or_error(path, digest: str | None) -> dict | Exception:
+    try:
+        pages, parsed, engine = _extract_and_parse(str(path))
+    except Exception as e:
+        return e
+    _remember(digest, engine, pages, parsed)
+    return parsed
+
+
+def _parse_split(pool: Executor, path: str, ranges: list, futures: list, engines: list[str]) -> tuple:
+    """(pages, parsed, engine) of a file extracted in page ranges.
+
+    futures hold the ranges' text from the first engine; the other engines
+    are only submitted if that does not parse plausibly.
+    """
+    for name in engines:
+        last = name == engines[-1]
+        if name != engines[0]:
+            futures = [pool.submit(extract_pages, path, first, end, name) for first, end in ranges]
+        try:
+            pages = [page for part in futures for page in part.result()]
+        except WorkerError:
+            raise
+        except Exception as e:
+            if last:
+                raise
+            logger.info(f"{name} could not read {path}, trying the next engine: {e}")
+            continue
+        parsed = parse_pages(pages)
+        if last or plausible(parsed):
+            return pages, parsed, name
+    raise ValueError("No PDF text engine")
+
+
+def parse_many(paths: dict, digests: dict | None = None) -> dict:
+    """Parse several statement PDFs in parallel.
+
+    paths maps any sortable key (e.g. the month) to a PDF path, and
+    digests optionally maps the same keys to content hashes for the
+    cache. Returns the keys in sorted order, each mapped to its parsed
+    statement or to the exception that parsing it raised.
+    """
+    digests = digests or {}
+    results: dict = {}
+    for key in paths:
+        if digests.get(key):
+            cached, _ = _from_cache(digests[key])
+            if cached is not None:
+                results[key] = cached
+    todo = {key: path for key, path in paths.items() if key not in results}
+
+    pool = _executor() if todo else None
+    if pool is None:
+        for key, path in todo.items():
+            results[key] = _parse_or_error(path, digests.get(key))
+        return {key: results[key] for key in sorted(results)}
+
+    # Workers are separate processes: pass them the engines to use
+    engines = _engine_names()
+    counts = {key: pool.submit(page_count, str(path), engines) for key, path in todo.items()}
+    jobs: dict = {}
+    for key, future in counts.items():
+        try:
+            pages = future.result()
+        except Exception as e:
+            results[key] = e
+            continue
+        if pages <= PAGES_PER_TASK:
+            jobs[key] = pool.submit(_extract_and_parse, str(todo[key]), engines)
+        else:
+            ranges = _page_ranges(pages)
+            jobs[key] = (ranges, [
+                pool.submit(extract_pages, str(todo[key]), first, last, engines[0])
+                for first, last in ranges
+            ])
+
+    for key, job in jobs.items():
+        try:
+            if isinstance(job, tuple):
+                pages, parsed, engine = _parse_split(pool, str(todo[key]), *job, engines)
+            else:
+                pages, parsed, engine = job.result()
+        except Exception as e:
+            results[key] = e
+            continue
+        _remember(digests.get(key), engine, pages, parsed)
+        results[key] = parsed
+    if any(isinstance(r, WorkerError) for r in results.values()):
+        # A worker died (e.g. out of memory); start a fresh pool next time
+        logger.warning("Statement parser pool broke; it will be restarted.")
+        shutdown()
+    return {key: results[key] for key in sorted(results)}
+
+
+def summary() -> dict:
+    return {
+        "engines": _engine_names(),
+        "documents": {name: stats[name] for name in pdf_text.ENGINES if stats[name]},
+        "fallbacks": stats["fallbacks"],
+    }
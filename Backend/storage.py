@@ -1,12 +1,37 @@
-"""Thread-safe JSON file storage for dashboard data."""
+"""Thread-safe storage for dashboard data.
 
+The JSON file backend is the default. Set FIRMWATCH_STORAGE=sqlite to keep
+alerts in the embedded SQLite engine (storage_sqlite.py), or
+FIRMWATCH_STORAGE=journal to append changes to an NDJSON journal that is
+compacted into data.json in the background (storage_journal.py).
+
+Writers describe changes as mutation records (see apply_ops) so backends can
+persist only what changed instead of rewriting the whole document.
+
+Readers share an immutable in-memory Snapshot tagged with a generation number.
+Writers build the next snapshot and swap it in atomically, and a cheap
+mtime/size check on the backing files picks up edits made outside the process.
+"""
+
+import copy
 import json
+import logging
+import os
 import threading
 from pathlib import Path
 
+from aggregates import AlertAggregates, adjust_summary
+from alert_index import AlertIndex
+from similarity import SimilarityIndex
+
 DATA_FILE = Path(__file__).parent / "data.json"
+DB_FILE = Path(os.getenv("FIRMWATCH_DB", Path(__file__).parent / "firmwatch.db"))
+STORAGE_BACKEND = os.getenv("FIRMWATCH_STORAGE", "json").lower()
+
+logger = logging.getLogger(__name__)
 
-_lock = threading.Lock()
+# Serializes writers; readers of the current snapshot never take it
+_lock = threading.RLock()
 
 _DEFAULT_DATA = {
     "summary": {
@@ -26,26 +51,339 @@ def _recompute_summary(data: dict) -> dict:
     data["summary"] = {
         "totalInvoices": len(alerts),
         "highRiskAlerts": sum(1 for a in alerts if a.get("riskLevel") == "HIGH"),
-        "flaggedAmount": sum(
+        # Rounded like the deltas in aggregates.adjust_summary, so both agree
+        "flaggedAmount": round(sum(
             a.get("amount", 0) or 0 for a in alerts if a.get("riskLevel") == "HIGH"
-        ),
+        ), 2),
         "casesResolved": sum(1 for a in alerts if a.get("status") == "Resolved"),
     }
     return data
 
 
-def load_data() -> dict:
-    """Read data.json, returning defaults if missing."""
-    with _lock:
-        if not DATA_FILE.exists():
-            return json.loads(json.dumps(_DEFAULT_DATA))
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
+def default_data() -> dict:
+    """Return a fresh copy of the empty document."""
+    return json.loads(json.dumps(_DEFAULT_DATA))
+
+
+def apply_ops(data: dict, ops: list[dict]) -> dict:
+    """Apply mutation records to an in-memory document.
+
+    Supported records:
+        {"op": "put", "alert": {...}}                   insert or replace by id
+        {"op": "patch", "id": ..., "fields": {...}}     update fields of one alert
+        {"op": "delete", "id": ...}                     remove one alert
+        {"op": "delete_source", "source": ...}          remove alerts from a source
+        {"op": "email_ids", "ids": [...]}               mark emails as processed
+
+    Every record is idempotent, so replaying one twice is harmless. The
+    summary is adjusted by deltas when the document already carries one.
+    """
+    by_id = {a["id"]: a for a in data.get("alerts", [])}
+    email_ids = data.setdefault("processed_email_ids", [])
+    seen_email_ids = None
+
+    summary = data.get("summary")
+    if not isinstance(summary, dict) or set(summary) != set(_DEFAULT_DATA["summary"]):
+        summary = None
+
+    def put(alert_id, alert):
+        old = by_id.get(alert_id)
+        if summary is not None:
+            if old is not None:
+                adjust_summary(summary, old, -1)
+            adjust_summary(summary, alert, 1)
+        by_id[alert_id] = alert
+
+    def remove(alert_id):
+        old = by_id.pop(alert_id, None)
+        if old is not None and summary is not None:
+            adjust_summary(summary, old, -1)
+
+    for op in ops:
+        kind = op["op"]
+        if kind == "put":
+            put(op["alert"]["id"], op["alert"])
+        elif kind == "patch":
+            if op["id"] in by_id:
+                put(op["id"], {**by_id[op["id"]], **op["fields"]})
+        elif kind == "delete":
+            remove(op["id"])
+        elif kind == "delete_source":
+            for aid in [k for k, a in by_id.items() if a.get("source") == op["source"]]:
+                remove(aid)
+        elif kind == "email_ids":
+            if seen_email_ids is None:
+                seen_email_ids = set(email_ids)
+            for eid in op["ids"]:
+                if eid not in seen_email_ids:
+                    seen_email_ids.add(eid)
+                    email_ids.append(eid)
+        else:
+            raise ValueError(f"Unknown storage op: {kind!r}")
+
+    data["alerts"] = list(by_id.values())
+    if summary is None:
+        return _recompute_summary(data)
+    return data
+
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    """Write JSON to a temp file and rename it over path."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonBackend:
+    """Whole-document storage in a single JSON file."""
+
+    def __init__(self, path: Path = DATA_FILE):
+        self.path = Path(path)
+
+    def load(self) -> dict:
+        if not self.path.exists():
+            return default_data()
+        with open(self.path, "r", encoding="utf-8") as f:
             return json.load(f)
 
+    def save(self, data: dict) -> None:
+        write_json_atomic(self.path, data)
+
+    def apply(self, ops: list[dict], document: dict | None = None) -> None:
+        """Persist ops; document is the already-updated state when known."""
+        if document is None:
+            document = apply_ops(self.load(), ops)
+        self.save(document)
+
+    def watch_paths(self) -> list[Path]:
+        return [self.path]
+
+
+def _make_backend():
+    if STORAGE_BACKEND == "sqlite":
+        from storage_sqlite import SqliteBackend
+        return SqliteBackend(DB_FILE)
+    if STORAGE_BACKEND == "journal":
+        from storage_journal import JournalBackend
+        return JournalBackend(DATA_FILE)
+    if STORAGE_BACKEND != "json":
+        raise ValueError(f"Unknown FIRMWATCH_STORAGE backend: {STORAGE_BACKEND!r}")
+    return JsonBackend(DATA_FILE)
+
+
+_backend = _make_backend()
+
+
+class Snapshot:
+    """Stored state at one generation, shared by every reader.
+
+    data, aggregates and similarity must be treated as read-only: writers
+    never mutate a published snapshot, they publish a new one with a higher
+    generation.
+    """
+
+    __slots__ = ("generation", "data", "aggregates", "similarity", "_alert_index")
+
+    def __init__(
+        self,
+        generation: int,
+        data: dict,
+        aggregates: AlertAggregates,
+        similarity: SimilarityIndex,
+        alert_index: AlertIndex | None = None,
+    ):
+        self.generation = generation
+        self.data = data
+        self.aggregates = aggregates
+        self.similarity = similarity
+        self._alert_index = alert_index
+
+    def alert_index(self) -> AlertIndex:
+        """Query indexes over this snapshot's alerts.
+
+        Built on first use; once built, commit() carries it forward to the
+        following generations by applying each batch's deltas.
+        """
+        if self._alert_index is None:
+            self._alert_index = AlertIndex(self.data.get("alerts", []))
+        return self._alert_index
+
+
+_snapshot: Snapshot | None = None
+_generation = 0
+# (mtime_ns, size) of the backend files at the time _snapshot was published
+_file_signature: tuple | None = None
+
+
+def file_stat(path: Path) -> tuple | None:
+    """(mtime_ns, size) of path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _current_file_signature() -> tuple:
+    # A backend that rewrites its files in the background reports them itself,
+    # so its own rewrites do not look like edits from outside the process
+    backend_signature = getattr(_backend, "file_signature", None)
+    if backend_signature is not None:
+        return backend_signature()
+    return tuple(file_stat(path) for path in _backend.watch_paths())
+
+
+def _publish(
+    data: dict,
+    aggregates: AlertAggregates | None = None,
+    similarity: SimilarityIndex | None = None,
+    alert_index: AlertIndex | None = None,
+) -> Snapshot:
+    """Swap in a new snapshot; views not passed are rebuilt from data.
+
+    The alert index is the exception: without one, the snapshot builds it
+    on first use.
+    """
+    global _snapshot, _generation, _file_signature
+    alerts = data.get("alerts", [])
+    if aggregates is None:
+        aggregates = AlertAggregates(alerts)
+    if similarity is None:
+        similarity = SimilarityIndex(alerts)
+    _generation += 1
+    _file_signature = _current_file_signature()
+    _snapshot = Snapshot(_generation, data, aggregates, similarity, alert_index)
+    return _snapshot
+
+
+def peek_snapshot() -> Snapshot | None:
+    """The current snapshot if it is still fresh, else None; never loads."""
+    snapshot = _snapshot
+    if snapshot is not None and _current_file_signature() == _file_signature:
+        return snapshot
+    return None
+
+
+def get_snapshot() -> Snapshot:
+    """Return the current shared snapshot, reloading if the files changed."""
+    snapshot = peek_snapshot()
+    if snapshot is not None:
+        return snapshot
+    with _lock:
+        if _snapshot is not None:
+            if _current_file_signature() == _file_signature:
+                return _snapshot
+            logger.info("Storage changed outside this process; reloading snapshot.")
+        return _publish(_backend.load())
+
+
+def generation() -> int:
+    """Generation number of the current snapshot."""
+    return get_snapshot().generation
+
+
+def use_backend(backend) -> None:
+    """Switch to another backend instance, e.g. a scratch file for benchmarks."""
+    global _backend, _snapshot, _file_signature
+    with _lock:
+        _backend = backend
+        _snapshot = None
+        _file_signature = None
+
+
+def load_data() -> dict:
+    """Return a private, mutable copy of the full document."""
+    return copy.deepcopy(get_snapshot().data)
+
 
 def save_data(data: dict) -> None:
-    """Recompute summary then write data.json atomically."""
+    """Recompute summary then persist the whole document."""
     with _lock:
         _recompute_summary(data)
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        _backend.save(data)
+        _publish(copy.deepcopy(data))
+
+
+def commit(ops: list[dict]) -> None:
+    """Persist a batch of mutation records and publish the next snapshot."""
+    if not ops:
+        return
+    with _lock:
+        current = get_snapshot()
+        # Copy only the containers apply_ops updates in place
+        data = {
+            **current.data,
+            "summary": dict(current.data.get("summary", {})),
+            "processed_email_ids": list(current.data.get("processed_email_ids", [])),
+        }
+        apply_ops(data, ops)
+        _backend.apply(ops, data)
+        aggregates = current.aggregates.copy()
+        aggregates.apply(ops)
+        similarity = current.similarity.copy()
+        similarity.apply(ops)
+        alert_index = current._alert_index
+        if alert_index is not None:
+            alert_index = alert_index.copy()
+            alert_index.apply(ops)
+        _publish(data, aggregates, similarity, alert_index)
+
+
+def append_ops(alerts: list[dict], processed_email_ids: list[str] = ()) -> list[dict]:
+    """Records that add new alerts and mark their emails as processed."""
+    ops = [{"op": "put", "alert": a} for a in alerts]
+    if processed_email_ids:
+        ops.append({"op": "email_ids", "ids": list(processed_email_ids)})
+    return ops
+
+
+def replace_source_ops(source: str, alerts: list[dict]) -> list[dict]:
+    """Records that drop every alert from source and add the given ones."""
+    return (
+        [{"op": "delete_source", "source": source}]
+        + [{"op": "put", "alert": a} for a in alerts]
+    )
+
+
+def status_ops(alert_id: str, status: str) -> list[dict]:
+    """Records that change the workflow status of a single alert."""
+    return [{"op": "patch", "id": alert_id, "fields": {"status": status}}]
+
+
+def append_alerts(alerts: list[dict], processed_email_ids: list[str] = ()) -> None:
+    """Add new alerts and mark the emails they came from as processed."""
+    commit(append_ops(alerts, processed_email_ids))
+
+
+def replace_source_alerts(source: str, alerts: list[dict]) -> None:
+    """Drop every alert from source and add the given ones in its place."""
+    commit(replace_source_ops(source, alerts))
+
+
+def update_alert_status(alert_id: str, status: str) -> None:
+    """Change the workflow status of a single alert."""
+    commit(status_ops(alert_id, status))
+
+
+def get_aggregates() -> AlertAggregates:
+    """Return the materialized analytics views of the current snapshot."""
+    return get_snapshot().aggregates
+
+
+def check_aggregates(repair: bool = True) -> list[str]:
+    """Verify the views against a full rebuild; optionally repair them.
+
+    Returns the names of the views that were out of date.
+    """
+    with _lock:
+        snapshot = get_snapshot()
+        alerts = snapshot.data.get("alerts", [])
+        mismatches = snapshot.aggregates.verify(alerts)
+        if mismatches and repair:
+            _publish(
+                snapshot.data, AlertAggregates(alerts), snapshot.similarity, snapshot._alert_index
+            )
+        return mismatches
@@ -0,0 +1,138 @@
+"""Event-loop friendly facade over storage for the async request handlers.
+
+Reads that have to touch disk (a reload after an external edit) run in a
+worker thread; the common case of a still-fresh snapshot is answered inline.
+
+Writes never call storage.commit from a handler. They are queued to a single
+writer task which drains everything that piled up while the previous commit
+was running and applies it as one batch (group commit), so concurrent syncs
+and uploads neither block the loop nor overwrite each other's alerts.
+"""
+
+import asyncio
+import logging
+import os
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the mutation requests folded into one commit
+MAX_BATCH = int(os.getenv("FIRMWATCH_COMMIT_MAX_BATCH", "256"))
+
+
+class AsyncStorage:
+    """Async reads plus a single-writer, group-committing write queue."""
+
+    def __init__(self, max_batch: int = MAX_BATCH):
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.commits = 0
+        self.requests = 0
+        self.largest_batch = 0
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the writer task on the running loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._writer is not None and not self._writer.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._run_writer(), name="storage-writer")
+
+    async def stop(self) -> None:
+        """Commit everything already queued, then stop the writer."""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+
+    # -- reads --------------------------------------------------------------
+
+    async def snapshot(self) -> storage.Snapshot:
+        snapshot = storage.peek_snapshot()
+        if snapshot is not None:
+            return snapshot
+        return await asyncio.to_thread(storage.get_snapshot)
+
+    async def generation(self) -> int:
+        return (await self.snapshot()).generation
+
+    # -- writes -------------------------------------------------------------
+
+    async def commit(self, ops: list[dict]) -> None:
+        """Queue mutation records and wait until they are durable."""
+        if not ops:
+            return
+        self.start()
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((ops, done))
+        await done
+
+    async def append_alerts(self, alerts: list[dict], processed_email_ids: list[str] = ()) -> None:
+        await self.commit(storage.append_ops(alerts, processed_email_ids))
+
+    async def replace_source_alerts(self, source: str, alerts: list[dict]) -> None:
+        await self.commit(storage.replace_source_ops(source, alerts))
+
+    async def update_alert_status(self, alert_id: str, status: str) -> None:
+        await self.commit(storage.status_ops(alert_id, status))
+
+    async def _run_writer(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list[tuple]) -> None:
+        ops = [op for request_ops, _ in batch for op in request_ops]
+        try:
+            await asyncio.to_thread(storage.commit, ops)
+        except Exception as e:
+            if len(batch) == 1:
+                self._settle(batch, e)
+                return
+            # Retry one by one so a bad request cannot fail its batch-mates
+            logger.warning(f"Group commit of {len(batch)} request(s) failed, retrying singly: {e}")
+            for item in batch:
+                await self._commit_batch([item])
+            return
+        self.commits += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self._settle(batch, None)
+
+    @staticmethod
+    def _settle(batch: list[tuple], error: Exception | None) -> None:
+        for _, done in batch:
+            if done.done():
+                continue
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "commits": self.commits,
+            "requests": self.requests,
+            "largestBatch": self.largest_batch,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+store = AsyncStorage()
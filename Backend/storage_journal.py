@@ -0,0 +1,222 @@
+"""Append-only journal storage for dashboard data.
+
+Mutation records (see storage.apply_ops) are appended to data.journal as
+NDJSON, one record per line, and fsync'd in batches by a background thread.
+Once the journal grows past a threshold, a background compactor folds it into
+the data.json snapshot. Loading rebuilds state as snapshot + journal replay.
+
+Every record carries a sequence number and the snapshot remembers the last
+one it contains, so records already folded in are skipped on replay.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from storage import apply_ops, default_data, file_stat, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+FSYNC_INTERVAL = float(os.getenv("FIRMWATCH_JOURNAL_FSYNC_MS", "50")) / 1000
+COMPACT_RECORDS = int(os.getenv("FIRMWATCH_JOURNAL_COMPACT_RECORDS", "1000"))
+
+# Snapshot key holding the sequence number of the last folded-in record
+SEQ_KEY = "journalSeq"
+
+
+class JournalBackend:
+    """data.json snapshot plus an NDJSON journal of changes since."""
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        fsync_interval: float = FSYNC_INTERVAL,
+        compact_records: int = COMPACT_RECORDS,
+    ):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = self.snapshot_path.with_suffix(".journal")
+        # The journal is renamed here while the compactor folds it in
+        self.compacting_path = self.snapshot_path.with_suffix(".journal.compacting")
+        self.fsync_interval = fsync_interval
+        self.compact_records = compact_records
+
+        self._io_lock = threading.Lock()        # journal file handle + seq
+        self._files_lock = threading.RLock()    # snapshot/journal renames vs readers
+        self._compact_lock = threading.Lock()   # one compaction at a time
+        self._dirty = threading.Event()
+        self._compact_wanted = threading.Event()
+        self._closed = threading.Event()
+        # path -> (file_stat() after our last compaction, what to report instead)
+        self._compacted: dict[Path, tuple] = {}
+
+        self._repair_torn_tail(self.journal_path)
+        if self.compacting_path.exists():
+            # A previous compaction was interrupted; finish it first
+            self._fold_compacting()
+
+        self._seq = self._last_seq()
+        self._uncompacted = self._count_records(self.journal_path)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+
+        threading.Thread(target=self._fsync_loop, name="journal-fsync", daemon=True).start()
+        threading.Thread(target=self._compact_loop, name="journal-compact", daemon=True).start()
+
+    # -- reads --------------------------------------------------------------
+
+    def load(self) -> dict:
+        with self._files_lock:
+            data = self._read_snapshot()
+            seq = data.pop(SEQ_KEY, 0)
+            ops = []
+            for path in (self.compacting_path, self.journal_path):
+                for record in self._read_records(path):
+                    if record["seq"] > seq:
+                        ops.append(record)
+        return apply_ops(data, ops)
+
+    def _read_snapshot(self) -> dict:
+        if not self.snapshot_path.exists():
+            return default_data()
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _read_records(path: Path):
+        if not path.exists():
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Half-written tail from a concurrent append or a crash
+                    return
+                yield json.loads(line)
+
+    # -- writes -------------------------------------------------------------
+
+    def watch_paths(self) -> list[Path]:
+        return [self.snapshot_path, self.journal_path]
+
+    def file_signature(self) -> tuple:
+        """file_stat() of watch_paths(), minus the compactor's own rewrites.
+
+        A compaction replaces both files without changing their content, so
+        until either is written again, each reports its stat from before the
+        compaction and storage keeps its snapshot instead of reloading.
+        """
+        with self._files_lock:
+            return tuple(self._reported_stat(path) for path in self.watch_paths())
+
+    def _reported_stat(self, path: Path) -> tuple | None:
+        actual = file_stat(path)
+        compacted = self._compacted.get(path)
+        if compacted is not None and compacted[0] == actual:
+            return compacted[1]
+        return actual
+
+    def apply(self, ops: list[dict], document: dict | None = None) -> None:
+        with self._io_lock:
+            lines = []
+            for op in ops:
+                self._seq += 1
+                lines.append(json.dumps({"seq": self._seq, **op}, separators=(",", ":")))
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self._uncompacted += len(ops)
+            if self._uncompacted >= self.compact_records:
+                self._compact_wanted.set()
+        self._dirty.set()
+
+    def save(self, data: dict) -> None:
+        """Replace everything with a full document (legacy whole-file save)."""
+        with self._compact_lock, self._io_lock, self._files_lock:
+            snapshot = {**data, SEQ_KEY: self._seq}
+            write_json_atomic(self.snapshot_path, snapshot)
+            self._file.truncate(0)
+            self._uncompacted = 0
+
+    def close(self) -> None:
+        self._closed.set()
+        self._dirty.set()
+        self._compact_wanted.set()
+        # Let a compaction in progress finish before the files are released
+        with self._compact_lock, self._io_lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    # -- background work ----------------------------------------------------
+
+    def _fsync_loop(self) -> None:
+        while not self._closed.is_set():
+            self._dirty.wait()
+            # Let concurrent appends pile up so one fsync covers the batch
+            self._closed.wait(self.fsync_interval)
+            self._dirty.clear()
+            with self._io_lock:
+                if self._file.closed:
+                    return
+                os.fsync(self._file.fileno())
+
+    def _compact_loop(self) -> None:
+        while not self._closed.is_set():
+            self._compact_wanted.wait()
+            self._compact_wanted.clear()
+            if self._closed.is_set():
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Journal compaction failed: {e}")
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot without blocking appends for long."""
+        with self._compact_lock:
+            with self._io_lock, self._files_lock:
+                if self._uncompacted == 0 or self._file.closed:
+                    return
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                reported = self._reported_stat(self.journal_path)
+                os.replace(self.journal_path, self.compacting_path)
+                self._file = open(self.journal_path, "a", encoding="utf-8")
+                self._compacted[self.journal_path] = (file_stat(self.journal_path), reported)
+                self._uncompacted = 0
+            self._fold_compacting()
+            logger.info(f"Compacted journal into {self.snapshot_path.name}")
+
+    def _fold_compacting(self) -> None:
+        data = self._read_snapshot()
+        seq = data.pop(SEQ_KEY, 0)
+        ops = [r for r in self._read_records(self.compacting_path) if r["seq"] > seq]
+        if ops:
+            seq = ops[-1]["seq"]
+        snapshot = {**apply_ops(data, ops), SEQ_KEY: seq}
+        with self._files_lock:
+            reported = self._reported_stat(self.snapshot_path)
+            write_json_atomic(self.snapshot_path, snapshot)
+            os.remove(self.compacting_path)
+            self._compacted[self.snapshot_path] = (file_stat(self.snapshot_path), reported)
+
+    # -- recovery helpers ---------------------------------------------------
+
+    def _last_seq(self) -> int:
+        seq = self._read_snapshot().get(SEQ_KEY, 0)
+        for record in self._read_records(self.journal_path):
+            seq = max(seq, record["seq"])
+        return seq
+
+    def _count_records(self, path: Path) -> int:
+        return sum(1 for _ in self._read_records(path))
+
+    @staticmethod
+    def _repair_torn_tail(path: Path) -> None:
+        """Cut a half-written last line left behind by a crash."""
+        if not path.exists():
+            return
+        with open(path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
@@ -0,0 +1,303 @@
+"""Embedded SQLite (WAL) storage engine for dashboard data.
+
+Alerts, their factors and flags, and processed email IDs live in indexed
+tables. Saving a document only writes the alert rows whose content changed.
+
+Import an existing data.json with:
+    python storage_sqlite.py migrate [data.json] [firmwatch.db]
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    id          TEXT NOT NULL UNIQUE,
+    emailId     TEXT,
+    riskScore   REAL,
+    riskLevel   TEXT,
+    type        TEXT,
+    vendor      TEXT,
+    amount      REAL,
+    reason      TEXT,
+    summary     TEXT,
+    status      TEXT,
+    date        TEXT,
+    source      TEXT,
+    extra       TEXT,
+    fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_email_id ON alerts(emailId);
+CREATE INDEX IF NOT EXISTS idx_alerts_risk_level ON alerts(riskLevel);
+CREATE INDEX IF NOT EXISTS idx_alerts_vendor ON alerts(vendor);
+CREATE INDEX IF NOT EXISTS idx_alerts_date ON alerts(date);
+CREATE INDEX IF NOT EXISTS idx_alerts_source ON alerts(source);
+CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status);
+
+CREATE TABLE IF NOT EXISTS factors (
+    alert_id    TEXT NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+    position    INTEGER NOT NULL,
+    id          TEXT,
+    title       TEXT,
+    severity    TEXT,
+    description TEXT,
+    PRIMARY KEY (alert_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS flags (
+    alert_id TEXT NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    flag     TEXT NOT NULL,
+    PRIMARY KEY (alert_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_flags_flag ON flags(flag);
+
+CREATE TABLE IF NOT EXISTS processed_email_ids (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id TEXT NOT NULL UNIQUE
+);
+"""
+
+# Scalar alert keys stored in their own columns, in document order
+ALERT_COLUMNS = (
+    "id", "emailId", "riskScore", "riskLevel", "type", "vendor", "amount",
+    "reason", "summary", "status", "date", "source",
+)
+# A NULL column means the key is absent, unless the row's extra JSON lists
+# it under this key as present with a null value
+NULLS_KEY = "_nullColumns"
+# REAL columns; integral values come back as ints, as they are usually written
+NUMERIC_COLUMNS = {"riskScore", "amount"}
+FACTOR_COLUMNS = ("id", "title", "severity", "description")
+
+
+def alert_fingerprint(alert: dict) -> str:
+    """Stable content hash used to detect changed alert rows."""
+    payload = json.dumps(alert, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SqliteBackend:
+    """Alert storage in an SQLite database running in WAL mode."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        # The connection is shared between threads; serialize its use
+        self._conn_lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # -- reads --------------------------------------------------------------
+
+    def load(self) -> dict:
+        with self._conn_lock:
+            conn = self._conn
+            flags: dict[str, list] = {}
+            for row in conn.execute("SELECT alert_id, flag FROM flags ORDER BY alert_id, position"):
+                flags.setdefault(row["alert_id"], []).append(row["flag"])
+
+            factors: dict[str, list] = {}
+            for row in conn.execute(
+                "SELECT alert_id, id, title, severity, description FROM factors "
+                "ORDER BY alert_id, position"
+            ):
+                factors.setdefault(row["alert_id"], []).append(
+                    {k: row[k] for k in FACTOR_COLUMNS}
+                )
+
+            alerts = [
+                self._row_to_alert(row, flags, factors)
+                for row in conn.execute("SELECT * FROM alerts ORDER BY seq")
+            ]
+            email_ids = [
+                row["email_id"]
+                for row in conn.execute("SELECT email_id FROM processed_email_ids ORDER BY seq")
+            ]
+            summary = self._summary(conn)
+
+        return {"summary": summary, "alerts": alerts, "processed_email_ids": email_ids}
+
+    @staticmethod
+    def _row_to_alert(row: sqlite3.Row, flags: dict, factors: dict) -> dict:
+        extra = json.loads(row["extra"]) if row["extra"] else {}
+        nulls = set(extra.pop(NULLS_KEY, ()))
+        alert = {}
+        for col in ALERT_COLUMNS:
+            value = row[col]
+            if value is not None or col in nulls:
+                if col in NUMERIC_COLUMNS and isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                alert[col] = value
+            if col == "reason":
+                alert["flags"] = flags.get(row["id"], [])
+            elif col == "summary":
+                alert["factors"] = factors.get(row["id"], [])
+        alert.update(extra)
+        return alert
+
+    @staticmethod
+    def _summary(conn: sqlite3.Connection) -> dict:
+        row = conn.execute(
+            """SELECT COUNT(*) AS total,
+                      COALESCE(SUM(riskLevel = 'HIGH'), 0) AS high,
+                      COALESCE(SUM(CASE WHEN riskLevel = 'HIGH' THEN COALESCE(amount, 0) END), 0) AS flagged,
+                      COALESCE(SUM(status = 'Resolved'), 0) AS resolved
+               FROM alerts"""
+        ).fetchone()
+        return {
+            "totalInvoices": row["total"],
+            "highRiskAlerts": row["high"],
+            # Rounded like storage._recompute_summary()
+            "flaggedAmount": round(row["flagged"], 2),
+            "casesResolved": row["resolved"],
+        }
+
+    @classmethod
+    def _fetch_alert(cls, conn: sqlite3.Connection, alert_id: str) -> dict | None:
+        row = conn.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        if row is None:
+            return None
+        flags = {alert_id: [
+            r["flag"] for r in conn.execute(
+                "SELECT flag FROM flags WHERE alert_id = ? ORDER BY position", (alert_id,)
+            )
+        ]}
+        factors = {alert_id: [
+            {k: r[k] for k in FACTOR_COLUMNS} for r in conn.execute(
+                "SELECT id, title, severity, description FROM factors "
+                "WHERE alert_id = ? ORDER BY position", (alert_id,)
+            )
+        ]}
+        return cls._row_to_alert(row, flags, factors)
+
+    # -- writes -------------------------------------------------------------
+
+    def watch_paths(self) -> list[Path]:
+        return [self.path, self.path.with_name(self.path.name + "-wal")]
+
+    def apply(self, ops: list[dict], document: dict | None = None) -> None:
+        """Apply mutation records (see storage.apply_ops) row by row."""
+        with self._conn_lock, self._conn as conn:
+            for op in ops:
+                kind = op["op"]
+                if kind == "put":
+                    alert = op["alert"]
+                    self._upsert_alert(conn, alert, alert_fingerprint(alert))
+                elif kind == "patch":
+                    alert = self._fetch_alert(conn, op["id"])
+                    if alert is not None:
+                        alert.update(op["fields"])
+                        self._upsert_alert(conn, alert, alert_fingerprint(alert))
+                elif kind == "delete":
+                    conn.execute("DELETE FROM alerts WHERE id = ?", (op["id"],))
+                elif kind == "delete_source":
+                    conn.execute("DELETE FROM alerts WHERE source = ?", (op["source"],))
+                elif kind == "email_ids":
+                    self._sync_email_ids(conn, op["ids"])
+                else:
+                    raise ValueError(f"Unknown storage op: {kind!r}")
+
+    def save(self, data: dict) -> None:
+        """Persist a full document, touching only rows that changed."""
+        alerts = data.get("alerts", [])
+        with self._conn_lock, self._conn as conn:
+            existing = dict(conn.execute("SELECT id, fingerprint FROM alerts"))
+
+            wanted = set()
+            for alert in alerts:
+                wanted.add(alert["id"])
+                fingerprint = alert_fingerprint(alert)
+                if existing.get(alert["id"]) != fingerprint:
+                    self._upsert_alert(conn, alert, fingerprint)
+
+            stale = [(aid,) for aid in existing if aid not in wanted]
+            if stale:
+                conn.executemany("DELETE FROM alerts WHERE id = ?", stale)
+
+            self._sync_email_ids(conn, data.get("processed_email_ids", []))
+
+    @staticmethod
+    def _upsert_alert(conn: sqlite3.Connection, alert: dict, fingerprint: str) -> None:
+        extra = {
+            k: v for k, v in alert.items()
+            if k not in ALERT_COLUMNS and k not in ("flags", "factors")
+        }
+        nulls = [col for col in ALERT_COLUMNS if col in alert and alert[col] is None]
+        if nulls:
+            extra[NULLS_KEY] = nulls
+        values = [alert.get(col) for col in ALERT_COLUMNS]
+        values += [json.dumps(extra) if extra else None, fingerprint]
+        updates = ", ".join(f"{col} = excluded.{col}" for col in ALERT_COLUMNS[1:])
+        conn.execute(
+            f"INSERT INTO alerts ({', '.join(ALERT_COLUMNS)}, extra, fingerprint) "
+            f"VALUES ({', '.join('?' * (len(ALERT_COLUMNS) + 2))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}, "
+            "extra = excluded.extra, fingerprint = excluded.fingerprint",
+            values,
+        )
+
+        aid = alert["id"]
+        conn.execute("DELETE FROM flags WHERE alert_id = ?", (aid,))
+        conn.executemany(
+            "INSERT INTO flags (alert_id, position, flag) VALUES (?, ?, ?)",
+            [(aid, pos, str(flag)) for pos, flag in enumerate(alert.get("flags") or [])],
+        )
+        conn.execute("DELETE FROM factors WHERE alert_id = ?", (aid,))
+        conn.executemany(
+            "INSERT INTO factors (alert_id, position, id, title, severity, description) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (aid, pos, *(f.get(k) for k in FACTOR_COLUMNS))
+                for pos, f in enumerate(alert.get("factors") or [])
+            ],
+        )
+
+    @staticmethod
+    def _sync_email_ids(conn: sqlite3.Connection, email_ids: list) -> None:
+        # The processed ID list only ever grows, so inserting is enough
+        conn.executemany(
+            "INSERT OR IGNORE INTO processed_email_ids (email_id) VALUES (?)",
+            [(eid,) for eid in email_ids],
+        )
+
+
+def migrate(json_path: Path, db_path: Path) -> dict:
+    """Import a data.json document into an SQLite database."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    backend = SqliteBackend(db_path)
+    try:
+        backend.save(data)
+        return backend.load()["summary"]
+    finally:
+        backend.close()
+
+
+def main() -> None:
+    here = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="FirmWatch SQLite storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    mig = sub.add_parser("migrate", help="import an existing data.json")
+    mig.add_argument("json_path", nargs="?", default=str(here / "data.json"))
+    mig.add_argument("db_path", nargs="?", default=str(here / "firmwatch.db"))
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        summary = migrate(Path(args.json_path), Path(args.db_path))
+        print(f"Imported {summary['totalInvoices']} alert(s) into {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Shared test setup.
+
+Every database and data file the Backend modules open at import time is
+pointed at a scratch directory before they are imported, so the tests never
+touch the checked-in data.json or the local *.db files.
+"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+# Synthetic statement PDFs are shared with the benchmarks
+sys.path.insert(0, str(BACKEND / "benchmarks"))
+
+_SCRATCH = Path(tempfile.mkdtemp(prefix="firmwatch-tests-"))
+for name, value in {
+    "FIRMWATCH_STORAGE": "sqlite",
+    "FIRMWATCH_DB": _SCRATCH / "firmwatch.db",
+    "FIRMWATCH_DEDUPE_DB": _SCRATCH / "processed_emails.db",
+    "FIRMWATCH_LLM_CACHE_DB": _SCRATCH / "llm_cache.db",
+    "FIRMWATCH_PARSE_CACHE_DB": _SCRATCH / "parse_cache.db",
+    "FIRMWATCH_STATEMENT_CATALOG_DB": _SCRATCH / "statement_catalog.db",
+    "FIRMWATCH_STATEMENT_ACCOUNTS_DIR": _SCRATCH / "statements",
+    "FIRMWATCH_PARSE_WORKERS": "0",
+}.items():
+    os.environ[name] = str(value)
+
+
+def make_alert(alert_id: str, **fields) -> dict:
+    """A stored alert shaped like the ones the pipelines write."""
+    alert = {
+        "id": alert_id,
+        "riskScore": 50,
+        "riskLevel": "MEDIUM",
+        "type": "Invoice",
+        "vendor": "Acme Supplies",
+        "amount": 100.0,
+        "reason": "test",
+        "flags": [],
+        "summary": "Test alert.",
+        "factors": [],
+        "status": "New Alert",
+        "source": "email",
+        "date": "2024-01-15T09:30:00",
+    }
+    alert.update(fields)
+    return alert
+
+
+def random_alert(rng: random.Random, alert_id: str) -> dict:
+    """make_alert() with the fields the indexes and views read picked at random."""
+    return make_alert(
+        alert_id,
+        riskScore=rng.choice([10, 40, 40, 75, 95, None]),
+        riskLevel=rng.choice(["LOW", "MEDIUM", "HIGH"]),
+        status=rng.choice(["New Alert", "Investigating", "Resolved"]),
+        vendor=rng.choice(["Acme", "Globex", "Initech"]),
+        amount=rng.choice([None, 0, 99.99, 1250.5]),
+        flags=rng.sample(["Duplicate invoice", "Round amount", "New vendor"], rng.randint(0, 2)),
+        source=rng.choice(["email", "statement", "upload"]),
+        date=rng.choice([
+            "2024-01-15T09:30:00", "2024-02-01", "Mon, 04 Mar 2024 10:00:00 +0200",
+            "3 April 2024", "03 Jun", "",
+        ]),
+    )
+
+
+def random_ops(rng: random.Random, ids: list[str]) -> list[dict]:
+    """A batch of one to six mutation records over the given alert ids."""
+    ops = []
+    for _ in range(rng.randint(1, 6)):
+        kind = rng.choice(["put", "put", "patch", "delete", "delete_source"])
+        alert_id = rng.choice(ids)
+        if kind == "put":
+            ops.append({"op": "put", "alert": random_alert(rng, alert_id)})
+        elif kind == "patch":
+            fields = rng.choice([
+                {"status": "Resolved"},
+                {"riskScore": rng.randint(0, 100)},
+                {"riskLevel": "HIGH"},
+                {"date": "2023-12-31"},
+                {"flags": ["Round amount"]},
+            ])
+            ops.append({"op": "patch", "id": alert_id, "fields": fields})
+        elif kind == "delete":
+            ops.append({"op": "delete", "id": alert_id})
+        else:
+            ops.append({"op": "delete_source", "source": rng.choice(["email", "statement"])})
+    return ops
+
+
+@pytest.fixture
+def scratch_storage(tmp_path):
+    """The storage module switched to an empty SQLite file for one test."""
+    import storage
+    from storage_sqlite import SqliteBackend
+
+    previous = storage._backend
+    storage.use_backend(SqliteBackend(tmp_path / "firmwatch.db"))
+    yield storage
+    storage.use_backend(previous)
+
+
+@pytest.fixture
+def statement_dirs(tmp_path, monkeypatch):
+    """server.catalog switched to an empty project root and accounts directory."""
+    import server
+    from statement_catalog import StatementCatalog
+
+    root = tmp_path / "project"
+    accounts = root / "statements"
+    accounts.mkdir(parents=True)
+    monkeypatch.setattr(
+        server, "catalog", StatementCatalog(tmp_path / "catalog.db", root, accounts)
+    )
+    return root
+
+
+@pytest.fixture
+def client(scratch_storage, statement_dirs):
+    """A TestClient over scratch storage and an empty statement catalog."""
+    from fastapi.testclient import TestClient
+
+    import server
+
+    return TestClient(server.app)
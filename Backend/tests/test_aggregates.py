@@ -0,0 +1,66 @@
+"""Materialized dashboard aggregates kept current by mutation-record deltas."""
+
+import random
+
+from aggregates import AlertAggregates, alert_weekday
+from conftest import make_alert, random_ops
+from storage import _recompute_summary, apply_ops, default_data
+
+
+def test_deltas_match_a_rebuild():
+    rng = random.Random(3)
+    ids = [f"a{i}" for i in range(25)]
+    data = default_data()
+    views = AlertAggregates()
+    for _ in range(300):
+        ops = random_ops(rng, ids)
+        published, before = views, views._state()
+
+        apply_ops(data, ops)
+        views = views.copy()
+        views.apply(ops)
+
+        assert views.verify(data["alerts"]) == []
+        assert views.summary() == _recompute_summary({"alerts": data["alerts"]})["summary"]
+        assert len(views) == len(data["alerts"])
+        assert published._state() == before
+
+
+def test_panels():
+    views = AlertAggregates([
+        make_alert("a1", riskLevel="HIGH", amount=1000.5, flags=["Round amount"], vendor="Acme",
+                   date="2024-01-15T09:30:00"),
+        make_alert("a2", riskLevel="HIGH", amount=None, flags=["Round amount", "New vendor"],
+                   vendor="Acme", date="2024-01-16", status="Resolved"),
+        make_alert("a3", riskLevel="LOW", amount=50, vendor="Globex", date="not a date"),
+    ])
+    assert views.summary() == {
+        "totalInvoices": 3, "highRiskAlerts": 2, "flaggedAmount": 1000.5, "casesResolved": 1,
+    }
+    assert views.risk_distribution() == {"low": 1, "medium": 0, "high": 2}
+    assert views.top_flags(1) == [("Round amount", 2)]
+    assert views.top_vendors() == [("Acme", 2), ("Globex", 1)]
+    over_time = {row["date"]: row["count"] for row in views.alerts_over_time()}
+    assert over_time["Mon"] == 1 and over_time["Tue"] == 1 and sum(over_time.values()) == 2
+
+
+def test_verify_names_the_stale_views():
+    views = AlertAggregates([make_alert("a1")])
+    views.apply([{"op": "put", "alert": make_alert("a2", riskLevel="HIGH")}])
+    assert views.verify([make_alert("a1")]) == ["summary", "riskLevels", "vendors", "weekdays"]
+
+
+def test_check_aggregates_repairs(scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1"), make_alert("a2", riskLevel="HIGH")])
+    snapshot = scratch_storage.get_snapshot()
+    snapshot.aggregates.apply([{"op": "delete", "id": "a2"}])
+    stale = ["summary", "riskLevels", "vendors", "weekdays"]
+    assert scratch_storage.check_aggregates(repair=True) == stale
+    assert scratch_storage.check_aggregates(repair=False) == []
+    assert scratch_storage.get_snapshot().generation == snapshot.generation + 1
+
+
+def test_alert_weekday():
+    assert alert_weekday({"date": "2024-01-15T09:30:00Z"}) == "Mon"
+    assert alert_weekday({"date": "Mon, 15 Jan 2024"}) == "Unknown"
+    assert alert_weekday({}) == "Unknown"
@@ -0,0 +1,104 @@
+"""AlertIndex queries, and deltas applied by storage.commit."""
+
+import random
+
+import pytest
+
+from alert_index import FILTER_FIELDS, SORT_FIELDS, AlertIndex, decode_cursor, encode_cursor
+from conftest import make_alert, random_ops
+from storage import apply_ops, default_data
+
+
+def _state(index: AlertIndex) -> tuple:
+    return (
+        index.by_id,
+        {f: index.postings(f) for f in FILTER_FIELDS},
+        {f: [e[:2] for e in index.order(f)] for f in SORT_FIELDS},
+    )
+
+
+def _queries(index: AlertIndex) -> list:
+    pages = []
+    for sort in SORT_FIELDS:
+        for descending in (True, False):
+            for filters, date_from, date_to in (
+                (None, None, None),
+                ({"riskLevel": ["HIGH", "MEDIUM"]}, None, None),
+                ({"vendor": ["Acme"], "status": ["Resolved"]}, "2024-02-01", "2024-03-31"),
+            ):
+                cursor, rows = None, []
+                while True:
+                    page, cursor = index.query(
+                        filters, date_from, date_to, sort, descending, cursor, limit=3
+                    )
+                    rows += [a["id"] for a in page]
+                    if cursor is None:
+                        break
+                pages.append(rows)
+    return pages
+
+
+def test_deltas_match_a_rebuild():
+    rng = random.Random(7)
+    ids = [f"a{i}" for i in range(30)]
+    data = default_data()
+    index = AlertIndex()
+    for _ in range(300):
+        ops = random_ops(rng, ids)
+        published = index
+        before = _state(published)
+        frozen = (
+            dict(before[0]),
+            {f: {v: set(m) for v, m in p.items()} for f, p in before[1].items()},
+            before[2],
+        )
+
+        apply_ops(data, ops)
+        index = index.copy()
+        index.apply(ops)
+
+        rebuilt = AlertIndex(data["alerts"])
+        assert _state(index) == _state(rebuilt)
+        assert _queries(index) == _queries(rebuilt)
+        # The previous generation's index is left exactly as it was
+        assert _state(published) == frozen
+    assert [a["id"] for a in data["alerts"]] == [e[1] for e in sorted(
+        index.order("date"), key=lambda e: e[2]
+    )]
+
+
+def test_date_range_and_keyset_pages():
+    index = AlertIndex([
+        make_alert("old", date="2023-12-31T23:00:00"),
+        make_alert("jan", date="2024-01-10"),
+        make_alert("feb", date="Thu, 01 Feb 2024 12:00:00 +0000"),
+        make_alert("undated", date="03 Jun"),
+    ])
+    page, cursor = index.query(date_from="2024-01-01", date_to="2024-02-01", limit=1)
+    assert [a["id"] for a in page] == ["feb"]
+    page, cursor = index.query(
+        date_from="2024-01-01", date_to="2024-02-01", cursor=cursor, limit=1
+    )
+    assert [a["id"] for a in page] == ["jan"]
+    assert cursor is None
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42.0, "a1")) == (42.0, "a1")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_commit_carries_the_index_forward(scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1", riskScore=20), make_alert("a2", riskScore=90)])
+    first = scratch_storage.get_snapshot()
+    first_index = first.alert_index()
+
+    scratch_storage.update_alert_status("a2", "Resolved")
+    scratch_storage.append_alerts([make_alert("a3", riskScore=55)])
+    second = scratch_storage.get_snapshot()
+
+    assert second._alert_index is not None
+    assert _state(second.alert_index()) == _state(AlertIndex(second.data["alerts"]))
+    assert first_index.postings("status")["New Alert"] == {"a1", "a2"}
+    assert [e[1] for e in first_index.order("riskScore")] == ["a1", "a2"]
@@ -0,0 +1,53 @@
+"""/api/alerts filters, pagination and parameter validation."""
+
+from alert_index import encode_cursor
+from conftest import make_alert
+
+
+def _ids(response) -> list[str]:
+    body = response.json()
+    return [a["id"] for a in (body["items"] if isinstance(body, dict) else body)]
+
+
+def test_dates_in_any_supported_format_filter_by_day(client, scratch_storage):
+    scratch_storage.append_alerts([
+        make_alert("dec", date="2023-12-31T23:59:00"),
+        make_alert("jan", date="2024-01-31T18:00:00"),
+        make_alert("feb", date="2024-02-01T08:00:00"),
+    ])
+    params = {"dateFrom": "1 January 2024", "dateTo": "2024-01-31"}
+    response = client.get("/api/alerts", params=params)
+    assert response.status_code == 200
+    assert _ids(response) == ["jan"]
+    response = client.get("/api/alerts", params={"dateFrom": "Thu, 01 Feb 2024 00:00:00 +0000"})
+    assert _ids(response) == ["feb"]
+
+
+def test_bad_dates_are_rejected(client, scratch_storage):
+    for name in ("dateFrom", "dateTo"):
+        response = client.get("/api/alerts", params={name: "last tuesday"})
+        assert response.status_code == 400
+        assert name in response.json()["detail"]
+
+
+def test_cursor_pages_cover_every_alert_once(client, scratch_storage):
+    scratch_storage.append_alerts([make_alert(f"a{i}", riskScore=i % 4) for i in range(10)])
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "riskScore", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/alerts", params=params).json()
+        seen += [a["id"] for a in body["items"]]
+        cursor = body["nextCursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(f"a{i}" for i in range(10))
+    assert len(seen) == 10
+
+
+def test_cursor_of_the_wrong_sort_is_rejected(client, scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1"), make_alert("a2")])
+    date_cursor = encode_cursor("2024-01-15T09:30:00", "a1")
+    score_cursor = encode_cursor(50.0, "a1")
+    for sort, cursor in (("riskScore", date_cursor), ("date", score_cursor), ("date", "garbage")):
+        response = client.get("/api/alerts", params={"sort": sort, "cursor": cursor})
+        assert response.status_code == 400, (sort, cursor)
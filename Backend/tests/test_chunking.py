@@ -0,0 +1,112 @@
+"""Window planning and the merge of flagged items across overlapping windows."""
+
+import pytest
+
+from chunking import FlaggedMerger, flagged_key, plan_windows, render_window, shared_amounts
+from email_batch import estimate_tokens
+
+ROWS = [f"{i:02d} Mar  Payment to vendor number {i}  {i * 10}.00  {5000 - i}.00" for i in range(40)]
+
+
+@pytest.mark.parametrize("budget,overlap", [(60, 2), (100, 0), (200, 5), (10_000, 3)])
+def test_windows_cover_every_row_within_budget(budget, overlap):
+    windows = plan_windows(ROWS, budget, overlap)
+    assert windows[0][0] == 0 and windows[-1][1] == len(ROWS)
+    for (start, end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start == max(end - overlap, start + 1)
+    for start, end in windows:
+        assert end - start == 1 or sum(estimate_tokens(r) for r in ROWS[start:end]) <= budget
+
+
+def test_a_row_over_budget_gets_its_own_window():
+    rows = ["short", "x" * 1000, "short"]
+    assert plan_windows(rows, token_budget=20, overlap=1) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_overlap_never_stalls():
+    windows = plan_windows(ROWS, token_budget=30, overlap=50)
+    assert [start for start, _ in windows] == sorted({start for start, _ in windows})
+    assert windows[-1][1] == len(ROWS)
+
+
+def test_render_window_labels_parts():
+    text = render_window("HEADER", ROWS, (5, 8), part=2, parts=3)
+    assert text.splitlines()[:2] == [
+        "Part 2 of 3 (rows 6-8 of 40; neighbouring parts share a few rows)",
+        "HEADER",
+    ]
+    assert text.splitlines()[2:] == ROWS[5:8]
+    assert render_window("", ROWS, (0, 2), part=1, parts=1).splitlines() == ROWS[:2]
+
+
+def _item(score, **fields):
+    return {"vendor": "ACME Pty Ltd", "transactionDate": "03 Mar", "amount": "$1,200.00",
+            "riskScore": score, **fields}
+
+
+# _item()'s amount is in the rows every pair of windows shares
+SHARED = [frozenset({1200.0})] * 3
+
+
+def test_overlap_copies_merge_keeping_the_higher_risk():
+    merger = FlaggedMerger(SHARED)
+    assert merger.add(0, _item(40)) == (0, True)
+    assert merger.add(1, _item(30, amount=1200)) == (0, False)
+    assert merger.items() == [_item(40)]
+
+    merger = FlaggedMerger(SHARED)
+    merger.add(0, _item(40))
+    assert merger.add(1, _item(70)) == (0, True)
+    assert merger.get(0)["riskScore"] == 70
+
+
+def test_repeats_within_a_window_or_far_apart_survive():
+    merger = FlaggedMerger(SHARED)
+    merger.add(0, _item(40))
+    assert merger.add(0, _item(40)) == (1, True)
+    assert merger.add(2, _item(40)) == (2, True)
+    # Window 1 neighbours windows 0 and 2, and each earlier copy matches once
+    assert merger.add(1, _item(40))[0] == 0
+    assert merger.add(1, _item(40))[0] == 1
+    assert merger.add(1, _item(40))[0] == 2
+    assert merger.add(1, _item(40)) == (3, True)
+    assert len(merger.items()) == 4
+
+
+def test_shared_amounts_come_from_the_overlap_rows():
+    windows = [(0, 12), (10, 22), (22, 30)]
+    shared = shared_amounts(ROWS, windows)
+    assert len(shared) == 2
+    assert {100.0, 4990.0, 110.0, 4989.0} <= shared[0]
+    assert 90.0 not in shared[0] and 120.0 not in shared[0]
+    assert shared[1] == frozenset()
+
+
+def test_identical_transactions_outside_the_overlap_survive():
+    rows = [f"{i:02d} Mar | Payee {i} | {i}.00 | | {9000 - i}.00" for i in range(1, 21)]
+    # Two same-day payments of the same amount to the same payee
+    rows[2] = rows[17] = "03 Mar | ACME Pty Ltd | 1200.00 | | 7000.00"
+    for overlap in (0, 3):
+        windows = plan_windows(rows, token_budget=150, overlap=overlap)
+        assert len(windows) == 2
+        merger = FlaggedMerger(shared_amounts(rows, windows))
+        merger.add(0, _item(40))
+        assert merger.add(1, _item(40)) == (1, True)
+        assert len(merger.items()) == 2
+
+
+def test_item_without_amount_merges_only_when_windows_share_rows():
+    item = _item(40, amount=None, reason="Unusual payee")
+    merger = FlaggedMerger([frozenset({5.0}), frozenset()])
+    merger.add(0, item)
+    assert merger.add(1, item) == (0, False)
+    merger.add(2, item)
+    assert len(merger.items()) == 2
+    assert FlaggedMerger().add(0, item) == (0, True)
+
+
+def test_flagged_key_normalizes_amount_vendor_and_date():
+    assert flagged_key(_item(1)) == flagged_key(
+        _item(1, vendor="acme pty. ltd", amount=1200.0, transactionDate=" 03  mar ")
+    )
+    assert flagged_key(_item(1)) != flagged_key(_item(1, amount="1,200.01"))
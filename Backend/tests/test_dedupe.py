@@ -0,0 +1,64 @@
+"""Processed email ID index: set and Bloom filter modes, retention, legacy import."""
+
+import functools
+
+import pytest
+
+import dedupe
+from dedupe import BloomFilter, EmailDedupeIndex
+
+
+@pytest.fixture(params=[0, 1000], ids=["set", "bloom"])
+def open_index(request, tmp_path):
+    return functools.partial(
+        EmailDedupeIndex, tmp_path / "processed.db", bloom_capacity=request.param
+    )
+
+
+def test_filter_new_keeps_input_order(open_index):
+    index = open_index()
+    index.add(["m2", "m4"])
+    assert index.filter_new(["m1", "m2", "m3", "m4", "m1"]) == ["m1", "m3", "m1"]
+    assert "m2" in index and "m5" not in index
+    assert len(index) == 2
+
+
+def test_ids_persist_across_reopen(open_index):
+    open_index().add([f"m{i}" for i in range(50)])
+    reopened = open_index()
+    assert len(reopened) == 50
+    assert reopened.filter_new(["m0", "m49", "m50"]) == ["m50"]
+
+
+def test_prune_forgets_ids_past_retention(tmp_path):
+    index = EmailDedupeIndex(tmp_path / "processed.db", retention_days=30, bloom_capacity=100)
+    now = 1_700_000_000
+    index.add(["old"], seen_at=now - 40 * 86400)
+    index.add(["recent"], seen_at=now - 10 * 86400)
+    assert index.prune(now) == 1
+    assert index.filter_new(["old", "recent"]) == ["old"]
+    assert EmailDedupeIndex(tmp_path / "processed.db").prune(now) == 0
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"in-{i}")
+    assert all(f"in-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"out-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.03
+
+
+def test_legacy_ids_are_imported_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedupe, "_index", None)
+    monkeypatch.setattr(
+        dedupe, "EmailDedupeIndex", functools.partial(EmailDedupeIndex, tmp_path / "processed.db")
+    )
+    index = dedupe.get_index(["m1", "m2"])
+    assert dedupe.get_index(["m3"]) is index
+    assert len(index) == 2
+
+    # A later process must not re-import IDs that were pruned since
+    monkeypatch.setattr(dedupe, "_index", None)
+    reopened = dedupe.get_index(["m1", "m2", "m3"])
+    assert reopened.filter_new(["m1", "m2", "m3"]) == ["m3"]
@@ -0,0 +1,88 @@
+"""Conditional GET: ETags move whenever the data behind a route changes."""
+
+from conftest import make_alert
+from synthetic_statements import statement_lines, write_pdf
+
+
+def _get(client, url, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(url, headers=headers)
+
+
+def test_unchanged_statements_answer_304(client, statement_dirs):
+    write_pdf(statement_dirs / "statement_month_1.pdf", statement_lines(5, month=1, seed=1), 60)
+    first = _get(client, "/api/statements")
+    assert first.status_code == 200
+    again = _get(client, "/api/statements", first.headers["ETag"])
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_new_statement_pdf_invalidates_statement_etag(client, statement_dirs):
+    first = _get(client, "/api/statements")
+    assert first.json()["statements"] == []
+
+    write_pdf(statement_dirs / "statement_month_2.pdf", statement_lines(5, month=2, seed=2), 60)
+    second = _get(client, "/api/statements", first.headers["ETag"])
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert [s["label"] for s in second.json()["statements"]] == ["Feb"]
+
+
+def test_replaced_statement_pdf_invalidates_etags(client, statement_dirs):
+    path = statement_dirs / "statement_month_3.pdf"
+    write_pdf(path, statement_lines(5, month=3, seed=3), 60)
+    urls = ["/api/statements", "/api/statements/transactions", "/api/dashboard"]
+    tags = {url: _get(client, url).headers["ETag"] for url in urls}
+
+    write_pdf(path, statement_lines(9, month=3, seed=4), 60)
+    for url in urls:
+        response = _get(client, url, tags[url])
+        assert response.status_code == 200, url
+        assert response.headers["ETag"] != tags[url], url
+
+
+def test_storage_commit_invalidates_alert_etags(client, scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1")])
+    urls = ["/api/alerts", "/api/dashboard/summary", "/api/dashboard?sections=alerts"]
+    tags = {url: _get(client, url).headers["ETag"] for url in urls}
+    for url in urls:
+        assert _get(client, url, tags[url]).status_code == 304, url
+
+    scratch_storage.update_alert_status("a1", "Resolved")
+    for url in urls:
+        response = _get(client, url, tags[url])
+        assert response.status_code == 200, url
+        assert response.headers["ETag"] != tags[url], url
+
+
+def test_query_string_is_part_of_the_tag(client, scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1"), make_alert("a2")])
+    one = _get(client, "/api/alerts?limit=1")
+    two = _get(client, "/api/alerts?limit=2")
+    assert one.headers["ETag"] != two.headers["ETag"]
+    assert _get(client, "/api/alerts?limit=2", one.headers["ETag"]).status_code == 200
+
+
+def test_live_counters_are_not_tagged(client):
+    response = client.get("/api/llm/metrics")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+def test_errors_are_not_tagged(client):
+    response = client.get("/api/report/missing")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+def test_cross_origin_304_carries_cors_headers(client, scratch_storage):
+    scratch_storage.append_alerts([make_alert("a1")])
+    origin = {"Origin": "http://localhost:5173"}
+    first = client.get("/api/alerts", headers=origin)
+    assert first.headers["access-control-allow-origin"] == "*"
+
+    again = client.get("/api/alerts", headers={**origin, "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["access-control-allow-origin"] == "*"
+    assert "ETag" in again.headers["access-control-expose-headers"]
@@ -0,0 +1,80 @@
+"""LLM cache keys and the email analysis prompts rendered from them."""
+
+import asyncio
+
+import pytest
+
+import email_batch
+import server
+from llm_cache import LLMCache, cache_key, normalize_subject
+
+REMINDER = {
+    "subject": "Invoice INV-2041 overdue",
+    "sender": "billing@acme.example",
+    "date": "Mon, 04 Mar 2024 10:00:00 +0000",
+    "body": "Please pay invoice INV-2041 for $4,200.00\nby Friday.",
+}
+VERDICT = {"riskScore": 20, "riskLevel": "LOW", "reason": "ok", "flags": [], "amount": 4200.0}
+
+
+@pytest.fixture
+def prompts(tmp_path, monkeypatch):
+    """Prompts sent to the model, with server.llm_cache on a scratch file."""
+    sent = []
+
+    async def complete_json(prompt, timeout=60.0, **kwargs):
+        sent.append(prompt)
+        return dict(VERDICT)
+
+    monkeypatch.setattr(server, "llm_cache", LLMCache(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(server.llm, "complete_json", complete_json)
+    return sent
+
+
+def test_forwarded_reminder_hits_the_cache(prompts):
+    forwarded = {
+        **REMINDER,
+        "subject": "Fwd: RE: Invoice INV-2041 overdue",
+        "date": "Mon, 11 Mar 2024 09:15:00 +0000",
+        "body": "Please pay invoice INV-2041 for $4,200.00 by   Friday.",
+    }
+    first = asyncio.run(server.analyze_email(**REMINDER))
+    again = asyncio.run(server.analyze_email(**forwarded))
+    assert first == again == VERDICT
+    assert len(prompts) == 1
+    assert server.llm_cache.stats()["hits"] == 1
+
+
+def test_prompt_is_rendered_from_the_cache_inputs(prompts):
+    asyncio.run(server.analyze_email(**REMINDER))
+    inputs = server.email_cache_inputs(REMINDER)
+    assert prompts == [server.ANALYSIS_PROMPT.format(**inputs)]
+    assert REMINDER["date"] not in prompts[0]
+    assert "date" not in inputs
+
+
+def test_a_different_email_misses(prompts):
+    asyncio.run(server.analyze_email(**REMINDER))
+    asyncio.run(server.analyze_email(**{**REMINDER, "sender": "billing@acme-pay.example"}))
+    assert len(prompts) == 2
+
+
+def test_batch_prompt_uses_the_same_inputs():
+    inputs = server.email_cache_inputs(REMINDER)
+    prompt = email_batch.render_prompt([inputs])
+    assert "EMAIL SUBJECT: Invoice INV-2041 overdue" in prompt
+    assert REMINDER["date"] not in prompt
+
+
+def test_cache_key_depends_on_model_name_and_template():
+    inputs = server.email_cache_inputs(REMINDER)
+    key = cache_key("m", "email", "template", inputs)
+    assert key == cache_key("m", "email", "template", dict(reversed(inputs.items())))
+    assert key != cache_key("other", "email", "template", inputs)
+    assert key != cache_key("m", "email-batch", "template", inputs)
+    assert key != cache_key("m", "email", "edited template", inputs)
+
+
+def test_normalize_subject_strips_reply_markers_only():
+    assert normalize_subject("  Re: FWD:fw:  Invoice   due ") == "Invoice due"
+    assert normalize_subject("Refund request") == "Refund request"
@@ -0,0 +1,164 @@
+"""PDF text engines, the fallback between them, and the parse cache."""
+
+import pytest
+
+import pdf_text
+import statements
+from parse_cache import ParseCache
+from synthetic_statements import statement_lines, write_pdf
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ParseCache(tmp_path / "parse_cache.db")
+    monkeypatch.setattr(statements, "parse_cache", cache)
+    monkeypatch.setattr(statements, "stats", statements.Counter())
+    return cache
+
+
+@pytest.fixture
+def statement_pdf(tmp_path):
+    path = tmp_path / "statement.pdf"
+    write_pdf(path, statement_lines(40, month=3, seed=11), 25)
+    return path
+
+
+class ScrambledEngine(pdf_text.PdfplumberEngine):
+    """pdfplumber's text with each page's lines reversed, as a wrong reading order gives."""
+
+    name = "scrambled"
+    version = "scrambled-1"
+
+    def iter_pages(self, pdf_path, first_page=0, last_page=None):
+        for page in super().iter_pages(pdf_path, first_page, last_page):
+            yield "\n".join(reversed(page.split("\n")))
+
+
+@pytest.fixture
+def scrambled(monkeypatch):
+    """A "scrambled" engine whose text never parses plausibly."""
+    monkeypatch.setitem(pdf_text.ENGINES, "scrambled", ScrambledEngine)
+    monkeypatch.setitem(pdf_text._engines, "scrambled", ScrambledEngine())
+    return "scrambled"
+
+
+def _parse_with(path, engine: str) -> dict:
+    return statements.parse_pages(pdf_text.get(engine).iter_pages(str(path)))
+
+
+def test_engines_agree_on_a_simple_layout(statement_pdf):
+    pdfium = _parse_with(statement_pdf, "pdfium")
+    assert statements.plausible(pdfium)
+    assert pdfium == _parse_with(statement_pdf, "pdfplumber")
+    assert len(pdfium["transactions"]) == 40
+
+
+def test_page_ranges_concatenate_to_the_whole_document(statement_pdf):
+    for name in pdf_text.ENGINES:
+        engine = pdf_text.get(name)
+        whole = list(engine.iter_pages(str(statement_pdf)))
+        assert engine.page_count(str(statement_pdf)) == len(whole) > 1
+        assert list(engine.iter_pages(str(statement_pdf), 0, 1)) + list(
+            engine.iter_pages(str(statement_pdf), 1)
+        ) == whole
+
+
+class CountingDocument:
+    """A pypdfium2 PdfDocument that counts the pages taken from it."""
+
+    def __init__(self, document):
+        self.document = document
+        self.pages_taken = 0
+        self.closed = False
+
+    def __len__(self):
+        return len(self.document)
+
+    def __getitem__(self, number):
+        self.pages_taken += 1
+        return self.document[number]
+
+    def close(self):
+        self.closed = True
+        self.document.close()
+
+
+def test_pdfium_yields_each_page_as_it_is_extracted(statement_pdf, monkeypatch):
+    engine = pdf_text.get("pdfium")
+    documents = []
+
+    class Pdfium:
+        def PdfDocument(self, path):
+            documents.append(CountingDocument(engine_module.PdfDocument(path)))
+            return documents[-1]
+
+    engine_module = engine._pdfium
+    monkeypatch.setattr(engine, "_pdfium", Pdfium())
+
+    pages = engine.iter_pages(str(statement_pdf))
+    first = next(pages)
+    assert documents[0].pages_taken == 1
+    # Not held between pages, so other documents can be read meanwhile
+    assert not engine._lock.locked()
+    assert first.startswith("Statement Period")
+    pages.close()
+    assert documents[0].closed
+
+
+def test_first_plausible_engine_is_used(statement_pdf):
+    _, parsed, engine = statements._extract_and_parse(str(statement_pdf), ["pdfium", "pdfplumber"])
+    assert engine == "pdfium"
+    assert statements.plausible(parsed)
+
+
+def test_implausible_text_falls_back(statement_pdf, scrambled):
+    assert not statements.plausible(_parse_with(statement_pdf, scrambled))
+    _, parsed, engine = statements._extract_and_parse(str(statement_pdf), [scrambled, "pdfplumber"])
+    assert engine == "pdfplumber"
+    assert parsed == _parse_with(statement_pdf, "pdfplumber")
+
+
+def test_last_engine_is_used_regardless(statement_pdf, scrambled):
+    _, parsed, engine = statements._extract_and_parse(str(statement_pdf), [scrambled])
+    assert engine == scrambled
+    assert not statements.plausible(parsed)
+
+
+def test_unknown_engine_is_an_error():
+    with pytest.raises(ValueError):
+        pdf_text.chain(["pdfminer"])
+
+
+def test_load_caches_by_content_hash(cache, statement_pdf):
+    text, parsed = statements.load(str(statement_pdf), "digest-1")
+    assert statements.stats["pdfium"] == 1
+    assert statements.load(str(statement_pdf), "digest-1") == (text, parsed)
+    assert statements.parse_many({"m": statement_pdf}, {"m": "digest-1"}) == {"m": parsed}
+    assert statements.stats["pdfium"] == 1
+
+
+def test_cached_parse_follows_the_configured_engines(cache, statement_pdf, monkeypatch):
+    statements.load(str(statement_pdf), "digest-1")
+    # A cached pdfium parse that would be wrong if served to pdfplumber
+    pdfium = pdf_text.get("pdfium")
+    poisoned = {**_parse_with(statement_pdf, "pdfium"), "period": "poisoned"}
+    cache.put("parsed", "digest-1", statements._parsed_version(pdfium), poisoned)
+    assert statements.parse_many({"m": statement_pdf}, {"m": "digest-1"})["m"] == poisoned
+
+    monkeypatch.setattr(pdf_text, "ENGINE_NAMES", ["pdfplumber"])
+    parsed = statements.parse_many({"m": statement_pdf}, {"m": "digest-1"})["m"]
+    assert parsed == _parse_with(statement_pdf, "pdfplumber")
+    assert statements.stats["pdfplumber"] == 1
+
+
+def test_cached_implausible_parse_is_not_served_before_a_fallback(
+    cache, statement_pdf, scrambled, monkeypatch
+):
+    monkeypatch.setattr(pdf_text, "ENGINE_NAMES", [scrambled])
+    scrambled_only = statements.parse_many({"m": statement_pdf}, {"m": "digest-2"})["m"]
+    assert not statements.plausible(scrambled_only)
+
+    monkeypatch.setattr(pdf_text, "ENGINE_NAMES", [scrambled, "pdfplumber"])
+    parsed = statements.parse_many({"m": statement_pdf}, {"m": "digest-2"})["m"]
+    assert parsed == _parse_with(statement_pdf, "pdfplumber")
+    assert statements.stats["fallbacks"] == 1
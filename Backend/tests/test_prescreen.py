@@ -0,0 +1,108 @@
+"""Local pre-screening rules and the thresholds that settle an email without the LLM."""
+
+from collections import Counter
+
+import pytest
+
+import prescreen
+from conftest import make_alert
+from prescreen import VendorHistory, extract_amount, screen, sender_parts, signals
+
+HISTORY = VendorHistory([
+    make_alert(f"h{i}", type="Invoice", riskLevel="LOW", vendor="Acme Supplies",
+               amount=amount, senderDomain="acme.com")
+    for i, amount in enumerate([980.0, 1000.0, 1020.0, 1005.0])
+])
+
+
+def _email(sender: str, body: str, subject: str = "Invoice") -> dict:
+    return {"subject": subject, "sender": sender, "date": "", "body": body}
+
+
+ROUTINE = _email("Acme Supplies <billing@acme.com>", "Invoice total: $1,010.00")
+UNKNOWN = _email("Globex <ap@globex.io>", "Invoice total: $500.00")
+FRAUD = _email(
+    "Acme Supplies <billing@acrne.com>",
+    "URGENT: our bank details have changed. Amount due $9,800.00 within 24 hours.",
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(prescreen, "stats", Counter())
+    monkeypatch.setattr(prescreen, "ENABLED", True)
+
+
+def test_routine_invoice_from_a_known_vendor_is_settled_low():
+    assert set(signals(ROUTINE, HISTORY)) == {"known_vendor", "usual_amount"}
+    result = screen(ROUTINE, HISTORY)
+    assert result["riskLevel"] == "LOW"
+    assert result["riskScore"] == prescreen.BASE_SCORE - 25
+    assert result["flags"] == ["prescreened_routine"]
+    assert result["amount"] == 1010.0
+
+
+def test_clear_fraud_is_settled_high():
+    assert set(signals(FRAUD, HISTORY)) >= {
+        "lookalike_domain", "domain_mismatch", "bank_detail_change", "urgency_language",
+    }
+    result = screen(FRAUD, HISTORY)
+    assert result["riskLevel"] == "HIGH"
+    assert result["riskScore"] == 100
+    assert "lookalike_domain" in result["flags"]
+    assert {f["title"] for f in result["factors"]} >= {"Lookalike domain", "Bank detail change"}
+
+
+def test_uncertain_email_goes_to_the_llm():
+    assert signals(UNKNOWN, HISTORY) == {}
+    assert screen(UNKNOWN, HISTORY) is None
+    assert prescreen.summary()["sentToLLM"] == 1
+
+
+@pytest.mark.parametrize("low,high,expected", [
+    (10, 85, None),
+    (30, 85, "LOW"),
+    (29, 85, None),
+    (10, 30, "HIGH"),
+    (10, 31, None),
+])
+def test_thresholds_are_inclusive(monkeypatch, low, high, expected):
+    monkeypatch.setattr(prescreen, "LOW_THRESHOLD", low)
+    monkeypatch.setattr(prescreen, "HIGH_THRESHOLD", high)
+    result = screen(UNKNOWN, HISTORY)  # scores exactly BASE_SCORE
+    assert (result and result["riskLevel"]) == expected
+
+
+def test_a_risk_signal_is_never_settled_low(monkeypatch):
+    monkeypatch.setattr(prescreen, "LOW_THRESHOLD", 50)
+    urgent = _email("Acme Supplies <billing@acme.com>", "Overdue: invoice total $1,000.00")
+    assert "urgency_language" in signals(urgent, HISTORY)
+    assert screen(urgent, HISTORY) is None
+
+
+def test_amount_far_above_history_is_an_anomaly():
+    found = signals(_email("Acme Supplies <billing@acme.com>", "Total $9,000.00"), HISTORY)
+    assert "amount_anomaly" in found and "usual_amount" not in found
+
+
+def test_disabled_prescreen_sends_everything_to_the_llm(monkeypatch):
+    monkeypatch.setattr(prescreen, "ENABLED", False)
+    assert screen(FRAUD, HISTORY) is None
+    assert prescreen.stats["screened"] == 0
+
+
+def test_summary_counts():
+    for fields in (ROUTINE, FRAUD, UNKNOWN, ROUTINE):
+        screen(fields, HISTORY)
+    assert prescreen.summary() | {"lowThreshold": 0, "highThreshold": 0} == {
+        "enabled": True, "lowThreshold": 0, "highThreshold": 0, "screened": 4,
+        "localLow": 2, "localHigh": 1, "sentToLLM": 1, "localFraction": 0.75,
+    }
+
+
+def test_helpers():
+    assert sender_parts('"Acme" <ap@billing.acme.co.uk>') == ("Acme", "acme.co.uk")
+    assert sender_parts("ap@mail.globex.io") == ("", "globex.io")
+    assert extract_amount("Item $12.00\nTotal due: $1,234.50\nTip $2,000") == 1234.5
+    assert extract_amount("Items USD 12.00 and EUR 40") == 40.0
+    assert extract_amount("no amounts") is None
@@ -0,0 +1,285 @@
+"""Rate limiting, backoff, circuit breaking and the retry queue."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import resilience
+import server
+from resilience import CircuitOpenError, Resilience, RetryQueue
+
+URL = "https://openrouter.test/api/v1/chat/completions"
+
+
+def status_error(status: int, headers: dict | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", URL)
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def policy(**overrides) -> Resilience:
+    options = dict(
+        rate=0, burst=1, initial_concurrency=8, min_concurrency=1, max_concurrency=16,
+        max_retries=3, breaker_threshold=3, breaker_reset=0.05,
+    )
+    return Resilience("Test", **{**options, **overrides})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps of Resilience.call(), recorded and skipped."""
+    recorded = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        recorded.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", sleep)
+    return recorded
+
+
+def failing(*errors, result="ok"):
+    """An async callable raising errors in turn, then returning result."""
+    remaining = list(errors)
+    calls = []
+
+    async def fn():
+        calls.append(len(calls))
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_parse_retry_after():
+    assert resilience.parse_retry_after("3") == 3.0
+    assert resilience.parse_retry_after("-1") == 0.0
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < resilience.parse_retry_after(format_datetime(when, usegmt=True)) <= 30
+    assert resilience.parse_retry_after("soon") is None
+    assert resilience.parse_retry_after(None) is None
+
+
+def test_backoff_honors_retry_after(sleeps):
+    p = policy()
+    fn = failing(status_error(429, {"Retry-After": "7"}), status_error(503))
+
+    assert asyncio.run(p.call(fn)) == "ok"
+    assert len(fn.calls) == 3
+    assert sleeps[0] == 7.0
+    # Without a Retry-After, exponential backoff with full jitter
+    assert 0 <= sleeps[1] <= resilience.BACKOFF_BASE * 2
+    # The 429 also paused the token bucket for every caller
+    assert p.bucket._paused_until > time.monotonic() + 5
+
+
+def test_long_retry_after_is_not_waited_out(sleeps):
+    p = policy()
+    too_long = str(resilience.RETRY_AFTER_MAX + 1)
+    fn = failing(status_error(429, {"Retry-After": too_long}))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(p.call(fn))
+    assert sleeps == []
+
+
+def test_non_transient_errors_are_not_retried(sleeps):
+    p = policy()
+    for error in (status_error(400), status_error(401), ValueError("bad reply")):
+        fn = failing(error)
+        with pytest.raises(type(error)):
+            asyncio.run(p.call(fn))
+        assert len(fn.calls) == 1
+    assert sleeps == []
+    assert p.breaker.state == "closed"
+
+
+def test_retries_give_up_after_max_retries(sleeps):
+    p = policy(max_retries=2, breaker_threshold=10)
+    fn = failing(*[status_error(502)] * 5)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(p.call(fn))
+    assert len(fn.calls) == 3
+    assert p.stats()["retries"] == 2
+
+
+def test_limit_halves_once_per_burst_of_429s():
+    p = policy(max_retries=0)
+
+    async def burst(size: int):
+        started = asyncio.Event()
+        waiting = 0
+
+        async def throttled():
+            nonlocal waiting
+            waiting += 1
+            if waiting == size:
+                started.set()
+            # Every call is in flight before the first 429 comes back
+            await started.wait()
+            raise status_error(429)
+
+        results = await asyncio.gather(
+            *(p.call(throttled) for _ in range(size)), return_exceptions=True
+        )
+        assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+
+    asyncio.run(burst(8))
+    assert p.limiter.limit == 4
+    # Calls sent under the new limit halve it again
+    asyncio.run(burst(4))
+    assert p.limiter.limit == 2
+    assert p.stats()["throttled"] == 12
+
+
+def test_limit_grows_back_while_calls_succeed():
+    p = policy(initial_concurrency=2, max_concurrency=4)
+
+    async def run():
+        for _ in range(40):
+            await p.call(failing())
+
+    asyncio.run(run())
+    assert p.limiter.limit == 4
+
+
+def test_breaker_opens_goes_half_open_and_closes(sleeps):
+    p = policy(max_retries=0)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await p.call(failing(status_error(503)))
+        assert p.breaker.state == "open"
+
+        fn = failing()
+        with pytest.raises(CircuitOpenError):
+            await p.call(fn)
+        assert fn.calls == []
+
+        time.sleep(p.breaker.reset_seconds)
+        probe_started, release = asyncio.Event(), asyncio.Event()
+
+        async def probe():
+            probe_started.set()
+            await release.wait()
+            return "ok"
+
+        probing = asyncio.create_task(p.call(probe))
+        await probe_started.wait()
+        assert p.breaker.state == "half_open"
+        # Only the probe goes through while the breaker is half-open
+        with pytest.raises(CircuitOpenError):
+            await p.call(failing())
+        release.set()
+        assert await probing == "ok"
+        assert p.breaker.state == "closed"
+
+    asyncio.run(run())
+    assert p.stats()["rejected"] == 2
+
+
+def test_failed_probe_reopens_the_breaker(sleeps):
+    p = policy(max_retries=0)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await p.call(failing(status_error(503)))
+        time.sleep(p.breaker.reset_seconds)
+        with pytest.raises(httpx.HTTPStatusError):
+            await p.call(failing(status_error(503)))
+        assert p.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await p.call(failing())
+
+    asyncio.run(run())
+
+
+def test_sdk_policy_retries_only_transient_errors():
+    class SdkStatusError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"status {status_code}")
+            self.status_code = status_code
+
+    assert resilience.sdk_retryable(SdkStatusError(429))
+    assert resilience.sdk_retryable(SdkStatusError(503))
+    assert resilience.sdk_retryable(TimeoutError())
+    assert resilience.sdk_retryable(ConnectionResetError())
+    assert resilience.sdk_retryable(httpx.ConnectError("refused"))
+    assert not resilience.sdk_retryable(SdkStatusError(401))
+    assert not resilience.sdk_retryable(SdkStatusError(404))
+    assert not resilience.sdk_retryable(Exception("Gmail tool failed"))
+    assert resilience.composio_policy.retryable is resilience.sdk_retryable
+
+
+def test_retry_queue_backs_off_and_gives_up():
+    queue = RetryQueue(max_attempts=3, backoff=0)
+    assert queue.park("m1", {"id": "m1"}, "openrouter_unavailable")
+    assert queue.due() == [("m1", {"id": "m1"})]
+    assert queue.park("m1", {"id": "m1"}, "openrouter_unavailable")
+    assert queue.park("m1", {"id": "m1"}, "openrouter_unavailable")
+    assert not queue.park("m1", {"id": "m1"}, "openrouter_unavailable")
+    assert "m1" not in queue
+
+    later = RetryQueue(max_attempts=3, backoff=60)
+    later.park("m2", {"id": "m2"}, "openrouter_unavailable")
+    assert later.due() == []
+    assert later.stats() == {"parked": 1, "due": 0, "reasons": {"openrouter_unavailable": 1}}
+    later.done("m2")
+    assert len(later) == 0
+
+
+@pytest.fixture
+def retry_queue(monkeypatch):
+    queue = RetryQueue(max_attempts=2, backoff=0)
+    monkeypatch.setattr(server, "email_retry_queue", queue)
+    return queue
+
+
+EMAIL = {"_eid": "m1", "id": "m1", "subject": "Invoice 42", "from": "billing@acme.test",
+         "body": "Please pay 100.00 by Friday."}
+
+
+def test_parked_email_becomes_analysis_error_after_its_attempts(retry_queue, monkeypatch):
+    async def unavailable(**fields):
+        raise status_error(503)
+
+    monkeypatch.setattr(server, "analyze_email", unavailable)
+    for _ in range(retry_queue.max_attempts):
+        assert asyncio.run(server.build_email_alerts([dict(EMAIL)])) == []
+        assert "m1" in retry_queue
+
+    [alert] = asyncio.run(server.build_email_alerts([dict(EMAIL)]))
+    assert alert["flags"] == ["analysis_error"]
+    assert alert["emailId"] == "m1"
+    assert "m1" not in retry_queue
+
+
+def test_parked_email_is_analyzed_when_the_upstream_recovers(retry_queue, monkeypatch):
+    replies = [status_error(503), {
+        "riskScore": 12, "riskLevel": "LOW", "reason": "Known vendor", "flags": [],
+        "summary": "Routine invoice", "amount": 100.0, "factors": [],
+    }]
+
+    async def analyze(**fields):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(server, "analyze_email", analyze)
+    assert asyncio.run(server.build_email_alerts([dict(EMAIL)])) == []
+    assert [key for key, _ in retry_queue.due()] == ["m1"]
+
+    [alert] = asyncio.run(server.build_email_alerts([dict(EMAIL)]))
+    assert alert["riskLevel"] == "LOW"
+    assert alert["flags"] == []
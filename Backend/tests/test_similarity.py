@@ -0,0 +1,84 @@
+"""Similar-case search, and deltas applied to its indexes by storage.commit."""
+
+import copy
+import random
+
+import pytest
+
+import similarity
+from conftest import make_alert, random_ops
+from similarity import SimilarityIndex
+from storage import apply_ops, default_data
+
+
+def _state(index: SimilarityIndex) -> tuple:
+    return (
+        index._alerts, index._features, index._postings, index._by_source,
+        index._signatures, index._buckets, index._lsh,
+    )
+
+
+def _results(index: SimilarityIndex, ids: list[str]) -> dict:
+    return {
+        alert_id: [(a["id"], round(score, 9)) for a, score in index.similar(alert_id, k=5)]
+        for alert_id in ids
+    }
+
+
+@pytest.mark.parametrize("lsh_min_alerts", [10 ** 9, 12])
+def test_deltas_match_a_rebuild(lsh_min_alerts, monkeypatch):
+    # Small enough that the common postings are skipped once LSH is on
+    monkeypatch.setattr(similarity, "COMMON_FEATURE_MIN", 4)
+    rng = random.Random(10)
+    ids = [f"a{i}" for i in range(30)]
+    data = default_data()
+    index = SimilarityIndex(lsh_min_alerts=lsh_min_alerts)
+    for _ in range(300):
+        ops = random_ops(rng, ids)
+        published = index
+        frozen = copy.deepcopy(_state(published))
+        published_results = _results(published, ids)
+
+        apply_ops(data, ops)
+        index = index.copy()
+        index.apply(ops)
+
+        # LSH stays on once the history was big enough, as in a long-running process
+        rebuilt = SimilarityIndex(data["alerts"], lsh_min_alerts=0 if index._lsh else 10 ** 9)
+        assert _state(index)[:-1] == _state(rebuilt)[:-1]
+        assert _results(index, ids) == _results(rebuilt, ids)
+        # The previous generation's index is left exactly as it was
+        assert _state(published) == frozen
+        assert _results(published, ids) == published_results
+    assert index._lsh == (lsh_min_alerts == 12)
+
+
+def test_similar_ranks_by_shared_rare_features():
+    index = SimilarityIndex([
+        make_alert("case", vendor="Acme", flags=["Round amount", "New vendor"]),
+        make_alert("same-vendor", vendor="Acme", flags=["Round amount"]),
+        make_alert("common-flag", vendor="Globex", flags=["Round amount"]),
+        make_alert("unrelated", vendor="Initech", flags=["Duplicate invoice"]),
+        *(make_alert(f"noise{i}", vendor="Initech", flags=["round_amount"]) for i in range(5)),
+    ])
+
+    ranked = [a["id"] for a, _ in index.similar("case", k=3)]
+    assert ranked[0] == "same-vendor"
+    assert "unrelated" not in ranked
+    assert index.similar("missing") == []
+
+
+def test_lsh_skips_common_postings_but_finds_similar_flag_sets(monkeypatch):
+    monkeypatch.setattr(similarity, "COMMON_FEATURE_MIN", 5)
+    flags = ["Round amount", "New vendor", "Weekend invoice", "Future date"]
+    alerts = [make_alert(f"n{i}", vendor="Acme", flags=["Round amount"]) for i in range(20)]
+    alerts += [
+        make_alert("case", vendor="Globex", flags=flags),
+        make_alert("twin", vendor="Initech", flags=flags),
+    ]
+    index = SimilarityIndex(alerts, lsh_min_alerts=10)
+
+    candidates = index._candidates("case", index._features["case"])
+    # "flag:round_amount" is on 22 alerts, over the cap, so it does not add them
+    assert candidates == {"twin"}
+    assert index.similar("case", k=1)[0][0]["id"] == "twin"
@@ -0,0 +1,127 @@
+"""Generation-stamped snapshots shared between storage readers."""
+
+import json
+
+import pytest
+
+import storage
+from conftest import make_alert
+from storage import JsonBackend
+from storage_journal import JournalBackend
+
+
+@pytest.fixture
+def json_storage(tmp_path):
+    previous = storage._backend
+    storage.use_backend(JsonBackend(tmp_path / "data.json"))
+    yield tmp_path / "data.json"
+    storage.use_backend(previous)
+
+
+@pytest.fixture
+def journal_storage(tmp_path):
+    previous = storage._backend
+    backend = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    storage.use_backend(backend)
+    yield backend
+    storage.use_backend(previous)
+    backend.close()
+
+
+def test_readers_share_one_snapshot_until_a_commit(json_storage):
+    first = storage.get_snapshot()
+    assert storage.get_snapshot() is first
+    assert storage.peek_snapshot() is first
+
+    storage.append_alerts([make_alert("a1")], ["m1"])
+    second = storage.get_snapshot()
+    assert second.generation == first.generation + 1
+    assert first.data["alerts"] == []
+    assert [a["id"] for a in second.data["alerts"]] == ["a1"]
+    assert storage.generation() == second.generation
+
+
+def test_a_commit_leaves_the_published_snapshot_alone(json_storage):
+    storage.append_alerts([make_alert("a1")], ["m1"])
+    before = storage.get_snapshot()
+    frozen = json.loads(json.dumps(before.data))
+    storage.update_alert_status("a1", "Resolved")
+    storage.append_alerts([make_alert("a2")], ["m2"])
+    assert before.data == frozen
+    assert before.aggregates.summary() == frozen["summary"]
+
+
+def test_external_edits_are_picked_up(json_storage):
+    storage.append_alerts([make_alert("a1")])
+    snapshot = storage.get_snapshot()
+
+    data = json.loads(json_storage.read_text())
+    data["alerts"].append(make_alert("edited-by-hand"))
+    json_storage.write_text(json.dumps(data))
+
+    assert storage.peek_snapshot() is None
+    reloaded = storage.get_snapshot()
+    assert reloaded.generation > snapshot.generation
+    assert [a["id"] for a in reloaded.data["alerts"]] == ["a1", "edited-by-hand"]
+    assert reloaded.similarity.get("edited-by-hand") is not None
+
+
+def test_load_data_returns_a_private_copy(json_storage):
+    storage.append_alerts([make_alert("a1")])
+    data = storage.load_data()
+    data["alerts"][0]["status"] = "Resolved"
+    assert storage.get_snapshot().data["alerts"][0]["status"] == "New Alert"
+
+    storage.save_data(data)
+    assert storage.get_snapshot().data["summary"]["casesResolved"] == 1
+
+
+def test_journal_compaction_keeps_the_snapshot(journal_storage):
+    storage.append_alerts([make_alert(f"a{i}") for i in range(5)])
+    storage.update_alert_status("a1", "Resolved")
+    snapshot = storage.get_snapshot()
+    index = snapshot.alert_index()
+
+    journal_storage.compact()
+    assert storage.peek_snapshot() is snapshot
+    journal_storage.compact()
+    assert storage.get_snapshot() is snapshot
+
+    storage.update_alert_status("a2", "Resolved")
+    after = storage.get_snapshot()
+    assert after.generation == snapshot.generation + 1
+    assert after._alert_index is not None and after._alert_index is not index
+    journal_storage.compact()
+    assert storage.get_snapshot() is after
+
+
+def test_background_compaction_keeps_the_generation(tmp_path):
+    previous = storage._backend
+    backend = JournalBackend(tmp_path / "data.json", compact_records=5)
+    storage.use_backend(backend)
+    try:
+        for i in range(12):
+            storage.append_alerts([make_alert(f"a{i}")])
+        generation = storage.generation()
+        # Waits out a background compaction in progress, then folds in the rest
+        backend.compact()
+        assert storage.generation() == generation
+        assert len(storage.get_snapshot().data["alerts"]) == 12
+    finally:
+        storage.use_backend(previous)
+        backend.close()
+
+
+def test_external_edits_after_a_compaction_are_picked_up(journal_storage):
+    storage.append_alerts([make_alert("a1")])
+    journal_storage.compact()
+    snapshot = storage.get_snapshot()
+
+    data = json.loads(journal_storage.snapshot_path.read_text())
+    data["alerts"].append(make_alert("edited-by-hand"))
+    journal_storage.snapshot_path.write_text(json.dumps(data))
+
+    assert storage.peek_snapshot() is None
+    reloaded = storage.get_snapshot()
+    assert reloaded.generation > snapshot.generation
+    assert [a["id"] for a in reloaded.data["alerts"]] == ["a1", "edited-by-hand"]
@@ -0,0 +1,186 @@
+"""The streaming statement parser against the whole-text parse it replaced."""
+
+import random
+import re
+
+import pytest
+
+import statements
+from synthetic_statements import iter_pages, statement_lines
+
+_DATE = re.compile(
+    r"^(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)(?:\s+\d{4})?)\s+"
+)
+_AMOUNTS = re.compile(r"([\-]?\d+\.\d{2})\s+([\-]?\d+\.\d{2})\s*$")
+
+
+def _number(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+def reference_parse(text: str) -> dict:
+    """parse_text() as it was before the streaming parser: separate passes over all lines."""
+    lines = text.split("\n")
+    period, closing, opening = "", "0", "0"
+    for idx, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped == "Statement Period" and idx + 1 < len(lines):
+            period = lines[idx + 1].strip()
+        elif stripped == "Closing Balance" and idx + 1 < len(lines):
+            found = re.search(r"\$?([\-]?[\d,]+\.\d{2})", lines[idx + 1].strip())
+            if found:
+                closing = found.group(1).replace(",", "")
+    for line in lines:
+        stripped = line.strip()
+        m = _DATE.match(stripped)
+        if m and "OPENING BALANCE" in stripped.upper():
+            found = re.search(r"([\-]?\d+[\d,]*\.\d{2})", stripped[m.end():])
+            if found:
+                opening = found.group(1).replace(",", "")
+            break
+
+    transactions = []
+    i = 0
+    while i < len(lines):
+        stripped = lines[i].strip()
+        m = _DATE.match(stripped)
+        rest = stripped[m.end():].strip() if m else ""
+        amounts = _AMOUNTS.search(rest) if m and "OPENING BALANCE" not in rest.upper() else None
+        if amounts is None:
+            i += 1
+            continue
+        parts = [rest[:amounts.start()].strip()] if rest[:amounts.start()].strip() else []
+        j = i + 1
+        while j < len(lines):
+            following = lines[j].strip()
+            if not following or _DATE.match(following):
+                break
+            cleaned = following.replace(" CR", "").replace("CR", "").strip()
+            if cleaned:
+                parts.append(cleaned)
+            j += 1
+        amount, balance = float(amounts.group(1)), float(amounts.group(2))
+        previous = transactions[-1]["balance"] if transactions else _number(opening)
+        transactions.append({
+            "date": m.group(1).strip(),
+            "description": " ".join(parts),
+            "debit": amount if balance < previous else None,
+            "credit": None if balance < previous else amount,
+            "balance": balance,
+        })
+        i = j
+    return {
+        "period": period,
+        "openingBalance": _number(opening),
+        "closingBalance": _number(closing),
+        "transactions": transactions,
+    }
+
+
+LETTER = ["Dear customer", "Your invoice 123 is attached.", "Total due 100.00"]
+
+CASES = {
+    "small": (statement_lines(12, month=2, seed=1), 60),
+    "large": (statement_lines(1500, month=7, seed=2), 60),
+    "rows_across_pages": (statement_lines(200, month=11, seed=3), 7),
+    "one_line_pages": (statement_lines(30, month=9, seed=6), 1),
+    "empty": (statement_lines(0, month=4, seed=4), 60),
+    "letter": (LETTER, 60),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_pages_parse_like_the_joined_text(name):
+    lines, per_page = CASES[name]
+    pages = list(iter_pages(lines, per_page))
+    text = statements.join_pages(pages)
+
+    streamed = statements.parse_pages(pages)
+
+    assert streamed == statements.parse_text(text)
+    assert streamed == reference_parse(text)
+
+
+def test_synthetic_statement_is_read_in_full():
+    lines = statement_lines(50, month=3, seed=8)
+
+    result = statements.parse_pages(iter_pages(lines, 9))
+
+    assert result["period"] == "1 March 2018 - 28 March 2018"
+    assert len(result["transactions"]) == 50
+    assert result["closingBalance"] == result["transactions"][-1]["balance"]
+    for transaction in result["transactions"]:
+        assert (transaction["debit"] is None) != (transaction["credit"] is None)
+        assert "CR" not in transaction["description"].split()
+
+
+def test_blank_pages_are_skipped():
+    pages = list(iter_pages(statement_lines(20, month=5, seed=9), 6))
+    with_blanks = [""] + [p for page in pages for p in (page, "")]
+
+    assert statements.parse_pages(with_blanks) == statements.parse_pages(pages)
+
+
+def test_feed_lines_in_any_chunks():
+    text = statements.join_pages(iter_pages(statement_lines(120, month=6, seed=10), 13))
+    lines = text.split("\n")
+    expected = statements.parse_text(text)
+    rng = random.Random(24)
+
+    for _ in range(20):
+        parser = statements.StatementParser()
+        start = 0
+        while start < len(lines):
+            end = start + rng.randint(0, 9)
+            parser.feed_lines(lines[start:end])
+            start = end
+        parser.close()
+        assert parser.result() == expected
+
+
+def test_released_transactions_cover_the_statement_once():
+    parser = statements.StatementParser()
+    released = []
+    for page in iter_pages(statement_lines(80, month=8, seed=12), 11):
+        released += parser.feed_page(page)
+    before_close = len(released)
+    released += parser.close()
+
+    result = parser.result()
+    assert 0 < before_close < len(result["transactions"])
+    assert [id(t) for t in released] == [id(t) for t in result["transactions"]]
+    assert all("_amount" not in t for t in released)
+
+
+def test_transactions_before_the_opening_balance_wait_for_it():
+    lines = [
+        "05 Jan PAYMENT RECEIVED 100.00 1100.00",
+        "01 Jan 2018 OPENING BALANCE 1000.00",
+        "06 Jan BANK FEE 5.00 1095.00",
+    ]
+    parser = statements.StatementParser()
+
+    assert parser.feed_page(lines[0]) == []
+    released = parser.feed_page("\n".join(lines[1:])) + parser.close()
+
+    assert [t["date"] for t in released] == ["05 Jan", "06 Jan"]
+    assert released[0]["credit"] == 100.0
+    assert released[1]["debit"] == 5.0
+    assert parser.result() == reference_parse(statements.join_pages([lines[0], *lines[1:]]))
+
+
+def test_random_statements_match_the_reference():
+    rng = random.Random(2024)
+    for _ in range(40):
+        lines = statement_lines(rng.randint(0, 60), month=rng.randint(1, 12), seed=rng.random())
+        # Noise a real statement has: headers, blank lines, stray dated lines
+        for _ in range(rng.randint(0, 6)):
+            noise = rng.choice(["", "Page 2 of 3", "Date Description Debit Credit", "12 Feb"])
+            lines.insert(rng.randint(0, len(lines)), noise)
+        pages = list(iter_pages(lines, rng.randint(1, 30)))
+        text = statements.join_pages(pages)
+
+        assert statements.parse_pages(pages) == reference_parse(text)
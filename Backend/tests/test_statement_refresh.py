@@ -0,0 +1,137 @@
+"""Change-aware statement analysis: skips, stable alert IDs and carried-over triage."""
+
+import asyncio
+
+import pytest
+
+import server
+from synthetic_statements import statement_lines, write_pdf
+
+# What the stubbed model flags in every analysis; the last two share a key
+FLAGGED = [
+    {"transactionDate": "2018-02-03", "vendor": "OFFICEWORKS", "amount": 120.0,
+     "riskLevel": "HIGH", "riskScore": 90},
+    {"transactionDate": "2018-02-09", "vendor": "ENERGY AUSTRALIA", "amount": 75.5,
+     "riskLevel": "MEDIUM", "riskScore": 55},
+    {"transactionDate": "2018-02-09", "vendor": "ENERGY AUSTRALIA", "amount": 75.5,
+     "riskLevel": "MEDIUM", "riskScore": 55},
+]
+
+
+class FakeModel:
+    """analyze_statements_with_ai() without the LLM: flags FLAGGED, counting calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.most_running = 0
+
+    async def __call__(self, prompts, on_item=None, shared=()):
+        self.calls += 1
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        try:
+            # Give a concurrent caller the chance to start
+            await asyncio.sleep(0.01)
+            for position, txn in enumerate(FLAGGED):
+                if on_item is not None:
+                    on_item(position, dict(txn))
+            return [dict(txn) for txn in FLAGGED]
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def model(scratch_storage, statement_dirs, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "STATEMENT_STATE_FILE", tmp_path / "statement_state.json")
+    monkeypatch.setattr(server, "_statement_lock", asyncio.Lock())
+    fake = FakeModel()
+    monkeypatch.setattr(server, "analyze_statements_with_ai", fake)
+    write_pdf(statement_dirs / "statement_month_1.pdf", statement_lines(20, month=1, seed=1), 30)
+    write_pdf(statement_dirs / "statement_month_2.pdf", statement_lines(20, month=2, seed=2), 30)
+    return fake
+
+
+def refresh(*calls) -> list[dict]:
+    """Run refresh_statement_alerts() once per kwargs dict, concurrently, on the store."""
+    async def run():
+        server.store.start()
+        try:
+            return await asyncio.gather(*(server.refresh_statement_alerts(**c) for c in calls))
+        finally:
+            await server.store.stop()
+
+    return asyncio.run(run())
+
+
+def statement_alerts(storage) -> list[dict]:
+    return [
+        a for a in storage.get_snapshot().data["alerts"]
+        if a["source"] == "statement_analysis"
+    ]
+
+
+def test_unchanged_statements_skip_the_model(model, scratch_storage):
+    assert refresh({}) == [{"skipped": False, "processed": 3}]
+    assert refresh({}) == [{"skipped": True, "processed": 3}]
+    assert model.calls == 1
+
+    assert refresh({"force": True}) == [{"skipped": False, "processed": 3}]
+    assert model.calls == 2
+    assert len(statement_alerts(scratch_storage)) == 3
+
+
+def test_rewritten_pdf_with_the_same_transactions_skips_the_model(model, statement_dirs):
+    refresh({})
+    state = server._load_statement_state()
+
+    # Other page breaks: new file bytes, same parsed transactions
+    write_pdf(statement_dirs / "statement_month_2.pdf", statement_lines(20, month=2, seed=2), 7)
+    assert refresh({}) == [{"skipped": True, "processed": 3}]
+    assert model.calls == 1
+    after = server._load_statement_state()
+    assert after["fingerprint"] != state["fingerprint"]
+    assert after["content"] == state["content"]
+
+    # The new fingerprint was saved, so the next run skips before parsing
+    assert refresh({}) == [{"skipped": True, "processed": 3}]
+
+
+def test_changed_transactions_are_analyzed_again(model, statement_dirs):
+    refresh({})
+    write_pdf(statement_dirs / "statement_month_2.pdf", statement_lines(21, month=2, seed=2), 30)
+    assert refresh({}) == [{"skipped": False, "processed": 3}]
+    assert model.calls == 2
+
+
+def test_alert_ids_are_stable_across_analyses(model, scratch_storage):
+    refresh({})
+    first = [a["id"] for a in statement_alerts(scratch_storage)]
+    assert len(set(first)) == 3
+
+    refresh({"force": True})
+    assert [a["id"] for a in statement_alerts(scratch_storage)] == first
+
+
+def test_triage_status_carries_over(model, scratch_storage):
+    refresh({})
+    flagged = statement_alerts(scratch_storage)
+    scratch_storage.update_alert_status(flagged[0]["id"], "Investigating")
+    scratch_storage.update_alert_status(flagged[2]["id"], "Resolved")
+
+    refresh({"force": True})
+    statuses = [a["status"] for a in statement_alerts(scratch_storage)]
+    assert statuses == ["Investigating", "New Alert", "Resolved"]
+
+
+def test_concurrent_refreshes_run_one_at_a_time(model, scratch_storage):
+    results = refresh({}, {}, {"force": True})
+
+    assert model.most_running == 1
+    assert results == [
+        {"skipped": False, "processed": 3},
+        {"skipped": True, "processed": 3},
+        {"skipped": False, "processed": 3},
+    ]
+    assert model.calls == 2
+    assert len(statement_alerts(scratch_storage)) == 3
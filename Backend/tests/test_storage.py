@@ -0,0 +1,223 @@
+"""Storage backends: mutation records, round-trips and migration."""
+
+import json
+
+import pytest
+
+import storage
+from aggregates import AlertAggregates
+from conftest import make_alert
+from storage import JsonBackend, apply_ops, default_data
+from storage_journal import SEQ_KEY, JournalBackend
+from storage_sqlite import SqliteBackend, migrate
+
+ALERTS = [
+    make_alert(
+        "a1", emailId="m1", riskScore=95, riskLevel="HIGH", amount=None,
+        flags=["Personal email domain", "Future date"],
+        factors=[{"id": "f1", "title": "Future Date", "severity": "medium", "description": "..."}],
+    ),
+    make_alert("a2", source="statement", riskScore=40.5, vendor="Globex", extra={"row": 3}),
+    make_alert("a3", riskLevel="HIGH", amount=1250.75, status="Resolved"),
+]
+
+OPS = [
+    *storage.append_ops(ALERTS, ["m1", "m2"]),
+    *storage.status_ops("a2", "Investigating"),
+    {"op": "patch", "id": "missing", "fields": {"status": "Resolved"}},
+    *storage.replace_source_ops("statement", [make_alert("s1", source="statement")]),
+    {"op": "put", "alert": make_alert("a3", riskLevel="LOW", amount=10.0)},
+    {"op": "delete", "id": "a1"},
+    {"op": "email_ids", "ids": ["m2", "m3"]},
+]
+
+
+def _open(kind: str, tmp_path):
+    if kind == "json":
+        return JsonBackend(tmp_path / "data.json")
+    if kind == "journal":
+        return JournalBackend(tmp_path / "data.json", compact_records=4)
+    return SqliteBackend(tmp_path / "firmwatch.db")
+
+
+def _close(backend) -> None:
+    if hasattr(backend, "close"):
+        backend.close()
+
+
+@pytest.fixture(params=["json", "sqlite", "journal"])
+def backend_kind(request):
+    return request.param
+
+
+def test_apply_ops_semantics():
+    data = apply_ops(default_data(), OPS)
+    # A replaced alert keeps its place; new ones are appended
+    assert [a["id"] for a in data["alerts"]] == ["a3", "s1"]
+    assert data["alerts"][0]["riskLevel"] == "LOW"
+    assert data["processed_email_ids"] == ["m1", "m2", "m3"]
+    assert data["summary"] == {
+        "totalInvoices": 2, "highRiskAlerts": 0, "flaggedAmount": 0, "casesResolved": 0,
+    }
+
+
+def test_summary_deltas_match_a_recount():
+    data = default_data()
+    for op in OPS:
+        apply_ops(data, [op])
+        recounted = storage._recompute_summary({"alerts": data["alerts"]})["summary"]
+        assert data["summary"] == recounted
+
+
+def test_apply_ops_is_idempotent():
+    once = apply_ops(default_data(), OPS)
+    twice = apply_ops(apply_ops(default_data(), OPS), OPS)
+    assert once == twice
+
+
+def test_unknown_op_is_rejected():
+    with pytest.raises(ValueError):
+        apply_ops(default_data(), [{"op": "truncate"}])
+
+
+def test_ops_round_trip(backend_kind, tmp_path):
+    expected = default_data()
+    backend = _open(backend_kind, tmp_path)
+    for op in OPS:
+        apply_ops(expected, [op])
+        backend.apply([op], json.loads(json.dumps(expected)))
+    _close(backend)
+
+    reopened = _open(backend_kind, tmp_path)
+    loaded = reopened.load()
+    _close(reopened)
+    assert loaded["alerts"] == expected["alerts"]
+    assert loaded["processed_email_ids"] == expected["processed_email_ids"]
+    assert loaded["summary"] == expected["summary"]
+
+
+# Hand-built and legacy alerts lack most keys; integer amounts stay integers
+SPARSE_ALERTS = [
+    {"id": "bare", "riskLevel": "HIGH", "amount": 100, "status": "New Alert"},
+    {"id": "nulls", "riskScore": None, "vendor": None, "amount": 19.99, "flags": ["Round amount"]},
+]
+
+
+def test_sparse_alerts_round_trip(backend_kind, tmp_path):
+    ops = storage.append_ops(SPARSE_ALERTS) + storage.status_ops("bare", "Resolved")
+    expected = apply_ops(default_data(), ops)
+    backend = _open(backend_kind, tmp_path)
+    backend.apply(ops, json.loads(json.dumps(expected)))
+    _close(backend)
+
+    reopened = _open(backend_kind, tmp_path)
+    loaded = reopened.load()
+    _close(reopened)
+    by_id = {a["id"]: a for a in loaded["alerts"]}
+    assert "vendor" not in by_id["bare"] and "date" not in by_id["bare"]
+    assert by_id["nulls"]["vendor"] is None
+    assert json.dumps(by_id["bare"]["amount"]) == "100"
+    assert loaded["summary"] == expected["summary"]
+    # Same dashboard whichever backend holds the data
+    assert AlertAggregates(loaded["alerts"]).top_vendors() == (
+        AlertAggregates(expected["alerts"]).top_vendors()
+    )
+    lists = {"flags": [], "factors": []}
+    for alert in expected["alerts"]:
+        # Absent flags and factors come back as empty lists
+        assert {**lists, **by_id[alert["id"]]} == {**lists, **alert}
+
+
+def test_sqlite_summary_rounds_the_flagged_amount(tmp_path):
+    alerts = [make_alert(f"a{i}", riskLevel="HIGH", amount=0.1) for i in range(3)]
+    backend = SqliteBackend(tmp_path / "firmwatch.db")
+    backend.apply(storage.append_ops(alerts))
+    assert backend.load()["summary"]["flaggedAmount"] == 0.3
+    backend.close()
+
+
+def test_full_document_round_trip(backend_kind, tmp_path):
+    data = apply_ops(default_data(), storage.append_ops(ALERTS, ["m1"]))
+    backend = _open(backend_kind, tmp_path)
+    backend.save(data)
+    data = apply_ops(json.loads(json.dumps(data)), [{"op": "delete", "id": "a2"}])
+    backend.save(data)
+    assert backend.load()["alerts"] == data["alerts"]
+    _close(backend)
+
+
+def test_sqlite_save_rewrites_only_changed_rows(tmp_path):
+    backend = SqliteBackend(tmp_path / "firmwatch.db")
+    data = apply_ops(default_data(), storage.append_ops(ALERTS))
+    backend.save(data)
+    seqs = dict(backend._conn.execute("SELECT id, seq FROM alerts"))
+    data = apply_ops(data, storage.status_ops("a3", "Investigating"))
+    backend.save(data)
+    after = dict(backend._conn.execute("SELECT id, seq FROM alerts"))
+    assert after == seqs
+    assert backend.load()["alerts"] == data["alerts"]
+    backend.close()
+
+
+def test_migrate_imports_data_json(tmp_path):
+    data = apply_ops(default_data(), storage.append_ops(ALERTS, ["m1", "m2"]))
+    json_path = tmp_path / "data.json"
+    json_path.write_text(json.dumps(data), encoding="utf-8")
+    summary = migrate(json_path, tmp_path / "firmwatch.db")
+    assert summary == data["summary"]
+    backend = SqliteBackend(tmp_path / "firmwatch.db")
+    assert backend.load() == data
+    backend.close()
+
+
+def _journal_lines(backend: JournalBackend) -> list[dict]:
+    return [json.loads(line) for line in backend.journal_path.read_text().splitlines()]
+
+
+def test_journal_compaction_folds_records_into_the_snapshot(tmp_path):
+    backend = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    expected = apply_ops(default_data(), OPS)
+    backend.apply(OPS)
+    assert len(_journal_lines(backend)) == len(OPS)
+
+    backend.compact()
+    assert _journal_lines(backend) == []
+    snapshot = json.loads(backend.snapshot_path.read_text())
+    assert snapshot.pop(SEQ_KEY) == len(OPS)
+    assert snapshot["alerts"] == expected["alerts"]
+
+    backend.apply(storage.status_ops("s1", "Resolved"))
+    assert backend.load() == apply_ops(expected, storage.status_ops("s1", "Resolved"))
+    backend.close()
+
+
+def test_journal_replays_only_records_newer_than_the_snapshot(tmp_path):
+    backend = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    backend.apply(OPS)
+    backend.compact()
+    backend.close()
+    # A journal left over from before the compaction must not be applied twice
+    stale = [{"seq": i + 1, **op} for i, op in enumerate(OPS)]
+    backend.journal_path.write_text("".join(json.dumps(r) + "\n" for r in stale))
+
+    reopened = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    assert reopened.load() == apply_ops(default_data(), OPS)
+    reopened.apply(storage.append_ops([make_alert("late")]))
+    assert _journal_lines(reopened)[-1]["seq"] == len(OPS) + 1
+    reopened.close()
+
+
+def test_journal_recovers_from_a_crash(tmp_path):
+    backend = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    backend.apply(OPS[:3])
+    backend.close()
+    # Interrupted compaction, then a torn append to the fresh journal
+    backend.journal_path.replace(backend.compacting_path)
+    backend.journal_path.write_text(
+        json.dumps({"seq": 4, **OPS[3]}) + "\n" + '{"seq": 5, "op": "del'
+    )
+
+    reopened = JournalBackend(tmp_path / "data.json", compact_records=10_000)
+    assert not reopened.compacting_path.exists()
+    assert reopened.load() == apply_ops(default_data(), OPS[:4])
+    reopened.close()
@@ -0,0 +1,84 @@
+"""The async storage facade: group commit through a single writer."""
+
+import asyncio
+
+import pytest
+
+from conftest import make_alert
+from storage_async import AsyncStorage
+
+
+def test_concurrent_writers_lose_nothing(scratch_storage):
+    store = AsyncStorage()
+
+    async def pipeline(name: str, count: int) -> None:
+        for i in range(count):
+            await store.append_alerts([make_alert(f"{name}-{i}")], [f"{name}-m{i}"])
+
+    async def run() -> None:
+        store.start()
+        await asyncio.gather(
+            *(pipeline(f"p{p}", 20) for p in range(8)),
+            store.replace_source_alerts("statement", [make_alert("s1", source="statement")]),
+        )
+        await store.stop()
+
+    asyncio.run(run())
+    data = scratch_storage.get_snapshot().data
+    assert len(data["alerts"]) == 8 * 20 + 1
+    assert len(data["processed_email_ids"]) == 8 * 20
+    assert store.requests == 8 * 20 + 1
+    # Requests that queued up while a commit ran shared the next one
+    assert store.commits < store.requests
+    assert store.largest_batch > 1
+    # And the database holds exactly what was published
+    assert scratch_storage._backend.load()["alerts"] == data["alerts"]
+
+
+def test_a_bad_request_does_not_fail_its_batch(scratch_storage):
+    store = AsyncStorage()
+
+    async def run():
+        store.start()
+        return await asyncio.gather(
+            store.append_alerts([make_alert("a1")]),
+            store.commit([{"op": "truncate"}]),
+            store.append_alerts([make_alert("a2")]),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ValueError)
+    ids = [a["id"] for a in scratch_storage.get_snapshot().data["alerts"]]
+    assert ids == ["a1", "a2"]
+
+
+def test_reads_see_each_commit(scratch_storage):
+    store = AsyncStorage()
+
+    async def run():
+        before = await store.generation()
+        await store.update_alert_status("missing", "Resolved")
+        await store.append_alerts([make_alert("a1")])
+        snapshot = await store.snapshot()
+        await store.stop()
+        return before, snapshot
+
+    before, snapshot = asyncio.run(run())
+    assert snapshot.generation == before + 2
+    assert [a["id"] for a in snapshot.data["alerts"]] == ["a1"]
+
+
+@pytest.mark.parametrize("max_batch", [1, 3])
+def test_batches_respect_max_batch(scratch_storage, max_batch):
+    store = AsyncStorage(max_batch=max_batch)
+
+    async def run():
+        store.start()
+        await asyncio.gather(*(store.append_alerts([make_alert(f"a{i}")]) for i in range(10)))
+        await store.stop()
+
+    asyncio.run(run())
+    assert store.largest_batch <= max_batch
+    assert len(scratch_storage.get_snapshot().data["alerts"]) == 10
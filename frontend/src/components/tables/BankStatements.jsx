@@ -1,19 +1,45 @@
-import React, { useState } from 'react'
+import React, { useEffect, useState } from 'react'
+import { api } from '../../services/api'
 
-const MONTHS = [
-  { num: 1, label: 'Jan' },
-  { num: 2, label: 'Feb' },
-  { num: 3, label: 'Mar' },
-  { num: 4, label: 'Apr' },
-  { num: 5, label: 'May' },
-  { num: 6, label: 'Jun' },
-]
+const PAGE_SIZE = 100
 
 const BankStatements = ({ statements }) => {
-  const [activeMonth, setActiveMonth] = useState(6)
+  const accounts = statements?.accounts || []
+  const catalog = statements?.statements || []
+  const [activeAccount, setActiveAccount] = useState(null)
+  const [activeId, setActiveId] = useState(null)
+  const [page, setPage] = useState({ items: [], nextCursor: null, statement: null })
+  const [loading, setLoading] = useState(false)
+  const [error, setError] = useState(null)
 
-  const current = statements?.[activeMonth]
-  const transactions = current?.transactions || []
+  const account = accounts.includes(activeAccount) ? activeAccount : accounts[0]
+  const periods = catalog.filter(s => s.account === account)
+  // Default to the latest period of the account
+  const current = periods.find(s => s.id === activeId) || periods[periods.length - 1]
+  const currentId = current?.id
+  const summary = page.statement?.id === currentId && page.statement?.parsed ? page.statement : current
+  const transactions = page.items
+
+  const loadPage = async (cursor) => {
+    setLoading(true)
+    setError(null)
+    try {
+      const result = await api.getStatementTransactions({ statementId: currentId, cursor, limit: PAGE_SIZE })
+      setPage(prev => cursor
+        ? { ...result, items: [...prev.items, ...result.items] }
+        : result)
+    } catch (e) {
+      setError(e.message)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  useEffect(() => {
+    setPage({ items: [], nextCursor: null, statement: null })
+    if (currentId) loadPage(undefined)
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentId])
 
   const formatAmount = (val) => {
     if (val == null) return ''
@@ -33,18 +59,29 @@ const BankStatements = ({ statements }) => {
         Bank Statements
       </h3>
 
-      {/* Month Buttons */}
+      {/* Account Selector */}
+      {accounts.length > 1 && (
+        <div className="mb-3">
+          <select
+            value={account}
+            onChange={e => { setActiveAccount(e.target.value); setActiveId(null) }}
+            className="px-3 py-1.5 rounded-lg text-sm bg-white dark:bg-neutral-800 text-neutral-700 dark:text-neutral-300 border border-neutral-200 dark:border-neutral-700"
+          >
+            {accounts.map(name => <option key={name} value={name}>{name}</option>)}
+          </select>
+        </div>
+      )}
+
+      {/* Period Buttons */}
       <div className="flex flex-wrap gap-2 mb-5">
-        {MONTHS.map(({ num, label }) => {
-          const monthData = statements?.[num]
-          const closing = monthData?.closingBalance
-          const isActive = activeMonth === num
+        {periods.map(({ id, label, closingBalance: closing }) => {
+          const isActive = currentId === id
           const isNegative = closing != null && closing < 0
 
           return (
             <button
-              key={num}
-              onClick={() => setActiveMonth(num)}
+              key={id}
+              onClick={() => setActiveId(id)}
               className={`flex flex-col items-center px-4 py-2 rounded-xl text-sm font-semibold transition-all duration-200 border ${
                 isActive
                   ? 'bg-neutral-800 dark:bg-white text-white dark:text-neutral-900 border-neutral-700 dark:border-neutral-200 shadow-sm'
@@ -67,25 +104,28 @@ const BankStatements = ({ statements }) => {
       </div>
 
       {/* Period Summary */}
-      {current && (
+      {summary?.parsed && (
         <div className="flex items-center justify-between mb-4 px-1">
           <span className="text-xs text-neutral-500 dark:text-neutral-400 font-medium">
-            {current.period}
+            {summary.statementPeriod}
           </span>
           <div className="flex items-center gap-4 text-xs font-medium">
             <span className="text-neutral-500 dark:text-neutral-400">
-              Open: <span className="text-neutral-700 dark:text-neutral-300">{formatAmount(current.openingBalance)}</span>
+              Open: <span className="text-neutral-700 dark:text-neutral-300">{formatAmount(summary.openingBalance)}</span>
             </span>
             <span className="text-neutral-500 dark:text-neutral-400">
-              Close: <span className={getBalanceColor(current.closingBalance)}>{formatAmount(current.closingBalance)}</span>
+              Close: <span className={getBalanceColor(summary.closingBalance)}>{formatAmount(summary.closingBalance)}</span>
             </span>
           </div>
         </div>
       )}
 
       {/* Transaction Table */}
+      {error && <p className="text-red-500 text-sm mb-2">{error}</p>}
       {transactions.length === 0 ? (
-        <p className="text-neutral-500 dark:text-neutral-400 text-sm">No transactions for this month.</p>
+        <p className="text-neutral-500 dark:text-neutral-400 text-sm">
+          {loading ? 'Loading transactions...' : 'No transactions for this month.'}
+        </p>
       ) : (
         <div className="overflow-x-auto max-h-[420px] overflow-y-auto">
           <table className="w-full">
@@ -125,6 +165,15 @@ const BankStatements = ({ statements }) => {
               ))}
             </tbody>
           </table>
+          {page.nextCursor && (
+            <button
+              onClick={() => loadPage(page.nextCursor)}
+              disabled={loading}
+              className="w-full mt-2 py-2 text-xs font-medium rounded-lg text-neutral-600 dark:text-neutral-400 hover:bg-neutral-100 dark:hover:bg-neutral-800 disabled:opacity-50"
+            >
+              {loading ? 'Loading...' : `Load more (${transactions.length}${summary?.transactionCount != null ? ` of ${summary.transactionCount}` : ''})`}
+            </button>
+          )}
         </div>
       )}
     </div>
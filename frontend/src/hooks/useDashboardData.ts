@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react'
-import { api, DashboardSummary, Alert, RiskDistribution, AlertTimeSeries, Anomaly, InvestigationCase, PatternInsight, TopRiskVendor, StatementMonth } from '../services/api'
+import { api, ALERT_QUEUE_FIELDS, DashboardSummary, Alert, RiskDistribution, AlertTimeSeries, Anomaly, InvestigationCase, PatternInsight, TopRiskVendor, StatementCatalog } from '../services/api'
 
 export interface DashboardData {
   summary: DashboardSummary | null
@@ -10,7 +10,7 @@ export interface DashboardData {
   investigationCase: InvestigationCase | null
   patternInsights: PatternInsight[]
   topRiskVendors: TopRiskVendor[]
-  statements: Record<number, StatementMonth>
+  statements: StatementCatalog
   loading: boolean
   error: string | null
 }
@@ -25,7 +25,7 @@ export function useDashboardData() {
     investigationCase: null,
     patternInsights: [],
     topRiskVendors: [],
-    statements: {},
+    statements: { accounts: [], statements: [] },
     loading: true,
     error: null,
   })
@@ -35,44 +35,42 @@ export function useDashboardData() {
 
   useEffect(() => {
     loadDashboardData()
+    // Show alerts as the backend produces them; the full reload once a run
+    // ends brings the panels and server-side ordering up to date
+    return api.subscribeEvents({
+      onAlert: ({ alert }) => {
+        const row = Object.fromEntries(
+          ['id', ...ALERT_QUEUE_FIELDS].map(field => [field, alert[field as keyof Alert]])
+        ) as unknown as Alert
+        // A repeated ID is an update of an alert already shown
+        setData(prev =>
+          prev.alerts.some(a => a.id === row.id)
+            ? { ...prev, alerts: prev.alerts.map(a => (a.id === row.id ? row : a)) }
+            : { ...prev, alerts: [row, ...prev.alerts] }
+        )
+      },
+      onStatus: ({ state }) => {
+        if (state !== 'started') loadDashboardData()
+      },
+    })
   }, [])
 
   const loadDashboardData = async () => {
     try {
       setData(prev => ({ ...prev, loading: true, error: null }))
       
-      const [
-        summary,
-        alerts,
-        riskDistribution,
-        alertsOverTime,
-        topAnomalies,
-        investigationCase,
-        patternInsights,
-        topRiskVendors,
-        statements,
-      ] = await Promise.all([
-        api.getDashboardSummary(),
-        api.getAlerts(),
-        api.getRiskDistribution(),
-        api.getAlertsOverTime(),
-        api.getTopAnomalies(),
-        api.getInvestigationCase(),
-        api.getPatternInsights(),
-        api.getTopRiskVendors(),
-        api.getStatements(),
-      ])
+      const bundle = await api.getDashboard(undefined, ALERT_QUEUE_FIELDS)
 
       setData({
-        summary,
-        alerts,
-        riskDistribution,
-        alertsOverTime,
-        topAnomalies,
-        investigationCase,
-        patternInsights,
-        topRiskVendors,
-        statements,
+        summary: bundle.summary ?? null,
+        alerts: bundle.alerts ?? [],
+        riskDistribution: bundle.riskDistribution ?? null,
+        alertsOverTime: bundle.alertsOverTime ?? [],
+        topAnomalies: bundle.topAnomalies ?? [],
+        investigationCase: bundle.investigationCase ?? null,
+        patternInsights: bundle.patternInsights ?? [],
+        topRiskVendors: bundle.topRiskVendors ?? [],
+        statements: bundle.statements ?? { accounts: [], statements: [] },
         loading: false,
         error: null,
       })
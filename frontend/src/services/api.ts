@@ -18,6 +18,39 @@ export interface Alert {
   status: 'New Alert' | 'Under Review' | 'Escalated' | 'Resolved'
 }
 
+export interface AlertQuery {
+  riskLevel?: string
+  type?: string
+  status?: string
+  vendor?: string
+  source?: string
+  dateFrom?: string
+  dateTo?: string
+  sort?: 'riskScore' | 'date'
+  order?: 'asc' | 'desc'
+  cursor?: string
+  limit?: number
+  fields?: string[]
+}
+
+export interface AlertPage {
+  items: Alert[]
+  nextCursor: string | null
+}
+
+// Columns the alert queue table needs; skips factors, summary and flags
+export const ALERT_QUEUE_FIELDS = ['riskScore', 'type', 'vendor', 'amount', 'reason', 'status']
+
+function queryString(query: object): string {
+  const params = new URLSearchParams()
+  Object.entries(query).forEach(([key, value]) => {
+    if (value === undefined || value === null || value === '') return
+    params.set(key, Array.isArray(value) ? value.join(',') : String(value))
+  })
+  const qs = params.toString()
+  return qs ? `?${qs}` : ''
+}
+
 export interface RiskDistribution {
   low: number
   medium: number
@@ -44,6 +77,7 @@ export interface InvestigationCase {
   similarCases: Array<{
     caseId: string
     status: string
+    similarity: number
   }>
 }
 
@@ -65,13 +99,42 @@ export interface StatementTransaction {
   balance: number
 }
 
-export interface StatementMonth {
-  month: number
-  label: string
+// Catalog entry; the balances and counts are null until the PDF has been parsed
+export interface StatementSummary {
+  id: string
+  account: string
   period: string
-  openingBalance: number
-  closingBalance: number
-  transactions: StatementTransaction[]
+  label: string
+  month: number | null
+  file: string
+  sizeBytes: number
+  parsed: boolean
+  statementPeriod: string | null
+  openingBalance: number | null
+  closingBalance: number | null
+  transactionCount: number | null
+  firstDate: string | null
+  lastDate: string | null
+}
+
+export interface StatementCatalog {
+  accounts: string[]
+  statements: StatementSummary[]
+}
+
+export interface StatementTransactionQuery {
+  account?: string
+  statementId?: string
+  dateFrom?: string
+  dateTo?: string
+  cursor?: string
+  limit?: number
+}
+
+export interface StatementTransactionPage {
+  items: Array<StatementTransaction & { isoDate: string | null; statementId: string; account: string }>
+  nextCursor: string | null
+  statement?: StatementSummary | null
 }
 
 export interface RiskFactor {
@@ -88,9 +151,24 @@ export interface ReportAnalysis {
   summary: string
   factors: RiskFactor[]
   flags: string[]
-  similarCases: Array<{ caseId: string; status: string }>
+  similarCases: Array<{ caseId: string; status: string; similarity: number }>
 }
 
+export interface DashboardBundle {
+  generation: number
+  summary?: DashboardSummary
+  alerts?: Alert[]
+  riskDistribution?: RiskDistribution
+  alertsOverTime?: AlertTimeSeries[]
+  topAnomalies?: Anomaly[]
+  investigationCase?: InvestigationCase | null
+  patternInsights?: PatternInsight[]
+  topRiskVendors?: TopRiskVendor[]
+  statements?: StatementCatalog
+}
+
+export type DashboardSection = Exclude<keyof DashboardBundle, 'generation'>
+
 export interface DemoPayment {
   id: string
   vendor: string
@@ -122,53 +200,94 @@ export interface DriveAuthStatus {
 
 const API_BASE_URL = 'http://127.0.0.1:5000'
 
+// Last ETag and body per URL; unchanged data comes back as a bodiless 304
+const validatorCache = new Map<string, { etag: string; body: unknown }>()
+
+async function conditionalGet(url: string): Promise<Response & { cachedBody?: unknown }> {
+  const cached = validatorCache.get(url)
+  const res = await fetch(url, {
+    cache: 'no-store',
+    headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+  })
+  if (res.status === 304 && cached) {
+    return Object.assign(res, { cachedBody: cached.body })
+  }
+  return res
+}
+
+async function getJsonBody<T>(res: Response, url: string, errorMessage: string): Promise<T> {
+  if (!res.ok) throw new Error(errorMessage)
+  const body = await res.json()
+  const etag = res.headers.get('ETag')
+  if (etag) validatorCache.set(url, { etag, body })
+  return body
+}
+
+async function getJson<T>(url: string, errorMessage: string): Promise<T> {
+  const res = await conditionalGet(url)
+  if ('cachedBody' in res) return res.cachedBody as T
+  return getJsonBody(res, url, errorMessage)
+}
+
+export interface LiveAlertEvent {
+  pipeline: 'email' | 'upload' | 'statements'
+  alert: Alert
+}
+
+export interface LiveStatusEvent {
+  pipeline: 'email' | 'upload' | 'statements'
+  state: 'started' | 'finished' | 'failed'
+}
+
+export interface LiveEventHandlers {
+  onAlert?: (event: LiveAlertEvent) => void
+  onStatus?: (event: LiveStatusEvent) => void
+}
+
 export const api = {
+  // All dashboard panels from one storage snapshot in a single round trip
+  async getDashboard(sections?: DashboardSection[], alertFields?: string[]): Promise<DashboardBundle> {
+    const params = new URLSearchParams()
+    if (sections?.length) params.set('sections', sections.join(','))
+    if (alertFields?.length) params.set('fields', alertFields.join(','))
+    const qs = params.toString()
+    return getJson(`/api/dashboard${qs ? `?${qs}` : ''}`, 'Failed to fetch dashboard')
+  },
+
   async getDashboardSummary(): Promise<DashboardSummary> {
-    const res = await fetch('/api/dashboard/summary')
-    if (!res.ok) throw new Error('Failed to fetch dashboard summary')
-    return res.json()
+    return getJson('/api/dashboard/summary', 'Failed to fetch dashboard summary')
   },
 
-  async getAlerts(): Promise<Alert[]> {
-    const res = await fetch('/api/alerts')
-    if (!res.ok) throw new Error('Failed to fetch alerts')
-    return res.json()
+  async getAlerts(query: Omit<AlertQuery, 'cursor' | 'limit'> = {}): Promise<Alert[]> {
+    return getJson(`/api/alerts${queryString(query)}`, 'Failed to fetch alerts')
+  },
+
+  async getAlertsPage(query: AlertQuery & { limit: number }): Promise<AlertPage> {
+    return getJson(`/api/alerts${queryString(query)}`, 'Failed to fetch alerts')
   },
 
   async getRiskDistribution(): Promise<RiskDistribution> {
-    const res = await fetch('/api/risk-distribution')
-    if (!res.ok) throw new Error('Failed to fetch risk distribution')
-    return res.json()
+    return getJson('/api/risk-distribution', 'Failed to fetch risk distribution')
   },
 
   async getAlertsOverTime(): Promise<AlertTimeSeries[]> {
-    const res = await fetch('/api/alerts-over-time')
-    if (!res.ok) throw new Error('Failed to fetch alerts over time')
-    return res.json()
+    return getJson('/api/alerts-over-time', 'Failed to fetch alerts over time')
   },
 
   async getTopAnomalies(): Promise<Anomaly[]> {
-    const res = await fetch('/api/top-anomalies')
-    if (!res.ok) throw new Error('Failed to fetch top anomalies')
-    return res.json()
+    return getJson('/api/top-anomalies', 'Failed to fetch top anomalies')
   },
 
   async getInvestigationCase(_caseId?: string): Promise<InvestigationCase | null> {
-    const res = await fetch('/api/investigation-case')
-    if (!res.ok) throw new Error('Failed to fetch investigation case')
-    return res.json()
+    return getJson('/api/investigation-case', 'Failed to fetch investigation case')
   },
 
   async getPatternInsights(): Promise<PatternInsight[]> {
-    const res = await fetch('/api/pattern-insights')
-    if (!res.ok) throw new Error('Failed to fetch pattern insights')
-    return res.json()
+    return getJson('/api/pattern-insights', 'Failed to fetch pattern insights')
   },
 
   async getTopRiskVendors(): Promise<TopRiskVendor[]> {
-    const res = await fetch('/api/top-risk-vendors')
-    if (!res.ok) throw new Error('Failed to fetch top risk vendors')
-    return res.json()
+    return getJson('/api/top-risk-vendors', 'Failed to fetch top risk vendors')
   },
 
   async syncEmail(): Promise<{ success: boolean; message: string }> {
@@ -178,10 +297,10 @@ export const api = {
   },
 
   async getReportAnalysis(alertId: string): Promise<ReportAnalysis | null> {
-    const res = await fetch(`/api/report/${alertId}`)
+    const res = await conditionalGet(`/api/report/${alertId}`)
+    if ('cachedBody' in res) return res.cachedBody as ReportAnalysis
     if (res.status === 404) return null
-    if (!res.ok) throw new Error('Failed to fetch report analysis')
-    return res.json()
+    return getJsonBody(res, `/api/report/${alertId}`, 'Failed to fetch report analysis')
   },
 
   async uploadStatement(file: File): Promise<{ success: boolean; message: string; processed?: number }> {
@@ -192,10 +311,15 @@ export const api = {
     return res.json()
   },
 
-  async getStatements(): Promise<Record<number, StatementMonth>> {
-    const res = await fetch('/api/statements')
-    if (!res.ok) throw new Error('Failed to fetch statements')
-    return res.json()
+  async getStatements(account?: string): Promise<StatementCatalog> {
+    return getJson(`/api/statements${queryString({ account })}`, 'Failed to fetch statements')
+  },
+
+  async getStatementTransactions(query: StatementTransactionQuery): Promise<StatementTransactionPage> {
+    return getJson(
+      `/api/statements/transactions${queryString(query)}`,
+      'Failed to fetch statement transactions',
+    )
   },
 
   async analyzeStatements(): Promise<{ success: boolean; message: string; processed?: number }> {
@@ -203,5 +327,13 @@ export const api = {
     if (!res.ok) throw new Error('Statement analysis failed')
     return res.json()
   },
+
+  // Alerts pushed while a sync or analysis is still running; returns a closer
+  subscribeEvents(handlers: LiveEventHandlers): () => void {
+    const source = new EventSource('/api/events')
+    source.addEventListener('alert', e => handlers.onAlert?.(JSON.parse((e as MessageEvent).data)))
+    source.addEventListener('status', e => handlers.onStatus?.(JSON.parse((e as MessageEvent).data)))
+    return () => source.close()
+  },
 }
 